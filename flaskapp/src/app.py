@@ -3,6 +3,8 @@ from flask_httpauth import HTTPBasicAuth
 from config import Config
 from routes import app_bp
 from init_db import initialize_configuration
+from db import get_db
+from modules.jobs.runner import fail_orphaned_jobs
 from modules.auth.auth import register_error_handlers, register_before_request
 from flask_cors import CORS
 # from aws_xray_sdk.core import xray_recorder
@@ -27,6 +29,8 @@ app.register_blueprint(app_bp)
 
 with app.app_context():
     initialize_configuration()
+    # Jobs left queued or running by a previous process never finish
+    fail_orphaned_jobs(get_db())
 
 
 if __name__ == "__main__":
@@ -8,3 +8,10 @@ class Config:
     DATABASE = os.environ.get('DATABASE', 'mydatabase')
     COLLECTION = os.environ.get('COLLECTION', 'mycollection')
     BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 100))
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+    # Unfinished jobs whose heartbeat is older than this are failed as orphaned
+    JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', 30))
+    JOB_ORPHANED_SECONDS = float(os.environ.get('JOB_ORPHANED_SECONDS', 120))
+    FEASIBILITY_PROCESSES = int(os.environ.get('FEASIBILITY_PROCESSES', 1))
+    FEASIBILITY_SHARD_BY = os.environ.get('FEASIBILITY_SHARD_BY', 'id')
+    CONFIG_PROBE_SECONDS = float(os.environ.get('CONFIG_PROBE_SECONDS', 5))
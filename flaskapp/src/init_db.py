@@ -55,10 +55,13 @@ def initialize_configuration():
         "investor_input": 0.8,
         "renovation_costs": 0.1,
         "useable_land": 0.2,
-        "construction_deposit": 0.3
+        "construction_deposit": 0.3,
+        "target_gross_margin": 0.2
     }
 
     try:
+        # Keeps the cached configuration's version probe an index-only lookup
+        collection.create_index("version")
         existing = collection.find_one({"version": 1})
         if not existing:
             collection.insert_one(configuration)
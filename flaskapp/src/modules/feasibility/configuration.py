@@ -0,0 +1,47 @@
+import threading
+import time
+from flask import current_app
+
+# Process-wide cached configuration, replaced whenever a newer version appears
+_configuration = None
+_configuration_probed_at = 0.0
+_configuration_lock = threading.Lock()
+
+
+def fetch_configuration_version(db):
+    """
+    Fetch the latest configuration version without loading the document
+
+    :param db: MongoDB client database instance
+    :return: int, the latest version or None if there is no configuration
+    """
+    document = db["configuration"].find_one(
+        {}, {"_id": 0, "version": 1}, sort=[("version", -1)]
+    )
+    return document.get("version") if document else None
+
+
+def get_configuration(db):
+    """
+    Get the latest configuration document from the process-wide cache
+
+    The cache is trusted for CONFIG_PROBE_SECONDS, after that a version probe
+    decides whether the document has to be reloaded.
+
+    :param db: MongoDB client database instance
+    :return: dict, a copy of the latest configuration document
+    """
+    global _configuration, _configuration_probed_at
+    probe_seconds = current_app.config["CONFIG_PROBE_SECONDS"]
+    with _configuration_lock:
+        now = time.monotonic()
+        if _configuration is None or now - _configuration_probed_at >= probe_seconds:
+            version = fetch_configuration_version(db)
+            if _configuration is None or _configuration.get("version") != version:
+                document = db["configuration"].find_one(sort=[("version", -1)])
+                if not document:
+                    raise ValueError("No inputs found for the specified version")
+                _configuration = document
+            _configuration_probed_at = now
+        return dict(_configuration)
+
@@ -1,5 +1,11 @@
 from flask import Blueprint
-from modules.feasibility.service import FeasibilityService, FeasibilityDetailService
+from modules.feasibility.service import (
+    FeasibilityService,
+    FeasibilityDetailService,
+    FeasibilityScenarioService,
+    FeasibilityScoringService,
+    FeasibilitySimulationService,
+)
 
 
 feasibility_bp = Blueprint("feasibility_bp", __name__)
@@ -9,6 +15,24 @@ feasibility_bp.add_url_rule(
     methods=["POST"],
 )
 
+feasibility_bp.add_url_rule(
+    "/feasibility/scenarios",
+    view_func=FeasibilityScenarioService.as_view("feasibility-scenarios"),
+    methods=["POST"],
+)
+
+feasibility_bp.add_url_rule(
+    "/feasibility/simulation",
+    view_func=FeasibilitySimulationService.as_view("feasibility-simulation"),
+    methods=["POST"],
+)
+
+feasibility_bp.add_url_rule(
+    "/feasibility/score",
+    view_func=FeasibilityScoringService.as_view("feasibility-score"),
+    methods=["POST"],
+)
+
 feasibility_bp.add_url_rule(
     "/feasibility/<string:property_id>",
     view_func=FeasibilityDetailService.as_view("feasibility-detail"),
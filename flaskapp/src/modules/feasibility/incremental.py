@@ -0,0 +1,81 @@
+import hashlib
+import json
+from modules.feasibility.vectorized import (
+    COMPARABLE_PROPERTY_TYPES,
+    NUMERIC_COLUMN_DEFAULTS,
+    PROPERTY_FEASIBILITY_PROJECTION,
+)
+
+MODE_FULL = "full"
+MODE_INCREMENTAL = "incremental"
+
+CONFIG_VERSION_FIELD = "feasibility_config_version"
+FINGERPRINT_FIELD = "feasibility_fingerprint"
+RESULT_VERSION_FIELD = "feasibility_result_version"
+
+# Version of the result fields the engine writes. Bump it whenever fields are
+# added, removed or change meaning so incremental runs backfill properties
+# stamped by an older engine.
+RESULT_VERSION = 2
+
+# Inputs plus the stamps written by the previous run
+PROPERTY_INCREMENTAL_PROJECTION = {
+    **PROPERTY_FEASIBILITY_PROJECTION,
+    CONFIG_VERSION_FIELD: 1,
+    FINGERPRINT_FIELD: 1,
+    RESULT_VERSION_FIELD: 1,
+}
+
+
+def compute_input_fingerprint(property, comparables):
+    """
+    Hash every input the feasibility math reads for a property, including
+    the comparable averages of its (bed, suburb) group
+
+    :param property: dict, property document
+    :param comparables: ComparablesIndex, the comparables snapshot of the run
+    :return: str, hex digest of the inputs
+    """
+    bed = property.get("bed")
+    suburb = property.get("suburb")
+    inputs = [
+        [name, property.get(name)] for name in NUMERIC_COLUMN_DEFAULTS
+    ] + [["bed", bed], ["suburb", suburb]]
+    inputs += [
+        [property_type, comparables.get_average_price(property_type, bed, suburb)]
+        for property_type in COMPARABLE_PROPERTY_TYPES
+    ]
+    payload = json.dumps(inputs, default=str, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def select_stale_properties(properties, config_version, comparables, mode):
+    """
+    Pick the properties whose feasibility must be recomputed and compute the
+    stamps to write with their results
+
+    :param properties: list, property documents with the previous stamps
+    :param config_version: int, version of the configuration in use
+    :param comparables: ComparablesIndex, the comparables snapshot of the run
+    :param mode: str, MODE_FULL recomputes everything, MODE_INCREMENTAL only
+    properties whose inputs, comparables, config version or result version
+    changed
+    :return: tuple, list of stale properties and dict of _id to stamps
+    """
+    stale_properties = []
+    stamps = {}
+    for property in properties:
+        fingerprint = compute_input_fingerprint(property, comparables)
+        if (
+            mode == MODE_FULL
+            or property.get(CONFIG_VERSION_FIELD) != config_version
+            or property.get(FINGERPRINT_FIELD) != fingerprint
+            or property.get(RESULT_VERSION_FIELD) != RESULT_VERSION
+        ):
+            stale_properties.append(property)
+            stamps[property["_id"]] = {
+                CONFIG_VERSION_FIELD: config_version,
+                FINGERPRINT_FIELD: fingerprint,
+                RESULT_VERSION_FIELD: RESULT_VERSION,
+            }
+    return stale_properties, stamps
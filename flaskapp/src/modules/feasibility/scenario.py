@@ -0,0 +1,192 @@
+import itertools
+import numpy as np
+from modules.feasibility.vectorized import (
+    CALCULATION_CONFIG_FIELDS,
+    FeasibilityVectorizedCalculator,
+    STRATEGY_IDS,
+)
+
+MAX_SCENARIOS = 1000
+MAX_TOP_N = 100
+# Upper bound of scenario x property cells evaluated per batch, keeps the
+# intermediate (strategy, scenario, property) arrays well inside 512 MB
+SCENARIO_BATCH_CELLS = 200000
+MARGIN_PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def build_scenarios(grid):
+    """
+    Expand a grid of configuration overrides into its cartesian product
+
+    :param grid: dict, configuration field to list of values
+    :return: list, one dict of overrides per scenario
+    """
+    fields = sorted(grid.keys())
+    return [
+        dict(zip(fields, values))
+        for values in itertools.product(*[grid[field] for field in fields])
+    ]
+
+
+def validate_scenario_request(base, grid):
+    """
+    Validate the overrides of a scenario request. Only configuration fields
+    the feasibility math reads can be overridden, others would not change
+    the results.
+
+    :param base: dict, overrides applied to every scenario
+    :param grid: dict, configuration field to list of values
+    :return: str, error message or None if the request is valid
+    """
+    if not isinstance(base, dict) or not isinstance(grid, dict):
+        return "base and grid must be objects"
+
+    for field, value in base.items():
+        if field not in CALCULATION_CONFIG_FIELDS:
+            return f"Unknown scenario field: {field}"
+        if not isinstance(value, (int, float)):
+            return f"Override for {field} must be a number"
+
+    for field, values in grid.items():
+        if field not in CALCULATION_CONFIG_FIELDS:
+            return f"Unknown scenario field: {field}"
+        if not isinstance(values, list) or not values:
+            return f"Grid values for {field} must be a non-empty list"
+        if not all(isinstance(v, (int, float)) for v in values):
+            return f"Grid values for {field} must be numbers"
+
+    scenario_count = int(np.prod([len(values) for values in grid.values()]))
+    if scenario_count > MAX_SCENARIOS:
+        return (
+            f"Grid expands to {scenario_count} scenarios, limit is {MAX_SCENARIOS}"
+        )
+    return None
+
+
+class FeasibilityScenarioCalculator:
+    """
+    Evaluate the portfolio under many configuration scenarios at once.
+
+    Scenarios become a second array axis: overridden config values are
+    (scenarios, 1) arrays broadcast against (1, properties) columns, so each
+    batch of scenarios is a single pass over the feasibility math.
+    """
+
+    def __init__(self, config, strategies, top_n=10):
+        """
+        :param config: dict, the base configuration document
+        :param strategies: dict, mapping of strategy names to IDs
+        :param top_n: int, number of best properties reported per scenario
+        """
+        self.config = config
+        self.strategies = strategies
+        self.top_n = top_n
+        self.strategy_names = {
+            strategy_id: name for name, strategy_id in strategies.items()
+        }
+
+    def evaluate(self, properties, comparable_averages, scenarios):
+        """
+        Evaluate every property under every scenario
+
+        :param properties: list, property documents
+        :param comparable_averages: dict, (property_type, bed, suburb) to average price
+        :param scenarios: list, one dict of config overrides per scenario
+        :return: list, aggregates per scenario in request order
+        """
+        loader = FeasibilityVectorizedCalculator(self.config, self.strategies)
+        columns = {
+            name: values[np.newaxis, :] if isinstance(values, np.ndarray) else values
+            for name, values in loader.load_properties(properties).items()
+        }
+        comparable_prices = {
+            property_type: prices[np.newaxis, :]
+            for property_type, prices in loader.load_comparable_prices(
+                properties, comparable_averages
+            ).items()
+        }
+
+        batch_size = max(1, SCENARIO_BATCH_CELLS // max(1, len(properties)))
+        aggregates = []
+        for start in range(0, len(scenarios), batch_size):
+            batch = scenarios[start : start + batch_size]
+            summary = self.evaluate_batch(columns, comparable_prices, batch)
+            aggregates.extend(
+                self.aggregate(properties, summary, index, overrides)
+                for index, overrides in enumerate(batch)
+            )
+        return aggregates
+
+    def evaluate_batch(self, columns, comparable_prices, scenarios):
+        """
+        Run the feasibility math once for a batch of scenarios
+
+        :param columns: dict, property columns shaped (1, properties)
+        :param comparable_prices: dict, average prices shaped (1, properties)
+        :param scenarios: list, one dict of config overrides per scenario
+        :return: dict, summarised arrays shaped (..., scenarios, properties)
+        """
+        config = dict(self.config)
+        for field in {field for overrides in scenarios for field in overrides}:
+            values = [
+                overrides.get(field, self.config.get(field)) for overrides in scenarios
+            ]
+            config[field] = np.array(values, dtype=float)[:, np.newaxis]
+
+        calculator = FeasibilityVectorizedCalculator(config, self.strategies)
+        return calculator.summarise(calculator.calculate(columns, comparable_prices))
+
+    def aggregate(self, properties, summary, index, overrides):
+        """
+        Reduce one scenario to feasible count, margin distribution and top-N
+
+        :param properties: list, property documents in column order
+        :param summary: dict, output of evaluate_batch
+        :param index: int, scenario position inside the batch
+        :param overrides: dict, the config overrides of the scenario
+        :return: dict, scenario aggregates
+        """
+        shape = (len(properties),)
+        highest_margin = np.broadcast_to(summary["highest_margin"][index], shape)
+        feasible = np.broadcast_to(summary["feasible"][index], shape)
+        gross_profit_on_cost = np.broadcast_to(
+            summary["gross_profit_on_cost"][:, index], (len(STRATEGY_IDS),) + shape
+        )
+
+        distribution = {}
+        if len(properties):
+            distribution = {
+                f"p{p}": round(float(v), 4)
+                for p, v in zip(
+                    MARGIN_PERCENTILES,
+                    np.percentile(highest_margin, MARGIN_PERCENTILES),
+                )
+            }
+            distribution["mean"] = round(float(highest_margin.mean()), 4)
+
+        top_properties = []
+        for i in np.argsort(-highest_margin, kind="stable")[: self.top_n]:
+            best_strategy = STRATEGY_IDS[int(np.argmax(gross_profit_on_cost[:, i]))]
+            top_properties.append(
+                {
+                    "_id": str(properties[i]["_id"]),
+                    "address": properties[i].get("address"),
+                    "suburb": properties[i].get("suburb"),
+                    "highest_margin": float(highest_margin[i]),
+                    "strategy": self.strategy_names.get(best_strategy),
+                }
+            )
+
+        return {
+            "overrides": overrides,
+            "properties": len(properties),
+            "feasible_count": int(feasible.sum()),
+            "margin_distribution": distribution,
+            "strategy_feasible_count": {
+                self.strategy_names.get(strategy_id): int(
+                    (gross_profit_on_cost[s] > 0).sum()
+                )
+                for s, strategy_id in enumerate(STRATEGY_IDS)
+            },
+            "top_properties": top_properties,
+        }
@@ -0,0 +1,100 @@
+import json
+import math
+from modules.feasibility.vectorized import (
+    FeasibilityVectorizedCalculator,
+    NUMERIC_COLUMN_DEFAULTS,
+)
+
+# Records evaluated per vectorized pass of a scoring stream
+SCORING_CHUNK_SIZE = 1000
+
+LOT_SIZE_FIELDS = ["minimum_lot_size_subdivision", "minimum_lot_size_duplex"]
+
+
+def parse_scoring_record(line, line_number):
+    """
+    Parse and validate one NDJSON line of a scoring request
+
+    :param line: bytes or str, the raw line
+    :param line_number: int, 1-based line number used as the default id
+    :return: tuple, the record with its "_id" set and an error message or None
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None, "Line is not valid JSON"
+    if not isinstance(record, dict):
+        return None, "Line must be a JSON object"
+
+    for name in NUMERIC_COLUMN_DEFAULTS:
+        value = record.get(name)
+        if value is not None and (
+            isinstance(value, bool)
+            or not isinstance(value, (int, float))
+            or not math.isfinite(value)
+        ):
+            return None, f"{name} must be a number"
+
+    for name in LOT_SIZE_FIELDS:
+        value = record.get(name)
+        if value is not None and value <= 0:
+            return None, f"{name} must be positive"
+
+    record["_id"] = record.get("id", line_number)
+    return record, None
+
+
+def score_ndjson(lines, config, strategies, comparable_averages,
+                 chunk_size=SCORING_CHUNK_SIZE):
+    """
+    Score a stream of hypothetical properties chunk by chunk without
+    touching the properties collection
+
+    Invalid lines, and results that are not finite, yield an error record in
+    place of a result so the rest of the stream is still scored and every
+    line is valid JSON.
+
+    :param lines: iterable, NDJSON lines of property records
+    :param config: dict, the configuration document
+    :param strategies: dict, mapping of strategy names to IDs
+    :param comparable_averages: dict, (property_type, bed, suburb) to average price
+    :param chunk_size: int, number of records per vectorized pass
+    :return: generator, NDJSON lines of results in input order
+    """
+    calculator = FeasibilityVectorizedCalculator(config, strategies)
+    pending = []
+
+    def flush():
+        records = [record for _, record, _ in pending if record is not None]
+        results = iter(calculator.calculate_properties(records, comparable_averages))
+        for line_number, record, error in pending:
+            if error:
+                output = error
+            else:
+                output = next(results)
+                output["id"] = output.pop("_id")
+            try:
+                result_line = json.dumps(output, default=str, allow_nan=False)
+            except ValueError:
+                result_line = json.dumps(
+                    {"line": line_number, "error": "Result is not a finite number"}
+                )
+            yield result_line + "\n"
+        pending.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        record, error = parse_scoring_record(line, line_number)
+        pending.append(
+            (
+                line_number,
+                record,
+                {"line": line_number, "error": error} if error else None,
+            )
+        )
+        if len(pending) >= chunk_size:
+            yield from flush()
+
+    if pending:
+        yield from flush()
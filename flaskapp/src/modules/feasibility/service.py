@@ -1,7 +1,8 @@
 from db import get_db
 import math
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, Response, stream_with_context
 from flask.views import MethodView
+from util import res
 from pymongo import UpdateOne
 from util.constant import (
     PROPERTY_TYPE_HOUSE,
@@ -11,6 +12,36 @@ from util.constant import (
 )
 
 from bson import ObjectId
+from modules.summary.comparables import get_comparables_index
+from modules.feasibility.configuration import get_configuration
+from modules.jobs.runner import submit_job
+from modules.feasibility.incremental import (
+    MODE_FULL,
+    MODE_INCREMENTAL,
+    PROPERTY_INCREMENTAL_PROJECTION,
+    compute_input_fingerprint,
+    CONFIG_VERSION_FIELD,
+    FINGERPRINT_FIELD,
+    RESULT_VERSION,
+    RESULT_VERSION_FIELD,
+)
+from modules.feasibility.sharded import calculate_and_store, run_sharded_feasibility
+from modules.feasibility.vectorized import (
+    FeasibilityVectorizedCalculator,
+    PROPERTY_FEASIBILITY_PROJECTION,
+)
+from modules.feasibility.simulation import (
+    DEFAULT_TRIALS,
+    FeasibilitySimulationCalculator,
+    PROPERTY_SIMULATION_PROJECTION,
+)
+from modules.feasibility.scoring import score_ndjson
+from modules.feasibility.scenario import (
+    FeasibilityScenarioCalculator,
+    MAX_TOP_N,
+    build_scenarios,
+    validate_scenario_request,
+)
 
 
 class FeasibilityCalculateService:
@@ -20,6 +51,7 @@ class FeasibilityCalculateService:
         """
         self.db = get_db()
         self.config = self.fetch_configuration()
+        self.comparables = get_comparables_index(self.db)
 
     def calculate_property(self, property):
         property_result = {"_id": property["_id"]}
@@ -133,23 +165,19 @@ class FeasibilityCalculateService:
 
         :return: dict, fetch_configuration retrieved from the database
         """
-        collection = self.db["configuration"]
-
-        document = collection.find_one(sort=[("version", -1)])
-
-        if document:
-            return document
-        else:
-            raise ValueError("No inputs found for the specified version")
+        return get_configuration(self.db)
 
-    def fetch_properties(self):
+    def fetch_properties(self, projection=None):
         """
         Fetch properties from the database
 
+        :param projection: dict, optional projection to specify fields to return
         :return: list, properties retrieved from the database
         """
         collection = self.db["properties"]
-        properties = list(collection.find({"for_sale": {"$in": ["FOR_SALE"]}}))
+        properties = list(
+            collection.find({"for_sale": {"$in": ["FOR_SALE"]}}, projection)
+        )
         return properties
 
     def get_strategies(self):
@@ -174,20 +202,10 @@ class FeasibilityCalculateService:
         :param property_type: str, the property type (duplexes or houses)
         :return: float, average sold price
         """
-        collection = self.db["comparable_average"]
-        document = collection.find_one(
-            {
-                "property_type": property_type,
-                "bed": property.get("bed"),
-                "suburb": property.get("suburb"),
-            }
+        return self.comparables.get_average_price(
+            property_type, property.get("bed"), property.get("suburb")
         )
 
-        if document and "average_price" in document:
-            return document["average_price"]
-        else:
-            return 0
-
     def calculate_number_of_houses(self, strategy, property):
         """
         Calculate the number of houses based on the strategy
@@ -216,6 +234,9 @@ class FeasibilityCalculateService:
 
         if strategy == 6:
             return gross_site_area / self.config.get("average_house_m2", 135)
+        elif minimum_lot_size <= 0:
+            # the lot cannot be subdivided, no house is built
+            return 0
         else:
             # the rest of the strategies is the same
             return math.floor(useable_land / minimum_lot_size)
@@ -571,29 +592,174 @@ class FeasibilityCalculateService:
         collection.bulk_write(operations)
 
 
+def run_feasibility_job(progress, mode):
+    """
+    Recompute feasibility for the FOR_SALE portfolio, reporting progress per
+    bulk write. With FEASIBILITY_PROCESSES > 1 the portfolio is sharded
+    across a process pool instead.
+
+    :param progress: JobProgress, progress reporter of the running job
+    :param mode: str, MODE_FULL or MODE_INCREMENTAL
+    :return: dict, summary of the run
+    """
+    feasibility_calculator = FeasibilityCalculateService()
+
+    if current_app.config["FEASIBILITY_PROCESSES"] > 1:
+        result = run_sharded_feasibility(
+            feasibility_calculator.db,
+            current_app.config,
+            feasibility_calculator.config,
+            feasibility_calculator.get_strategies(),
+            feasibility_calculator.comparables,
+            mode,
+            progress,
+        )
+        for shard in result["shards"]:
+            current_app.logger.info("Feasibility shard %s", shard)
+    else:
+        properties = feasibility_calculator.fetch_properties(
+            PROPERTY_INCREMENTAL_PROJECTION
+        )
+        # Only recompute properties whose inputs, comparables or config changed
+        processed, _ = calculate_and_store(
+            feasibility_calculator.db["properties"],
+            properties,
+            feasibility_calculator.config,
+            feasibility_calculator.get_strategies(),
+            feasibility_calculator.comparables,
+            mode,
+            current_app.config["BATCH_SIZE"],
+            progress,
+        )
+        result = {"mode": mode, "processed": processed, "total": len(properties)}
+
+    current_app.logger.info(
+        "Processed %s of %s properties (%s mode)",
+        result["processed"],
+        result["total"],
+        mode,
+    )
+    return result
+
+
 class FeasibilityService(MethodView):
     def __init__(self):
         pass
 
     def post(self):
+        mode = request.args.get("mode", MODE_INCREMENTAL)
+        if mode not in (MODE_FULL, MODE_INCREMENTAL):
+            return res.error(f"Unknown mode: {mode}"), 400
+
+        job_id = submit_job("feasibility", run_feasibility_job, mode=mode)
+        return res.success({"job_id": job_id}), 202
+
+
+def run_simulation_job(progress, trials, seed=None):
+    """
+    Run the Monte Carlo risk simulation over the FOR_SALE portfolio
+
+    :param progress: JobProgress, progress reporter of the running job
+    :param trials: int, number of trials per property
+    :param seed: int, optional seed for reproducible runs
+    :return: dict, summary of the run
+    """
+    feasibility_calculator = FeasibilityCalculateService()
+    properties = feasibility_calculator.fetch_properties(
+        PROPERTY_SIMULATION_PROJECTION
+    )
+    simulation_calculator = FeasibilitySimulationCalculator(
+        feasibility_calculator.config,
+        feasibility_calculator.get_strategies(),
+        trials,
+        seed,
+    )
+    result = simulation_calculator.run(
+        feasibility_calculator.db["properties"],
+        properties,
+        feasibility_calculator.comparables,
+        progress,
+    )
+    current_app.logger.info("Simulated %s properties", result["processed"])
+    return result
+
+
+class FeasibilitySimulationService(MethodView):
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        try:
+            trials = int(data.get("trials", DEFAULT_TRIALS))
+            seed = data.get("seed")
+            seed = int(seed) if seed is not None else None
+        except (TypeError, ValueError):
+            return res.error("trials and seed must be integers"), 400
+
+        if not 1 <= trials <= 20000:
+            return res.error("trials must be between 1 and 20000"), 400
+
+        job_id = submit_job("simulation", run_simulation_job, trials=trials, seed=seed)
+        return res.success({"job_id": job_id}), 202
+
+
+class FeasibilityScenarioService(MethodView):
+    def post(self):
+        """
+        Evaluate the FOR_SALE portfolio under a grid of configuration
+        overrides without writing to the properties collection
+        """
+        data = request.json or {}
+        base = data.get("base", {})
+        grid = data.get("grid", {})
+        try:
+            top_n = int(data.get("top_n", 10))
+        except (TypeError, ValueError):
+            return res.error("top_n must be an integer"), 400
+
+        if not 1 <= top_n <= MAX_TOP_N:
+            return res.error(f"top_n must be between 1 and {MAX_TOP_N}"), 400
+
+        error = validate_scenario_request(base, grid)
+        if error:
+            return res.error(error), 400
+
         feasibility_calculator = FeasibilityCalculateService()
-        properties = feasibility_calculator.fetch_properties()
-        batch_size = current_app.config["BATCH_SIZE"]
-        batch_results = []
 
-        for property in properties:
-            property_results = feasibility_calculator.calculate_property(property)
-            batch_results.append(property_results)
+        properties = feasibility_calculator.fetch_properties(
+            {**PROPERTY_FEASIBILITY_PROJECTION, "address": 1}
+        )
+        scenario_calculator = FeasibilityScenarioCalculator(
+            {**feasibility_calculator.config, **base},
+            feasibility_calculator.get_strategies(),
+            top_n,
+        )
+        scenarios = scenario_calculator.evaluate(
+            properties,
+            feasibility_calculator.comparables.averages,
+            build_scenarios(grid),
+        )
 
-            if len(batch_results) >= batch_size:
-                feasibility_calculator.bulk_update_properties(batch_results)
-                batch_results = []
+        current_app.logger.info(
+            "Evaluated %s scenarios over %s properties", len(scenarios), len(properties)
+        )
+        return res.success({"base": base, "scenarios": scenarios})
 
-        if batch_results:
-            feasibility_calculator.bulk_update_properties(batch_results)
 
-        current_app.logger.info("Processed all properties")
-        return jsonify({"message": "Processed all properties"}), 200
+class FeasibilityScoringService(MethodView):
+    def post(self):
+        """
+        Score an NDJSON stream of hypothetical property records and stream
+        the results back as NDJSON, one line per input record
+        """
+        feasibility_calculator = FeasibilityCalculateService()
+        results = score_ndjson(
+            request.stream,
+            feasibility_calculator.config,
+            feasibility_calculator.get_strategies(),
+            feasibility_calculator.comparables.averages,
+        )
+        return Response(
+            stream_with_context(results), mimetype="application/x-ndjson"
+        )
 
 
 class FeasibilityDetailService(MethodView):
@@ -630,6 +796,29 @@ class FeasibilityDetailService(MethodView):
         feasibility_calculator = FeasibilityCalculateService()
         property = self.get_property_by_id(property_id)
         property_results = feasibility_calculator.calculate_property(property)
+        property_results[CONFIG_VERSION_FIELD] = feasibility_calculator.config.get(
+            "version"
+        )
+        property_results[FINGERPRINT_FIELD] = compute_input_fingerprint(
+            property, feasibility_calculator.comparables
+        )
+        property_results[RESULT_VERSION_FIELD] = RESULT_VERSION
+
+        # Break-even purchase prices come from the columnar solver
+        vectorized_calculator = FeasibilityVectorizedCalculator(
+            feasibility_calculator.config, feasibility_calculator.get_strategies()
+        )
+        (vectorized_results,) = vectorized_calculator.calculate_properties(
+            [property], feasibility_calculator.comparables.averages
+        )
+        property_results.update(
+            {
+                field: value
+                for field, value in vectorized_results.items()
+                if field.endswith("max_purchase_price")
+                or field == "purchase_headroom"
+            }
+        )
 
         self.update_property(property_id, property_results)
 
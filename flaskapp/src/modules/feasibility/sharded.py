@@ -0,0 +1,231 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pymongo import MongoClient, UpdateOne
+from modules.feasibility.vectorized import FeasibilityVectorizedCalculator
+from modules.feasibility.incremental import (
+    PROPERTY_INCREMENTAL_PROJECTION,
+    select_stale_properties,
+)
+
+SHARD_BY_ID = "id"
+SHARD_BY_SUBURB = "suburb"
+
+FOR_SALE_FILTER = {"for_sale": {"$in": ["FOR_SALE"]}}
+
+
+def calculate_and_store(
+    collection, properties, config, strategies, comparables, mode, batch_size,
+    progress=None,
+):
+    """
+    Select stale properties, evaluate them with the columnar engine and bulk
+    write the results
+
+    :param collection: pymongo Collection, the properties collection
+    :param properties: list, property documents with the previous stamps
+    :param config: dict, the configuration document
+    :param strategies: dict, mapping of strategy names to IDs
+    :param comparables: ComparablesIndex, the comparables snapshot of the run
+    :param mode: str, MODE_FULL or MODE_INCREMENTAL
+    :param batch_size: int, number of updates per bulk write
+    :param progress: JobProgress, optional, started with the number of stale
+    properties and advanced after every write
+    :return: tuple, number of properties written and dict of phase timings
+    """
+    started = time.perf_counter()
+    stale_properties, stamps = select_stale_properties(
+        properties, config.get("version"), comparables, mode
+    )
+    if progress:
+        progress.start(len(stale_properties))
+
+    vectorized_calculator = FeasibilityVectorizedCalculator(config, strategies)
+    results = vectorized_calculator.calculate_properties(
+        stale_properties, comparables.averages
+    )
+    for result in results:
+        result.update(stamps[result["_id"]])
+    calculated = time.perf_counter()
+
+    for start in range(0, len(results), batch_size):
+        batch_results = results[start : start + batch_size]
+        collection.bulk_write(
+            [
+                UpdateOne({"_id": result["_id"]}, {"$set": result})
+                for result in batch_results
+            ]
+        )
+        if progress:
+            progress.advance(len(batch_results))
+    written = time.perf_counter()
+
+    return len(results), {
+        "compute_seconds": round(calculated - started, 3),
+        "write_seconds": round(written - calculated, 3),
+    }
+
+
+def partition_by_id(collection, shard_count):
+    """
+    Split the FOR_SALE properties into contiguous _id ranges of equal size
+
+    :param collection: pymongo Collection, the properties collection
+    :param shard_count: int, number of shards
+    :return: list, one MongoDB filter per shard
+    """
+    ids = [
+        doc["_id"]
+        for doc in collection.find(FOR_SALE_FILTER, {"_id": 1}).sort("_id", 1)
+    ]
+    if not ids:
+        return []
+
+    shard_size = -(-len(ids) // shard_count)
+    filters = []
+    for start in range(0, len(ids), shard_size):
+        shard_ids = ids[start : start + shard_size]
+        filters.append(
+            {
+                **FOR_SALE_FILTER,
+                "_id": {"$gte": shard_ids[0], "$lte": shard_ids[-1]},
+            }
+        )
+    return filters
+
+
+def partition_by_suburb(collection, shard_count):
+    """
+    Assign whole suburbs to shards, largest suburb first onto the least
+    loaded shard, so shards are balanced and the split is deterministic
+
+    :param collection: pymongo Collection, the properties collection
+    :param shard_count: int, number of shards
+    :return: list, one MongoDB filter per non-empty shard
+    """
+    suburbs = list(
+        collection.aggregate(
+            [
+                {"$match": FOR_SALE_FILTER},
+                {"$group": {"_id": "$suburb", "count": {"$sum": 1}}},
+            ]
+        )
+    )
+    suburbs.sort(key=lambda s: (-s["count"], str(s["_id"])))
+
+    shards = [{"count": 0, "suburbs": []} for _ in range(shard_count)]
+    for suburb in suburbs:
+        shard = min(shards, key=lambda s: s["count"])
+        shard["count"] += suburb["count"]
+        shard["suburbs"].append(suburb["_id"])
+
+    return [
+        {**FOR_SALE_FILTER, "suburb": {"$in": shard["suburbs"]}}
+        for shard in shards
+        if shard["suburbs"]
+    ]
+
+
+def run_feasibility_shard(shard):
+    """
+    Process pool entry point: load one shard with a dedicated Mongo client,
+    calculate it and write its results
+
+    :param shard: dict, shard index, filter and the shared run inputs
+    :return: dict, shard statistics and timings
+    """
+    started = time.perf_counter()
+    client = MongoClient(shard["mongo_uri"])
+    try:
+        collection = client[shard["database"]]["properties"]
+        properties = list(
+            collection.find(shard["filter"], PROPERTY_INCREMENTAL_PROJECTION)
+        )
+        loaded = time.perf_counter()
+
+        processed, timings = calculate_and_store(
+            collection,
+            properties,
+            shard["config"],
+            shard["strategies"],
+            shard["comparables"],
+            shard["mode"],
+            shard["batch_size"],
+        )
+    finally:
+        client.close()
+
+    return {
+        "shard": shard["index"],
+        "total": len(properties),
+        "processed": processed,
+        "load_seconds": round(loaded - started, 3),
+        **timings,
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_sharded_feasibility(
+    db, app_config, config, strategies, comparables, mode, progress
+):
+    """
+    Partition the portfolio and calculate the shards on a process pool
+
+    :param db: MongoDB client database instance
+    :param app_config: Flask config, provides Mongo settings and pool size
+    :param config: dict, the configuration document shared by all shards
+    :param strategies: dict, mapping of strategy names to IDs
+    :param comparables: ComparablesIndex, snapshot shared by all shards
+    :param mode: str, MODE_FULL or MODE_INCREMENTAL
+    :param progress: JobProgress, started with the number of stale properties
+    and advanced as shards complete
+    :return: dict, merged totals with per-shard timings in shard order
+    """
+    processes = app_config["FEASIBILITY_PROCESSES"]
+    shard_by = app_config["FEASIBILITY_SHARD_BY"]
+    if shard_by == SHARD_BY_SUBURB:
+        filters = partition_by_suburb(db["properties"], processes)
+    elif shard_by == SHARD_BY_ID:
+        filters = partition_by_id(db["properties"], processes)
+    else:
+        raise ValueError(f"Unknown shard strategy: {shard_by}")
+
+    shards = [
+        {
+            "index": index,
+            "filter": shard_filter,
+            "mongo_uri": app_config["MONGO_URI"],
+            "database": app_config["DATABASE"],
+            "config": config,
+            "strategies": strategies,
+            "comparables": comparables,
+            "mode": mode,
+            "batch_size": app_config["BATCH_SIZE"],
+        }
+        for index, shard_filter in enumerate(filters)
+    ]
+    # Progress counts the stale properties, like the single-process path
+    stale_properties, _ = select_stale_properties(
+        list(db["properties"].find(FOR_SALE_FILTER, PROPERTY_INCREMENTAL_PROJECTION)),
+        config.get("version"),
+        comparables,
+        mode,
+    )
+    progress.start(len(stale_properties))
+
+    # spawn keeps forked children from inheriting the parent's Mongo sockets
+    shard_results = []
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        for shard_result in executor.map(run_feasibility_shard, shards):
+            shard_results.append(shard_result)
+            progress.advance(shard_result["processed"])
+
+    return {
+        "mode": mode,
+        "shard_by": shard_by,
+        "processed": sum(s["processed"] for s in shard_results),
+        "total": sum(s["total"] for s in shard_results),
+        "shards": shard_results,
+    }
@@ -0,0 +1,208 @@
+import time
+from datetime import datetime, timezone
+import numpy as np
+from pymongo import UpdateOne
+from modules.feasibility.vectorized import (
+    COMPARABLE_PROPERTY_TYPES,
+    FeasibilityVectorizedCalculator,
+    PROPERTY_FEASIBILITY_PROJECTION,
+    STRATEGY_IDS,
+    to_float,
+)
+
+DEFAULT_TRIALS = 2000
+SIMULATION_PERCENTILES = [10, 50, 90]
+# Upper bound of trial x property cells evaluated per chunk, keeps the
+# intermediate (strategy, trial, property) arrays well inside 512 MB
+SIMULATION_BATCH_CELLS = 50000
+
+PROPERTY_SIMULATION_PROJECTION = {
+    **PROPERTY_FEASIBILITY_PROJECTION,
+    "lower_price": 1,
+    "mid_price": 1,
+    "upper_price": 1,
+}
+
+
+def sample_triangular(rng, lower, mode, upper, trials):
+    """
+    Sample a triangular distribution per property, tolerating degenerate
+    ranges where lower equals upper
+
+    :param rng: numpy Generator
+    :param lower: NumPy array, lower bound per property
+    :param mode: NumPy array, most likely value per property
+    :param upper: NumPy array, upper bound per property
+    :param trials: int, number of samples per property
+    :return: NumPy array of shape (trials, properties)
+    """
+    u = rng.random((trials, len(lower)))
+    width = upper - lower
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mode_cdf = np.where(width > 0, (mode - lower) / width, 0)
+        left = lower + np.sqrt(u * width * (mode - lower))
+        right = upper - np.sqrt((1 - u) * width * (upper - mode))
+    samples = np.where(u < mode_cdf, left, right)
+    return np.where(width > 0, samples, mode)
+
+
+class FeasibilitySimulationCalculator:
+    """
+    Monte Carlo risk simulation on top of FeasibilityVectorizedCalculator.
+
+    Purchase prices are drawn from a triangular distribution over the
+    property-profile valuation range (lower, mid, upper) and sale prices
+    from a normal distribution around each comparable average with the
+    spread of its comparable sales. Trials form an extra array axis so a
+    whole chunk of properties is simulated in one pass.
+    """
+
+    def __init__(self, config, strategies, trials=DEFAULT_TRIALS, seed=None):
+        """
+        :param config: dict, the configuration document
+        :param strategies: dict, mapping of strategy names to IDs
+        :param trials: int, number of trials per property
+        :param seed: int, optional seed for reproducible runs
+        """
+        self.calculator = FeasibilityVectorizedCalculator(config, strategies)
+        self.strategies = strategies
+        self.trials = trials
+        self.rng = np.random.default_rng(seed)
+
+    def sample_purchase_prices(self, properties, find_price):
+        """
+        Sample purchase prices from the valuation range, falling back to the
+        feasibility price when the property has no valuation
+
+        :param properties: list, property documents
+        :param find_price: NumPy array, the price used by the feasibility
+        :return: NumPy array of shape (trials, properties)
+        """
+        lower = np.array(
+            [to_float(p.get("lower_price"), np.nan) for p in properties], dtype=float
+        )
+        mid = np.array(
+            [to_float(p.get("mid_price"), np.nan) for p in properties], dtype=float
+        )
+        upper = np.array(
+            [to_float(p.get("upper_price"), np.nan) for p in properties], dtype=float
+        )
+
+        has_range = ~np.isnan(lower) & ~np.isnan(upper) & (lower <= upper)
+        lower = np.where(has_range, lower, find_price)
+        upper = np.where(has_range, upper, find_price)
+        mode = np.clip(np.where(np.isnan(mid), find_price, mid), lower, upper)
+        return sample_triangular(self.rng, lower, mode, upper, self.trials)
+
+    def sample_sale_prices(self, properties, comparable_prices, comparables):
+        """
+        Sample comparable average prices around their mean with the spread of
+        the comparable sales
+
+        :param properties: list, property documents
+        :param comparable_prices: dict, property type to average price arrays
+        :param comparables: ComparablesIndex, the comparables snapshot of the run
+        :return: dict, property type to NumPy array of shape (trials, properties)
+        """
+        sampled = {}
+        for property_type in COMPARABLE_PROPERTY_TYPES:
+            spread = np.array(
+                [
+                    comparables.get_price_spread(
+                        property_type, p.get("bed"), p.get("suburb")
+                    )
+                    for p in properties
+                ],
+                dtype=float,
+            )
+            noise = self.rng.standard_normal((self.trials, len(properties)))
+            sampled[property_type] = np.maximum(
+                comparable_prices[property_type] + noise * spread, 0
+            )
+        return sampled
+
+    def simulate(self, properties, comparables):
+        """
+        Simulate one chunk of properties
+
+        :param properties: list, property documents
+        :param comparables: ComparablesIndex, the comparables snapshot of the run
+        :return: list, one result document per property
+        """
+        columns = self.calculator.load_properties(properties)
+        comparable_prices = self.calculator.load_comparable_prices(
+            properties, comparables.averages
+        )
+
+        columns["find_price"] = self.sample_purchase_prices(
+            properties, columns["find_price"]
+        )
+        comparable_prices = self.sample_sale_prices(
+            properties, comparable_prices, comparables
+        )
+        gross_profit_on_cost = self.calculator.calculate(columns, comparable_prices)[
+            "gross_profit_on_cost"
+        ]
+
+        # (percentiles, strategies, properties) over the trial axis
+        percentiles = np.round(
+            np.percentile(gross_profit_on_cost, SIMULATION_PERCENTILES, axis=1), 4
+        )
+        feasible_probability = np.round((gross_profit_on_cost > 0).mean(axis=1), 4)
+
+        fields = {"_id": columns["_id"]}
+        for strategy_name, strategy_id in self.strategies.items():
+            index = STRATEGY_IDS.index(strategy_id)
+            for p, percentile in enumerate(SIMULATION_PERCENTILES):
+                fields[f"{strategy_name}_gross_profit_on_cost_p{percentile}"] = (
+                    percentiles[p, index].tolist()
+                )
+            fields[f"{strategy_name}_feasible_probability"] = feasible_probability[
+                index
+            ].tolist()
+
+        names = list(fields.keys())
+        return [dict(zip(names, values)) for values in zip(*fields.values())]
+
+    def run(self, collection, properties, comparables, progress=None):
+        """
+        Simulate the portfolio chunk by chunk and store the percentiles
+
+        :param collection: pymongo Collection, the properties collection
+        :param properties: list, property documents
+        :param comparables: ComparablesIndex, the comparables snapshot of the run
+        :param progress: JobProgress, optional, advanced after every chunk
+        :return: dict, summary of the run
+        """
+        started = time.perf_counter()
+        simulated_at = datetime.now(timezone.utc)
+        chunk_size = max(1, SIMULATION_BATCH_CELLS // self.trials)
+        if progress:
+            progress.start(len(properties))
+
+        for start in range(0, len(properties), chunk_size):
+            chunk = properties[start : start + chunk_size]
+            results = self.simulate(chunk, comparables)
+            collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": result.pop("_id")},
+                        {
+                            "$set": {
+                                **result,
+                                "simulation_trials": self.trials,
+                                "simulated_at": simulated_at,
+                            }
+                        },
+                    )
+                    for result in results
+                ]
+            )
+            if progress:
+                progress.advance(len(chunk))
+
+        return {
+            "trials": self.trials,
+            "processed": len(properties),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
@@ -0,0 +1,559 @@
+import logging
+import numpy as np
+from util.constant import (
+    PROPERTY_TYPE_HOUSE,
+    PROPERTY_TYPE_DUPLEX,
+    PROPERTY_TYPE_LAND,
+    PROPERTY_TYPE_TOWN_HOUSE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Fields of a property document the feasibility math depends on
+PROPERTY_FEASIBILITY_PROJECTION = {
+    "_id": 1,
+    "size": 1,
+    "home_size": 1,
+    "minimum_lot_size_subdivision": 1,
+    "minimum_lot_size_duplex": 1,
+    "find_price": 1,
+    "bed": 1,
+    "suburb": 1,
+}
+
+# Numeric property fields and the defaults FeasibilityCalculateService applies
+NUMERIC_COLUMN_DEFAULTS = {
+    "size": 0,
+    "home_size": 450,
+    "minimum_lot_size_subdivision": 600,
+    "minimum_lot_size_duplex": 600,
+    "find_price": 0,
+}
+
+# Per-strategy coefficients, one entry per strategy id 1..6. They encode the
+# branches of FeasibilityCalculateService so every strategy can be evaluated
+# in a single broadcast instead of an if/elif chain per property.
+STRATEGY_IDS = [1, 2, 3, 4, 5, 6]
+KEEPS_EXISTING_HOUSE = [1, 1, 0, 0, 1, 1]
+USES_DUPLEX_LOT_SIZE = [0, 0, 0, 1, 1, 0]
+IS_TOWNHOUSE = [0, 0, 0, 0, 0, 1]
+IS_RENOVATION = [0, 1, 0, 0, 1, 0]
+IS_EXTENDED_PROJECT = [0, 0, 0, 1, 1, 1]
+HAS_RENTAL_TERM = [1, 1, 0, 0, 1, 0]
+SLOPE_A_1_HOUSES = [1, 1, 1, 0, 2, 1]
+SLOPE_A_2_HOUSES = [0, 0, 0, 2, 0, 0]
+SLOPE_A_2_FIXED = [1, 1, 0, 0, 1, 0]
+SLOPE_B_1_HOUSES = [0, 0, 1, 0, 0, 0]
+SLOPE_B_1_FIXED = [0, 0, 0, 1, 0, 1]
+SLOPE_B_2_HOUSES = [0, 0, 0, 2, 2, 1]
+
+# Which comparable average is used as the new-build sale price per strategy
+NEW_BUILD_PROPERTY_TYPE = [
+    PROPERTY_TYPE_LAND,
+    PROPERTY_TYPE_LAND,
+    PROPERTY_TYPE_LAND,
+    PROPERTY_TYPE_DUPLEX,
+    PROPERTY_TYPE_DUPLEX,
+    PROPERTY_TYPE_TOWN_HOUSE,
+]
+
+COMPARABLE_PROPERTY_TYPES = [
+    PROPERTY_TYPE_HOUSE,
+    PROPERTY_TYPE_DUPLEX,
+    PROPERTY_TYPE_LAND,
+    PROPERTY_TYPE_TOWN_HOUSE,
+]
+
+# Configuration fields calculate reads, the ones a scenario can override
+CALCULATION_CONFIG_FIELDS = [
+    "useable_land",
+    "average_house_m2",
+    "renovation_uplift",
+    "net_rental_income_per_week",
+    "agents_commission",
+    "conveyancing_settlement_costs",
+    "advertising_and_marketing",
+    "rental_term_months",
+    "renovation_costs",
+    "infrastructure_exceptional_costs",
+    "build_cost_m2",
+    "months_to_finance",
+    "civil_costs_per_block",
+    "demolition_costs",
+    "professional_fees_based_on_construction_cost",
+    "contingencies_based_on_build_cost",
+    "council_contributions_per_house",
+    "rates_utilities_land_tax",
+    "interest_on_development_costs",
+    "bank_fees",
+    "brokers_fees",
+    "other_lending_costs",
+    "stamp_duty",
+    "titles_office_transfer_on_purchase",
+    "rates_adjustments_at_settlement",
+    "conveyancing_fees",
+    "miscellaneous_bank_fees",
+    "mortgage_registration_fee",
+    "title_transfer_fee",
+    "bank_legal_fees_on_purchase",
+    "bank_property_valuation",
+    "bank_loan_application_fee",
+    "insurance_on_existing_buildings",
+    "rates",
+    "other",
+    "project_duration_months",
+]
+
+# Gross margin the break-even solver targets when the configuration has none
+DEFAULT_TARGET_GROSS_MARGIN = 0.2
+
+RESULT_FIELDS = [
+    "gross_profit",
+    "gross_profit_on_cost",
+    "gross_profit_per_house",
+    "net_profit_after_gst",
+    "net_profit_on_cost",
+    "net_profit_per_house",
+]
+
+
+def to_float(value, default):
+    """
+    Convert a document value to float, falling back to the default for
+    missing values
+
+    :param value: any, the raw document value
+    :param default: float, the value used when the input is None
+    :return: float, converted value
+    """
+    if value is None:
+        return float(default)
+    return float(value)
+
+
+class FeasibilityVectorizedCalculator:
+    """
+    Columnar counterpart of FeasibilityCalculateService.
+
+    Properties are loaded once into NumPy arrays and all strategies are
+    evaluated for the whole portfolio with array operations. Results match
+    FeasibilityCalculateService.calculate_property field for field.
+    """
+
+    def __init__(self, config, strategies):
+        """
+        :param config: dict, the configuration document
+        :param strategies: dict, mapping of strategy names to IDs
+        """
+        self.config = config
+        self.strategies = strategies
+
+    def load_properties(self, properties):
+        """
+        Load property documents into column arrays
+
+        :param properties: list, property documents
+        :return: dict, column name to NumPy array
+        """
+        columns = {"_id": [p["_id"] for p in properties]}
+        for name, default in NUMERIC_COLUMN_DEFAULTS.items():
+            columns[name] = np.array(
+                [to_float(p.get(name), default) for p in properties], dtype=float
+            )
+        return columns
+
+    def load_comparable_prices(self, properties, comparable_averages):
+        """
+        Resolve the comparable average price of every property type for each
+        property
+
+        :param properties: list, property documents
+        :param comparable_averages: dict, (property_type, bed, suburb) to average price
+        :return: dict, property type to NumPy array of average prices
+        """
+        return {
+            property_type: np.array(
+                [
+                    to_float(
+                        comparable_averages.get(
+                            (property_type, p.get("bed"), p.get("suburb"))
+                        ),
+                        0,
+                    )
+                    for p in properties
+                ],
+                dtype=float,
+            )
+            for property_type in COMPARABLE_PROPERTY_TYPES
+        }
+
+    def strategy_column(self, values, ndim):
+        """
+        Shape a per-strategy list so it broadcasts against property arrays
+
+        :param values: list, one value per strategy
+        :param ndim: int, number of dimensions of the property arrays
+        :return: NumPy array of shape (strategies, 1, ..., 1)
+        """
+        return np.asarray(values, dtype=float).reshape((-1,) + (1,) * ndim)
+
+    def calculate_number_of_houses(self, columns, ndim):
+        """
+        Vectorized calculate_number_of_houses for every strategy
+
+        :param columns: dict, property column arrays
+        :param ndim: int, number of dimensions of the property arrays
+        :return: NumPy array of shape (strategies, ...)
+        """
+        gross_site_area = columns["size"]
+        home_size = columns["home_size"] * self.strategy_column(
+            KEEPS_EXISTING_HOUSE, ndim
+        )
+        minimum_lot_size = np.where(
+            self.strategy_column(USES_DUPLEX_LOT_SIZE, ndim) > 0,
+            columns["minimum_lot_size_duplex"],
+            columns["minimum_lot_size_subdivision"],
+        )
+        useable_land_input = np.asarray(self.config.get("useable_land"), dtype=float)
+        useable_land = np.where(
+            gross_site_area != 0,
+            (gross_site_area - home_size) * (1 - useable_land_input),
+            0,
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # A lot size of 0 or less cannot be subdivided, like a property
+            # without land the strategy builds no house
+            subdivided = np.where(
+                minimum_lot_size > 0, np.floor(useable_land / minimum_lot_size), 0
+            )
+            townhouses = gross_site_area / self.config.get("average_house_m2", 135)
+
+        return np.where(
+            self.strategy_column(IS_TOWNHOUSE, ndim) > 0, townhouses, subdivided
+        )
+
+    def calculate(self, columns, comparable_prices):
+        """
+        Evaluate all strategies for all properties
+
+        Inputs may be any broadcast-compatible shape, and numeric config values
+        may be arrays that broadcast against them (e.g. one row per scenario);
+        results carry a leading strategy axis in the order of STRATEGY_IDS.
+
+        :param columns: dict, property column arrays
+        :param comparable_prices: dict, property type to average price arrays
+        :return: dict, result field name to NumPy array
+        """
+        config = self.config
+        find_price = columns["find_price"]
+        ndim = len(
+            np.broadcast_shapes(
+                *[np.shape(columns[name]) for name in NUMERIC_COLUMN_DEFAULTS],
+                *[np.shape(prices) for prices in comparable_prices.values()],
+            )
+        )
+
+        def column(values):
+            return self.strategy_column(values, ndim)
+
+        number_of_houses = self.calculate_number_of_houses(columns, ndim)
+
+        # Net Realisation - (Box A)
+        avg_sold_price = np.stack(
+            np.broadcast_arrays(
+                *[comparable_prices[t] for t in NEW_BUILD_PROPERTY_TYPE]
+            )
+        )
+        renovation_uplift = config.get("renovation_uplift")
+        sale_price_existing_houses = comparable_prices[PROPERTY_TYPE_HOUSE] * (
+            1 + renovation_uplift * column(IS_RENOVATION)
+        )
+
+        net_rental_income_per_week = config.get("net_rental_income_per_week") * 4
+        agents_commission = config.get("agents_commission")
+        legal_expenses = config.get("conveyancing_settlement_costs")
+        advertising_marketing = config.get("advertising_and_marketing")
+        months = column(HAS_RENTAL_TERM) * config.get("rental_term_months", 0)
+
+        slope_a_1 = number_of_houses * column(SLOPE_A_1_HOUSES)
+        slope_a_2 = number_of_houses * column(SLOPE_A_2_HOUSES) + column(
+            SLOPE_A_2_FIXED
+        )
+        nr_to_sell = slope_a_1 + slope_a_2
+
+        sum_avg_sold_price_duplexes_houses = (
+            avg_sold_price * slope_a_1 + sale_price_existing_houses * slope_a_2
+        )
+        gross_realisation = (
+            sum_avg_sold_price_duplexes_houses + net_rental_income_per_week * months
+        )
+        less_selling_costs = (
+            sum_avg_sold_price_duplexes_houses * agents_commission
+            + sum_avg_sold_price_duplexes_houses * legal_expenses
+            + advertising_marketing
+        )
+        net_realisation = gross_realisation - less_selling_costs
+
+        # Development Costs - (Box B)
+        renovation_costs = np.where(
+            column(IS_RENOVATION) > 0,
+            config.get("renovation_costs") * find_price,
+            config.get("infrastructure_exceptional_costs"),
+        )
+        average_build_cost_per_house = config.get("average_house_m2") * config.get(
+            "build_cost_m2"
+        )
+        months_to_finance = config.get("months_to_finance") + 6 * column(
+            IS_EXTENDED_PROJECT
+        )
+
+        slope_b_1 = number_of_houses * column(SLOPE_B_1_HOUSES) + column(
+            SLOPE_B_1_FIXED
+        )
+        slope_b_2 = number_of_houses * column(SLOPE_B_2_HOUSES)
+        slope_b_3 = nr_to_sell - slope_b_1
+
+        cost_to_build_houses = (
+            config.get("civil_costs_per_block") * slope_a_1
+            + config.get("demolition_costs") * slope_b_1
+            + renovation_costs
+            + average_build_cost_per_house * slope_b_2
+        )
+        professional_fees = cost_to_build_houses * config.get(
+            "professional_fees_based_on_construction_cost"
+        )
+        contingencies = cost_to_build_houses * config.get(
+            "contingencies_based_on_build_cost"
+        )
+        council_contributions_rates_utilities = (
+            config.get("council_contributions_per_house") * slope_b_3
+            + config.get("rates_utilities_land_tax") * slope_a_1
+        )
+        total_costs_and_fees = (
+            cost_to_build_houses
+            + professional_fees
+            + contingencies
+            + council_contributions_rates_utilities
+        )
+        interest_and_bank_fees = (
+            total_costs_and_fees
+            * config.get("interest_on_development_costs")
+            * months_to_finance
+            / 12
+            + total_costs_and_fees
+            * (
+                config.get("bank_fees")
+                + config.get("brokers_fees")
+                + config.get("other_lending_costs")
+            )
+        )
+        total_development_costs = total_costs_and_fees + interest_and_bank_fees
+
+        # Purchase Costs - (Box C)
+        stamp_duty = config.get("stamp_duty", 0.05)
+        legal_costs_house_purchase = sum(
+            [
+                config.get("titles_office_transfer_on_purchase", 0),
+                config.get("rates_adjustments_at_settlement", 0),
+                config.get("conveyancing_fees", 0.005),
+                config.get("miscellaneous_bank_fees", 0),
+                config.get("mortgage_registration_fee", 0),
+                config.get("title_transfer_fee", 0),
+                config.get("bank_legal_fees_on_purchase", 0.005),
+                config.get("bank_property_valuation", 0),
+                config.get("bank_loan_application_fee", 0),
+                config.get("insurance_on_existing_buildings", 0),
+                config.get("rates", 0),
+                config.get("other", 0),
+            ]
+        )
+        purchase_costs_fees = 0
+        interest_on_purchase_costs = 0.05
+        project_duration_months = config.get("project_duration_months", 12) + 6 * (
+            column(IS_EXTENDED_PROJECT)
+        )
+
+        purchase_costs = find_price * (1 + stamp_duty + legal_costs_house_purchase)
+        interest_charges_fees_for_land = (
+            purchase_costs * purchase_costs_fees
+            + purchase_costs * interest_on_purchase_costs * project_duration_months / 12
+        )
+        total_purchase_costs = purchase_costs + interest_charges_fees_for_land
+
+        # Gross Profit
+        gross_profit = net_realisation - total_development_costs - total_purchase_costs
+        sum_cost = total_development_costs + total_purchase_costs + less_selling_costs
+
+        # Net Profit
+        left_part = gross_realisation - (gross_realisation - find_price) / 11
+        middle_part = (
+            less_selling_costs
+            + cost_to_build_houses
+            + professional_fees
+            + contingencies
+            + find_price * legal_costs_house_purchase
+        ) * (1 - 1 / 11)
+        right_part = (
+            council_contributions_rates_utilities
+            + interest_and_bank_fees
+            + interest_charges_fees_for_land
+            + find_price * (1 + stamp_duty)
+        )
+        net_profit_after_gst = left_part - middle_part - right_part
+
+        # Strategy 5 excludes the existing house and rent from the GST margin
+        reno_duplex = STRATEGY_IDS.index(5)
+        duplex_sales = comparable_prices[PROPERTY_TYPE_DUPLEX] * slope_a_1[reno_duplex]
+        net_profit_after_gst[reno_duplex] = (
+            duplex_sales
+            - (duplex_sales - find_price) / 11
+            - middle_part[reno_duplex]
+            - right_part[reno_duplex]
+        )
+
+        return {
+            "gross_profit": gross_profit,
+            "gross_profit_on_cost": self.safe_divide(gross_profit, sum_cost),
+            "gross_profit_per_house": self.safe_divide(gross_profit, nr_to_sell),
+            "net_profit_after_gst": net_profit_after_gst,
+            "net_profit_on_cost": self.safe_divide(net_profit_after_gst, sum_cost),
+            "net_profit_per_house": self.safe_divide(
+                net_profit_after_gst, nr_to_sell
+            ),
+            "total_development_costs": total_development_costs,
+            "total_purchase_costs": total_purchase_costs,
+            "less_selling_costs": less_selling_costs,
+        }
+
+    def safe_divide(self, numerator, denominator):
+        """
+        Element-wise division returning 0 where the denominator is 0
+
+        :param numerator: NumPy array
+        :param denominator: NumPy array
+        :return: NumPy array
+        """
+        numerator, denominator = np.broadcast_arrays(numerator, denominator)
+        return np.divide(
+            numerator,
+            denominator,
+            out=np.zeros(numerator.shape, dtype=float),
+            where=denominator != 0,
+        )
+
+    def summarise(self, results):
+        """
+        Round results and derive highest_margin and feasible per property
+
+        :param results: dict, output of calculate
+        :return: dict, rounded result arrays plus highest_margin and feasible
+        """
+        rounded = {field: np.round(results[field], 2) for field in RESULT_FIELDS}
+        gross_profit_on_cost = rounded["gross_profit_on_cost"]
+        rounded["highest_margin"] = gross_profit_on_cost.max(axis=0)
+        rounded["feasible"] = (gross_profit_on_cost > 0).any(axis=0)
+        return rounded
+
+    def calculate_max_purchase_price(self, columns, comparable_prices):
+        """
+        Solve for the highest purchase price that still reaches the target
+        gross margin, per strategy and property.
+
+        Gross profit and total cost are both linear in find_price, so two
+        evaluations (at a price of 0 and 1) give their intercepts and slopes
+        and the break-even price follows in closed form:
+        (profit_0 - target * cost_0) / (profit_slope + target * cost_slope)
+
+        :param columns: dict, property column arrays
+        :param comparable_prices: dict, property type to average price arrays
+        :return: NumPy array of shape (strategies, ...), never below 0
+        """
+        target = self.config.get("target_gross_margin", DEFAULT_TARGET_GROSS_MARGIN)
+        find_price = columns["find_price"]
+        at_zero = self.calculate(
+            {**columns, "find_price": np.zeros_like(find_price)}, comparable_prices
+        )
+        at_one = self.calculate(
+            {**columns, "find_price": np.ones_like(find_price)}, comparable_prices
+        )
+
+        def total_cost(results):
+            return (
+                results["total_development_costs"]
+                + results["total_purchase_costs"]
+                + results["less_selling_costs"]
+            )
+
+        profit = at_zero["gross_profit"]
+        profit_slope = profit - at_one["gross_profit"]
+        cost = total_cost(at_zero)
+        cost_slope = total_cost(at_one) - cost
+
+        max_purchase_price = self.safe_divide(
+            profit - target * cost, profit_slope + target * cost_slope
+        )
+        return np.maximum(max_purchase_price, 0)
+
+    def calculate_properties(self, properties, comparable_averages):
+        """
+        Calculate feasibility for a list of property documents
+
+        :param properties: list, property documents
+        :param comparable_averages: dict, (property_type, bed, suburb) to average price
+        :return: list, one result document per property, as produced by
+        FeasibilityCalculateService.calculate_property plus the break-even
+        purchase prices
+        """
+        if not properties:
+            return []
+
+        columns = self.load_properties(properties)
+        comparable_prices = self.load_comparable_prices(
+            properties, comparable_averages
+        )
+        invalid_lot_size = (columns["minimum_lot_size_subdivision"] <= 0) | (
+            columns["minimum_lot_size_duplex"] <= 0
+        )
+        if invalid_lot_size.any():
+            logger.warning(
+                "Properties with a minimum lot size of 0 or less, evaluated "
+                "without subdivision: %s",
+                [str(columns["_id"][i]) for i in np.flatnonzero(invalid_lot_size)],
+            )
+        summary = self.summarise(self.calculate(columns, comparable_prices))
+
+        max_purchase_price = self.calculate_max_purchase_price(
+            columns, comparable_prices
+        )
+        summary["max_purchase_price"] = np.round(max_purchase_price, 2)
+        best_price = max_purchase_price.max(axis=0)
+        summary["best_max_purchase_price"] = np.round(best_price, 2)
+        summary["purchase_headroom"] = np.round(best_price - columns["find_price"], 2)
+        return self.to_documents(columns["_id"], summary)
+
+    def to_documents(self, ids, summary):
+        """
+        Convert summarised result arrays back into per-property documents
+
+        :param ids: list, property IDs in column order
+        :param summary: dict, output of summarise
+        :return: list, result documents keyed by _id
+        """
+        fields = {"_id": ids}
+        for strategy_name, strategy_id in self.strategies.items():
+            index = STRATEGY_IDS.index(strategy_id)
+            for field in RESULT_FIELDS:
+                fields[f"{strategy_name}_{field}"] = summary[field][index].tolist()
+            if "max_purchase_price" in summary:
+                fields[f"{strategy_name}_max_purchase_price"] = summary[
+                    "max_purchase_price"
+                ][index].tolist()
+        fields["highest_margin"] = summary["highest_margin"].tolist()
+        fields["feasible"] = summary["feasible"].tolist()
+        if "max_purchase_price" in summary:
+            fields["max_purchase_price"] = summary["best_max_purchase_price"].tolist()
+            fields["purchase_headroom"] = summary["purchase_headroom"].tolist()
+
+        names = list(fields.keys())
+        return [dict(zip(names, values)) for values in zip(*fields.values())]
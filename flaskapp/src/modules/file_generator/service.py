@@ -5,6 +5,8 @@ from modules.file_generator.excel_generator import ExcelGenerator
 from bson import ObjectId
 import pandas as pd
 from db import get_db, fetch_data_from_db, convert_objectid_to_str
+from modules.summary.comparables import get_comparables_index
+from modules.feasibility.configuration import get_configuration
 
 
 class PropertiesExcelGenerator(MethodView):
@@ -89,17 +91,6 @@ class PropertyDetailExcelGenerator(MethodView):
         if not property_id:
             return jsonify({"error": "property_id parameter is required"}), 400
         try:
-            configuration_projection = {
-                "_id": 0,
-                "version": 0,
-            }
-            configuration_data = fetch_data_from_db(
-                db=self.db_client,
-                collection_name="configuration",
-                projection=configuration_projection,
-                sort=[("version", -1)],
-            )
-
             projection = {
                 "_id": 0,
                 "address": 1,
@@ -135,10 +126,13 @@ class PropertyDetailExcelGenerator(MethodView):
 
             # Convert ObjectId to string and lists to strings
             property_data = convert_objectid_to_str(property_data)
-            configuration_data = convert_objectid_to_str(configuration_data)
 
             property_record = property_data[0]
-            configuration_record = configuration_data[0]
+            configuration_record = {
+                field: value
+                for field, value in get_configuration(self.db_client).items()
+                if field not in ("_id", "version")
+            }
             merged_data = {**property_record, **configuration_record}
 
             self.generator.write_input_sheet(merged_data)
@@ -152,13 +146,8 @@ class PropertyDetailExcelGenerator(MethodView):
             self.generator.write_comparable_data_sheet(sold_properties)
 
             # write comparable average
-            comparable_data = fetch_data_from_db(
-                db=self.db_client,
-                collection_name="comparable_summary",
-                filter={
-                    "suburb": property_record.get("suburb"),
-                    "bed": property_record.get("bed"),
-                },
+            comparable_data = get_comparables_index(self.db_client).get_summaries(
+                property_record.get("suburb"), property_record.get("bed")
             )
             self.generator.write_comparable_summary_sheet(comparable_data)
             file_data = self.generator.get_file()
@@ -0,0 +1,10 @@
+from flask import Blueprint
+from modules.jobs.service import JobStatusService
+
+
+jobs_bp = Blueprint("jobs_bp", __name__)
+jobs_bp.add_url_rule(
+    "/jobs/<string:job_id>",
+    view_func=JobStatusService.as_view("job-status"),
+    methods=["GET"],
+)
@@ -0,0 +1,339 @@
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from flask import Flask, current_app
+from bson import ObjectId
+from db import get_db
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+
+JOB_FINISHED_STATUSES = [JOB_STATUS_COMPLETED, JOB_STATUS_FAILED]
+
+JOB_ORPHANED_ERROR = "Job lost, the process running it stopped"
+
+# Worker processes running the jobs of this web process
+_executor = None
+_executor_lock = threading.Lock()
+# Jobs submitted by this process and not finished, kept alive by heartbeats
+_pending_jobs = set()
+_heartbeat = None
+
+# Application of a job worker process, created once per worker
+_job_app = None
+
+
+def init_job_process():
+    """
+    Job worker initializer: a minimal application giving the jobs their
+    config, logger and database
+    """
+    from config import Config
+
+    global _job_app
+    _job_app = Flask(__name__)
+    _job_app.config.from_object(Config)
+
+
+def get_executor(broken=None):
+    """
+    Get the process-wide job executor, creating it on first use
+
+    Jobs run in separate processes so their Python-level work does not
+    hold the GIL of the web worker serving requests.
+
+    :param broken: ProcessPoolExecutor, an executor found broken by a dead
+    worker process, replaced by a new one
+    :return: ProcessPoolExecutor
+    """
+    global _executor, _heartbeat
+    with _executor_lock:
+        if _executor is None or _executor is broken:
+            # spawn keeps forked children from inheriting the Mongo sockets
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config["JOB_WORKERS"],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_job_process,
+            )
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(
+                target=beat_pending_jobs,
+                args=(current_app._get_current_object(),),
+                name="job-heartbeat",
+                daemon=True,
+            )
+            _heartbeat.start()
+        return _executor
+
+
+def beat_pending_jobs(app):
+    """
+    Refresh the heartbeat of the jobs this process queued or runs, a job
+    whose heartbeat stops is failed as orphaned
+
+    :param app: Flask, the application the jobs belong to
+    """
+    while True:
+        time.sleep(app.config["JOB_HEARTBEAT_SECONDS"])
+        job_ids = list(_pending_jobs)
+        if not job_ids:
+            continue
+        try:
+            with app.app_context():
+                get_db()["jobs"].update_many(
+                    {"_id": {"$in": job_ids}},
+                    {"$set": {"heartbeat_at": datetime.now(timezone.utc)}},
+                )
+        except Exception:
+            app.logger.error("Job heartbeat failed: %s", traceback.format_exc())
+
+
+def orphaned_filter():
+    """
+    Filter of the unfinished jobs whose heartbeat stopped, their process was
+    restarted or killed and nothing will finish them
+
+    :return: dict, MongoDB filter
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=current_app.config["JOB_ORPHANED_SECONDS"]
+    )
+    return {
+        "status": {"$in": [JOB_STATUS_QUEUED, JOB_STATUS_RUNNING]},
+        "$or": [
+            {"heartbeat_at": {"$lt": cutoff}},
+            {"heartbeat_at": {"$exists": False}},
+        ],
+    }
+
+
+def fail_orphaned_jobs(db, job_id=None):
+    """
+    Mark orphaned jobs failed, so pollers stop waiting on them
+
+    :param db: MongoDB client database instance
+    :param job_id: ObjectId, only check this job, all jobs when None
+    :return: int, number of jobs failed
+    """
+    orphaned = orphaned_filter()
+    if job_id is not None:
+        orphaned["_id"] = job_id
+    now = datetime.now(timezone.utc)
+    result = db["jobs"].update_many(
+        orphaned,
+        {
+            "$set": {
+                "status": JOB_STATUS_FAILED,
+                "error": JOB_ORPHANED_ERROR,
+                "finished_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+    return result.modified_count
+
+
+class JobProgress:
+    """
+    Progress reporter handed to a running job. Every update is persisted to
+    the jobs collection so status can be read from any process.
+    """
+
+    def __init__(self, db, job_id):
+        """
+        :param db: MongoDB client database instance
+        :param job_id: ObjectId, the job being reported on
+        """
+        self.collection = db["jobs"]
+        self.job_id = job_id
+        self.processed = 0
+
+    def update(self, fields):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        self.collection.update_one({"_id": self.job_id}, {"$set": fields})
+
+    def start(self, total):
+        """
+        Record the number of items the job will process
+
+        :param total: int, number of items
+        """
+        self.processed = 0
+        self.update({"total": total, "processed": 0})
+
+    def advance(self, count=1):
+        """
+        Record that more items have been processed
+
+        :param count: int, number of items processed since the last call
+        """
+        self.processed += count
+        self.update({"processed": self.processed})
+
+
+def create_job(db, job_type, params):
+    """
+    Insert a queued job record
+
+    :param db: MongoDB client database instance
+    :param job_type: str, the kind of job (summary, feasibility, ...)
+    :param params: dict, parameters the job was submitted with
+    :return: ObjectId, the job ID
+    """
+    now = datetime.now(timezone.utc)
+    job_id = ObjectId()
+    db["jobs"].insert_one(
+        {
+            "_id": job_id,
+            "type": job_type,
+            "params": params,
+            "status": JOB_STATUS_QUEUED,
+            "processed": 0,
+            "total": None,
+            "created_at": now,
+            "updated_at": now,
+            "heartbeat_at": now,
+        }
+    )
+    return job_id
+
+
+def run_job(job_id, func, params):
+    """
+    Execute a job inside the worker's application context and record its
+    outcome
+
+    :param job_id: ObjectId, the job ID
+    :param func: callable, invoked as func(progress, **params)
+    :param params: dict, keyword arguments for func
+    """
+    app = _job_app
+    with app.app_context():
+        progress = JobProgress(get_db(), job_id)
+        progress.update(
+            {"status": JOB_STATUS_RUNNING, "started_at": datetime.now(timezone.utc)}
+        )
+        try:
+            result = func(progress, **params)
+        except Exception as e:
+            app.logger.error("Job %s failed: %s", job_id, traceback.format_exc())
+            progress.update(
+                {
+                    "status": JOB_STATUS_FAILED,
+                    "error": str(e),
+                    "finished_at": datetime.now(timezone.utc),
+                }
+            )
+            return
+
+        progress.update(
+            {
+                "status": JOB_STATUS_COMPLETED,
+                "result": result,
+                "finished_at": datetime.now(timezone.utc),
+            }
+        )
+        app.logger.info("Job %s completed", job_id)
+
+
+def job_done(app, job_id, future):
+    """
+    Stop the heartbeat of a finished job and fail it if its worker process
+    died before it could record an outcome
+
+    :param app: Flask, the application the job belongs to
+    :param job_id: ObjectId, the job ID
+    :param future: Future, the job's future
+    """
+    _pending_jobs.discard(job_id)
+    if future.cancelled() or future.exception() is None:
+        return
+    error = str(future.exception())
+    app.logger.error("Job %s lost its worker: %s", job_id, error)
+    with app.app_context():
+        now = datetime.now(timezone.utc)
+        get_db()["jobs"].update_one(
+            {
+                "_id": job_id,
+                "status": {"$in": [JOB_STATUS_QUEUED, JOB_STATUS_RUNNING]},
+            },
+            {
+                "$set": {
+                    "status": JOB_STATUS_FAILED,
+                    "error": error,
+                    "finished_at": now,
+                    "updated_at": now,
+                }
+            },
+        )
+
+
+def submit_job(job_type, func, **params):
+    """
+    Queue a job on the worker processes and return immediately
+
+    :param job_type: str, the kind of job (summary, feasibility, ...)
+    :param func: callable, a module-level function invoked as
+    func(progress, **params) in a worker process
+    :param params: keyword arguments for func, stored with the job record
+    :return: str, the job ID
+    """
+    job_id = create_job(get_db(), job_type, params)
+    _pending_jobs.add(job_id)
+    executor = get_executor()
+    try:
+        future = executor.submit(run_job, job_id, func, params)
+    except BrokenProcessPool:
+        # A worker process died, the pool takes no more jobs
+        future = get_executor(broken=executor).submit(run_job, job_id, func, params)
+    app = current_app._get_current_object()
+    future.add_done_callback(lambda f: job_done(app, job_id, f))
+    return str(job_id)
+
+
+def describe_job(job):
+    """
+    Convert a job record into a status payload with throughput and ETA
+
+    :param job: dict, job document
+    :return: dict, JSON-serialisable job status
+    """
+    processed = job.get("processed") or 0
+    total = job.get("total")
+    started_at = job.get("started_at")
+    ended_at = job.get("finished_at") or datetime.now(timezone.utc)
+
+    throughput = None
+    eta_seconds = None
+    if started_at:
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        if ended_at.tzinfo is None:
+            ended_at = ended_at.replace(tzinfo=timezone.utc)
+        elapsed = (ended_at - started_at).total_seconds()
+        if elapsed > 0 and processed:
+            throughput = round(processed / elapsed, 2)
+        running = job.get("status") == JOB_STATUS_RUNNING
+        if throughput and total is not None and running:
+            eta_seconds = round((total - processed) / throughput, 1)
+
+    return {
+        "job_id": str(job["_id"]),
+        "type": job.get("type"),
+        "status": job.get("status"),
+        "processed": processed,
+        "total": total,
+        "throughput_per_second": throughput,
+        "eta_seconds": eta_seconds,
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
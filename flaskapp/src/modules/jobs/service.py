@@ -0,0 +1,35 @@
+from flask.views import MethodView
+from bson import ObjectId
+from bson.errors import InvalidId
+from db import get_db
+from util import res
+from modules.jobs.runner import (
+    JOB_FINISHED_STATUSES,
+    describe_job,
+    fail_orphaned_jobs,
+)
+
+
+class JobStatusService(MethodView):
+    def __init__(self):
+        """
+        Initialize the JobStatusService class with a database client
+        """
+        self.db_client = get_db()
+
+    def get(self, job_id):
+        try:
+            job = self.db_client.jobs.find_one({"_id": ObjectId(job_id)})
+        except InvalidId:
+            return res.error("Invalid job ID"), 400
+
+        if not job:
+            return res.error("Job not found"), 404
+
+        # Report a job whose process is gone as failed instead of running
+        if job.get("status") not in JOB_FINISHED_STATUSES and fail_orphaned_jobs(
+            self.db_client, job["_id"]
+        ):
+            job = self.db_client.jobs.find_one({"_id": job["_id"]})
+
+        return res.success(describe_job(job))
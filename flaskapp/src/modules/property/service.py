@@ -7,6 +7,7 @@ from util import res, req
 
 # from flask_smorest import Blueprint
 from db import get_db
+from modules.feasibility.configuration import get_configuration
 
 
 class PropertyDetailService(MethodView):
@@ -121,6 +122,15 @@ class PropertyListService(MethodView):
         if query.get("feasible"):
             filter["feasible"] = query.get("feasible")
 
+        if query.get("min_purchase_headroom"):
+            try:
+                min_purchase_headroom = float(query.get("min_purchase_headroom"))
+            except ValueError:
+                min_purchase_headroom = math.nan
+            if not math.isfinite(min_purchase_headroom):
+                return res.error("min_purchase_headroom must be a number"), 400
+            filter["purchase_headroom"] = {"$gte": min_purchase_headroom}
+
         if query.get("keyword"):
             keyword = query.get("keyword")
             filter["$or"] = [
@@ -154,11 +164,17 @@ class PropertyListService(MethodView):
                 "f_demolish_townhouse_gross_profit_on_cost": 1,
                 "highest_margin": 1,
                 "feasible": 1,
+                "max_purchase_price": 1,
+                "purchase_headroom": 1,
             }
         })
 
-        # Add sort stage to the pipeline to sort by 'feasible' field in descending order
-        pipeline.append({"$sort": {"feasible": -1, "highest_margin": -1}})
+        if query.get("sort_by") == "purchase_headroom":
+            # Largest gap between the break-even and the asking price first
+            pipeline.append({"$sort": {"purchase_headroom": -1, "_id": 1}})
+        else:
+            # Add sort stage to the pipeline to sort by 'feasible' field in descending order
+            pipeline.append({"$sort": {"feasible": -1, "highest_margin": -1}})
 
         limit, offset, page = req.get_pagination(
             query.get("page_size"), query.get("page")
@@ -196,11 +212,10 @@ class PropertyConfigService(MethodView):
         self.db_client = get_db()
 
     def get(self):
-        config = self.db_client.configuration.find_one(
-            {},
-            {"_id": 0},
-        )
-        if not config:
+        try:
+            config = get_configuration(self.db_client)
+        except ValueError:
             return res.error("Config not found"), 404
 
+        config.pop("_id", None)
         return res.success(config)
@@ -0,0 +1,164 @@
+import statistics
+import threading
+from bson import ObjectId
+
+COMPARABLE_VERSION_COLLECTION = "comparable_version"
+COMPARABLE_VERSION_ID = "comparables"
+
+# Process-wide cached index, replaced whenever the stored version changes
+_comparables_index = None
+_comparables_lock = threading.Lock()
+
+
+class ComparablesIndex:
+    """
+    In-memory snapshot of the comparable_average and comparable_summary
+    collections for one comparables version.
+    """
+
+    def __init__(self, db, version, averages):
+        """
+        :param db: MongoDB client database instance
+        :param version: ObjectId, the comparables version this snapshot belongs to
+        :param averages: list, comparable_average documents
+        """
+        self.db = db
+        self.version = version
+        self.documents = averages
+        self.averages = {
+            (doc.get("property_type"), doc.get("bed"), doc.get("suburb")): doc.get(
+                "average_price"
+            )
+            for doc in averages
+        }
+        self.summaries = None
+        self.spreads = None
+        self.summaries_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Only the averages travel to worker processes, not the db handle
+        return {"version": self.version, "documents": self.documents}
+
+    def __setstate__(self, state):
+        self.__init__(None, state["version"], state["documents"])
+
+    @classmethod
+    def load(cls, db, version):
+        """
+        Load the comparable averages in a single query
+
+        :param db: MongoDB client database instance
+        :param version: ObjectId, the current comparables version
+        :return: ComparablesIndex
+        """
+        averages = list(db.comparable_average.find())
+        return cls(db, version, averages)
+
+    def get_average_price(self, property_type, bed, suburb):
+        """
+        Get the average sold price for a comparable group
+
+        :param property_type: str, the property type (HOUSE, DUPLEX, ...)
+        :param bed: int, number of bedrooms
+        :param suburb: str, the suburb
+        :return: float, average sold price or 0 when there are no comparables
+        """
+        average_price = self.averages.get((property_type, bed, suburb))
+        return average_price if average_price is not None else 0
+
+    def load_summaries(self):
+        """
+        Load comparable_summary on first use and derive the sold price spread
+        of every comparable group
+        """
+        with self.summaries_lock:
+            if self.summaries is not None:
+                return
+            summaries = {}
+            prices = {}
+            for doc in self.db.comparable_summary.find({}, {"_id": 0}):
+                key = (doc.get("suburb"), doc.get("bed"))
+                summaries.setdefault(key, []).append(doc)
+                if doc.get("sold_price") is not None:
+                    group = (
+                        doc.get("property_type"),
+                        doc.get("bed"),
+                        doc.get("suburb"),
+                    )
+                    prices.setdefault(group, []).append(float(doc["sold_price"]))
+            self.spreads = {
+                group: statistics.pstdev(values)
+                for group, values in prices.items()
+                if len(values) > 1
+            }
+            self.summaries = summaries
+
+    def get_summaries(self, suburb, bed):
+        """
+        Get the comparable properties for a suburb and bed count
+
+        :param suburb: str, the suburb
+        :param bed: int, number of bedrooms
+        :return: list, comparable_summary documents
+        """
+        self.load_summaries()
+        return self.summaries.get((suburb, bed), [])
+
+    def get_price_spread(self, property_type, bed, suburb):
+        """
+        Get the standard deviation of sold prices within a comparable group
+
+        :param property_type: str, the property type (HOUSE, DUPLEX, ...)
+        :param bed: int, number of bedrooms
+        :param suburb: str, the suburb
+        :return: float, price spread or 0 when there are fewer than two sales
+        """
+        self.load_summaries()
+        return self.spreads.get((property_type, bed, suburb), 0)
+
+
+def fetch_comparables_version(db):
+    """
+    Fetch the version stamped by the last comparables rebuild
+
+    :param db: MongoDB client database instance
+    :return: ObjectId, the current version or None if never stamped
+    """
+    document = db[COMPARABLE_VERSION_COLLECTION].find_one(
+        {"_id": COMPARABLE_VERSION_ID}
+    )
+    return document.get("version") if document else None
+
+
+def get_comparables_index(db):
+    """
+    Get the cached comparables index, reloading it when another process or
+    request has rebuilt the comparables since it was loaded
+
+    :param db: MongoDB client database instance
+    :return: ComparablesIndex
+    """
+    global _comparables_index
+    version = fetch_comparables_version(db)
+    with _comparables_lock:
+        if _comparables_index is None or _comparables_index.version != version:
+            _comparables_index = ComparablesIndex.load(db, version)
+        return _comparables_index
+
+
+def invalidate_comparables_index(db):
+    """
+    Stamp a new comparables version and drop the cached index so every
+    process reloads on its next lookup
+
+    :param db: MongoDB client database instance
+    :return: ObjectId, the new version
+    """
+    global _comparables_index
+    version = ObjectId()
+    db[COMPARABLE_VERSION_COLLECTION].update_one(
+        {"_id": COMPARABLE_VERSION_ID}, {"$set": {"version": version}}, upsert=True
+    )
+    with _comparables_lock:
+        _comparables_index = None
+    return version
@@ -1,8 +1,16 @@
+from datetime import datetime, timedelta, timezone
 from flask import request, jsonify, current_app
 from flask.views import MethodView
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from db import get_db
 import re
 from util import res
+from modules.summary.comparables import (
+    get_comparables_index,
+    invalidate_comparables_index,
+)
+from modules.jobs.runner import submit_job
 
 LIST_PROPERTY_MAP = {
     "HOUSE": ["House"],
@@ -11,11 +19,39 @@ LIST_PROPERTY_MAP = {
     "LAND": ["Development Site", "New Land", "Vacant Land"],
 }
 
+# Listing property types that have a comparable type
+LISTING_PROPERTY_TYPES = [
+    listing_type
+    for listing_types in LIST_PROPERTY_MAP.values()
+    for listing_type in listing_types
+]
 
-class SummaryService(MethodView):
+# Aggregation expression mapping a listing property type to its comparable type
+COMPARABLE_TYPE_EXPRESSION = {
+    "$switch": {
+        "branches": [
+            {"case": {"$in": ["$property_type", listing_types]}, "then": property_type}
+            for property_type, listing_types in LIST_PROPERTY_MAP.items()
+        ]
+    }
+}
+
+COMPARABLES_PER_GROUP = 10
+COMPARABLE_GROUP_STAGING = "comparable_group_staging"
+COMPARABLE_SUMMARY_STAGING = "comparable_summary_staging"
+COMPARABLE_AVERAGE_STAGING = "comparable_average_staging"
+
+# Lock document in the jobs collection held by the running rebuild, so two
+# rebuilds never share the staging collections or interleave their swaps.
+# It expires in case its holder died.
+COMPARABLES_REBUILD_LOCK_ID = "comparables_rebuild_lock"
+COMPARABLES_REBUILD_LOCK_SECONDS = 60 * 60
+
+
+class SummaryCalculateService:
     def __init__(self):
         """
-        Initialize the SummaryService class with a database client
+        Initialize the SummaryCalculateService class with a database client
         """
         self.db_client = get_db()
 
@@ -35,106 +71,206 @@ class SummaryService(MethodView):
         else:
             return None
 
-    def calculate_properties_summary(self, property_types):
-
-        data = self.db_client.properties.aggregate(
+    def build_comparable_groups(self):
+        """
+        Group SOLD properties by comparable type, suburb and bed count on the
+        server, keeping the 10 most recent sales of each group with only the
+        fields the summary needs, and $merge the groups into a staging
+        collection. $topN needs MongoDB 5.2 or later.
+        """
+        self.db_client[COMPARABLE_GROUP_STAGING].drop()
+        self.db_client.properties.aggregate(
             [
                 {
                     "$match": {
-                        "property_type": {"$in": property_types},
+                        "property_type": {"$in": LISTING_PROPERTY_TYPES},
                         "for_sale": "SOLD",
                     }
                 },
-                {"$sort": {"sold_date": -1}},
                 {
                     "$group": {
                         "_id": {
+                            "property_type": COMPARABLE_TYPE_EXPRESSION,
                             "suburb": "$suburb",
                             "bed": "$bed",
                         },
                         "properties": {
-                            "$push": "$$ROOT",
-                        },
-                    },
-                },
-                {
-                    "$project": {
-                        "properties": {
-                            "$slice": ["$properties", 10],
+                            "$topN": {
+                                "n": COMPARABLES_PER_GROUP,
+                                "sortBy": {"sold_date": -1},
+                                "output": {
+                                    "address": "$address",
+                                    "sold_price": {"$ifNull": ["$sold_price", 0]},
+                                    "sold_date": "$sold_date",
+                                    "bath": "$bath",
+                                    "car": "$car",
+                                    "size": "$size",
+                                },
+                            }
                         },
                     },
                 },
                 {
                     "$addFields": {
-                        "total": {"$sum": "$properties.sold_price"},
-                        "count": {"$size": "$properties"},
+                        "average_price": {
+                            "$divide": [
+                                {"$sum": "$properties.sold_price"},
+                                {"$size": "$properties"},
+                            ]
+                        },
                     }
                 },
-                {"$addFields": {"average_price": {"$divide": ["$total", "$count"]}}},
+                {"$merge": {"into": COMPARABLE_GROUP_STAGING}},
             ]
         )
-        return list(data)
 
-    def clean_comparable_summary(self):
+    def stage_comparable_collections(self):
+        """
+        Derive the comparable_summary and comparable_average documents from
+        the staged groups into their own staging collections
+        """
+        groups = self.db_client[COMPARABLE_GROUP_STAGING]
+        self.db_client[COMPARABLE_SUMMARY_STAGING].drop()
+        self.db_client[COMPARABLE_AVERAGE_STAGING].drop()
 
-        self.db_client.comparable_summary.delete_many({})
-        self.db_client.comparable_average.delete_many({})
+        groups.aggregate(
+            [
+                {"$unwind": "$properties"},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "property_type": "$_id.property_type",
+                        "suburb": "$_id.suburb",
+                        "address": "$properties.address",
+                        "sold_price": "$properties.sold_price",
+                        "sold_date": "$properties.sold_date",
+                        "bed": "$_id.bed",
+                        "bath": "$properties.bath",
+                        "car": "$properties.car",
+                        "size": "$properties.size",
+                    }
+                },
+                {"$merge": {"into": COMPARABLE_SUMMARY_STAGING}},
+            ]
+        )
+        groups.aggregate(
+            [
+                {
+                    "$project": {
+                        "_id": 0,
+                        "suburb": "$_id.suburb",
+                        "bed": "$_id.bed",
+                        "property_type": "$_id.property_type",
+                        "average_price": 1,
+                    }
+                },
+                {"$merge": {"into": COMPARABLE_AVERAGE_STAGING}},
+            ]
+        )
+        groups.drop()
 
-    def create_comparable_summary(self, property_type: str, list_group_properties=[]):
+    def swap_comparable_collections(self):
+        """
+        Replace the live comparables with the staged ones. Each rename with
+        dropTarget is atomic, so readers see either the old or the new
+        collection, never an empty one. The two renames are not atomic as a
+        pair, cached indexes only reload once the new version is stamped
+        after both.
+        """
+        for staging, target in (
+            (COMPARABLE_SUMMARY_STAGING, "comparable_summary"),
+            (COMPARABLE_AVERAGE_STAGING, "comparable_average"),
+        ):
+            if staging in self.db_client.list_collection_names():
+                self.db_client[staging].rename(target, dropTarget=True)
+            else:
+                # No SOLD properties at all, nothing was staged
+                self.db_client[target].delete_many({})
 
-        # map list properties one by one and return new object
-        data = []
-        average_data = []
-        for group_suburb in list_group_properties:
+    def acquire_rebuild_lock(self, owner):
+        """
+        Take the comparables rebuild lock
 
-            # get all average data
-            average_data.append(
+        :param owner: ObjectId, id of the rebuild taking the lock
+        :raises RuntimeError: when another rebuild holds the lock
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            # Only matches an expired lock, a held one makes the upsert
+            # insert a duplicate _id
+            self.db_client.jobs.update_one(
+                {"_id": COMPARABLES_REBUILD_LOCK_ID, "expires_at": {"$lt": now}},
                 {
-                    "suburb": group_suburb.get("_id", {}).get("suburb"),
-                    "bed": group_suburb.get("_id", {}).get("bed"),
-                    "property_type": property_type,
-                    "average_price": group_suburb.get("average_price", 0),
-                }
-            )
-            # get all properties
-            for p in group_suburb.get("properties", []):
-                data.append(
-                    {
-                        "property_type": property_type,
-                        "suburb": p.get("suburb"),
-                        "address": p.get("address"),
-                        "sold_price": p.get("sold_price", 0),
-                        "sold_date": p.get("sold_date"),
-                        "bed": p.get("bed"),
-                        "bath": p.get("bath"),
-                        "car": p.get("car"),
-                        "size": p.get("size"),
+                    "$set": {
+                        "owner": owner,
+                        "expires_at": now
+                        + timedelta(seconds=COMPARABLES_REBUILD_LOCK_SECONDS),
                     }
-                )
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            raise RuntimeError("Another comparables rebuild is running")
 
-        # insert comperable summary
-        self.db_client.comparable_summary.insert_many(data)
+    def release_rebuild_lock(self, owner):
+        """
+        Release the comparables rebuild lock if still held by the owner
 
-        # insert comperable average
-        self.db_client.comparable_average.insert_many(average_data)
+        :param owner: ObjectId, id of the rebuild that took the lock
+        """
+        self.db_client.jobs.delete_one(
+            {"_id": COMPARABLES_REBUILD_LOCK_ID, "owner": owner}
+        )
 
     def get_list_comparable_summary(self):
-        data = self.db_client.comparable_average.find()
+        data = get_comparables_index(self.db_client).documents
         list_data = []
-        for p in list(data):
+        for p in data:
+            p = dict(p)
             p["_id"] = str(p["_id"])
             list_data.append(p)
         return list_data
 
+    def rebuild(self, progress):
+        """
+        Rebuild comparable_summary and comparable_average for every property type
+
+        :param progress: JobProgress, progress reporter of the running job
+        :return: list, the rebuilt comparable averages
+        """
+        progress.start(3)
+        owner = ObjectId()
+        self.acquire_rebuild_lock(owner)
+        try:
+            # get top 10 properties of every type: HOUSE, DUPLEX, TOWNHOUSE, LAND
+            self.build_comparable_groups()
+            progress.advance()
+            self.stage_comparable_collections()
+            progress.advance()
+            self.swap_comparable_collections()
+            progress.advance()
+        finally:
+            self.release_rebuild_lock(owner)
+
+        # comparables changed, force every cached index to reload
+        invalidate_comparables_index(self.db_client)
+
+        return self.get_list_comparable_summary()
+
+
+def run_summary_job(progress):
+    """
+    Rebuild the comparables collections in the background
+
+    :param progress: JobProgress, progress reporter of the running job
+    :return: dict, summary of the run
+    """
+    data = SummaryCalculateService().rebuild(progress)
+    current_app.logger.info("Rebuilt %s comparable averages", len(data))
+    return {"comparable_averages": len(data)}
+
+
+class SummaryService(MethodView):
     def post(self):
-        self.clean_comparable_summary()
-        for property_type, property_types in LIST_PROPERTY_MAP.items():
-            # get top 10 properties each type: HOUSE, DUPLEX, TOWNHOUSE, LAND
-            list_property = self.calculate_properties_summary(property_types)
-            if not list_property:
-                continue
-            # save to summary
-            self.create_comparable_summary(property_type, list_property)
-
-        data = self.get_list_comparable_summary()
-        return res.success(data), 200
+        job_id = submit_job("summary", run_summary_job)
+        return res.success({"job_id": job_id}), 202
@@ -0,0 +1,130 @@
+import os
+import sys
+
+import pytest
+
+# The app imports its modules relative to src, as PYTHONPATH does in the image
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+SUBURBS = ["Kellyville", "Baulkham Hills", "Castle Hill"]
+
+
+@pytest.fixture
+def configuration():
+    """The configuration document init_db seeds"""
+    return {
+        "version": 1,
+        "stamp_duty": 0.05,
+        "titles_office_transfer_on_purchase": 0,
+        "rates_adjustments_at_settlement": 0,
+        "conveyancing_fees": 0.005,
+        "miscellaneous_bank_fees": 0,
+        "mortgage_registration_fee": 0,
+        "title_transfer_fee": 0,
+        "bank_legal_fees_on_purchase": 0.005,
+        "bank_property_valuation": 0,
+        "bank_loan_application_fee": 0,
+        "insurance_on_existing_buildings": 0,
+        "rates": 0,
+        "other": 0,
+        "residential_loan_lvr": 0.8,
+        "project_duration_months": 12,
+        "rental_term_months": 10,
+        "net_rental_income_per_week": 380,
+        "renovation_uplift": 0.3,
+        "agents_commission": 0.025,
+        "advertising_and_marketing": 0,
+        "conveyancing_settlement_costs": 0.005,
+        "civil_costs_per_block": 10000,
+        "demolition_costs": 30000,
+        "infrastructure_exceptional_costs": 0,
+        "professional_fees_based_on_construction_cost": 0.03,
+        "contingencies_based_on_build_cost": 0.05,
+        "average_house_m2": 135,
+        "build_cost_m2": 3000,
+        "council_contributions_per_house": 15000,
+        "rates_utilities_land_tax": 2000,
+        "months_to_finance": 12,
+        "interest_on_development_costs": 0.05,
+        "bank_fees": 0.02,
+        "brokers_fees": 0.01,
+        "other_lending_costs": 0.01,
+        "investor_input": 0.8,
+        "renovation_costs": 0.1,
+        "useable_land": 0.2,
+        "construction_deposit": 0.3,
+        "target_gross_margin": 0.2,
+    }
+
+
+@pytest.fixture
+def comparable_averages():
+    """comparable_average documents for every type, bed and suburb"""
+    from util.constant import (
+        PROPERTY_TYPE_HOUSE,
+        PROPERTY_TYPE_DUPLEX,
+        PROPERTY_TYPE_LAND,
+        PROPERTY_TYPE_TOWN_HOUSE,
+    )
+
+    base_prices = {
+        PROPERTY_TYPE_HOUSE: 1200000,
+        PROPERTY_TYPE_DUPLEX: 950000,
+        PROPERTY_TYPE_LAND: 700000,
+        PROPERTY_TYPE_TOWN_HOUSE: 800000,
+    }
+    return [
+        {
+            "property_type": property_type,
+            "bed": bed,
+            "suburb": suburb,
+            "average_price": price * (1 + 0.1 * bed) * (1 + 0.05 * index),
+        }
+        for property_type, price in base_prices.items()
+        for bed in range(1, 6)
+        for index, suburb in enumerate(SUBURBS)
+    ]
+
+
+@pytest.fixture
+def random_properties():
+    """Randomized FOR_SALE property documents, seeded per test"""
+    import numpy as np
+
+    rng = np.random.default_rng(1234)
+
+    def build(count):
+        return [
+            {
+                "_id": index,
+                "size": float(rng.choice([0, rng.uniform(100, 3000)])),
+                "home_size": float(rng.uniform(80, 500)),
+                "minimum_lot_size_subdivision": float(rng.uniform(200, 900)),
+                "minimum_lot_size_duplex": float(rng.uniform(200, 900)),
+                "find_price": float(rng.uniform(300000, 3000000)),
+                # Beds outside 1..5 have no comparables
+                "bed": int(rng.integers(1, 7)),
+                "suburb": SUBURBS[int(rng.integers(len(SUBURBS)))],
+            }
+            for index in range(count)
+        ]
+
+    return build
+
+
+@pytest.fixture
+def scalar_calculator(configuration, comparable_averages):
+    """FeasibilityCalculateService over the fixtures instead of Mongo"""
+    from modules.feasibility.service import FeasibilityCalculateService
+    from modules.summary.comparables import ComparablesIndex
+
+    calculator = FeasibilityCalculateService.__new__(FeasibilityCalculateService)
+    calculator.config = configuration
+    calculator.comparables = ComparablesIndex(None, None, comparable_averages)
+    return calculator
+
+
+@pytest.fixture
+def strategies(scalar_calculator):
+    """Mapping of strategy names to IDs"""
+    return scalar_calculator.get_strategies()
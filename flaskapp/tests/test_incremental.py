@@ -0,0 +1,33 @@
+from flask import Flask
+
+from modules.feasibility import incremental, service
+from modules.feasibility.incremental import MODE_INCREMENTAL, select_stale_properties
+from modules.summary.comparables import ComparablesIndex
+
+
+def test_result_version_bump_marks_stamped_properties_stale(
+    monkeypatch, comparable_averages, random_properties
+):
+    comparables = ComparablesIndex(None, None, comparable_averages)
+    properties = random_properties(3)
+    _, stamps = select_stale_properties(properties, 1, comparables, MODE_INCREMENTAL)
+    stamped = [{**p, **stamps[p["_id"]]} for p in properties]
+
+    stale, _ = select_stale_properties(stamped, 1, comparables, MODE_INCREMENTAL)
+    assert stale == []
+
+    monkeypatch.setattr(incremental, "RESULT_VERSION", incremental.RESULT_VERSION + 1)
+    stale, _ = select_stale_properties(stamped, 1, comparables, MODE_INCREMENTAL)
+    assert stale == stamped
+
+
+def test_unknown_mode_is_rejected():
+    app = Flask(__name__)
+    app.add_url_rule(
+        "/feasibility", view_func=service.FeasibilityService.as_view("feasibility")
+    )
+
+    response = app.test_client().post("/feasibility", query_string={"mode": "all"})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"status": "error", "message": "Unknown mode: all"}
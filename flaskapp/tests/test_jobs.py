@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+from flask import Flask
+
+from modules.jobs import runner, service
+from modules.jobs.runner import (
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    fail_orphaned_jobs,
+)
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def app(monkeypatch, db):
+    monkeypatch.setattr(service, "get_db", lambda: db)
+    app = Flask(__name__)
+    app.config.update(JOB_HEARTBEAT_SECONDS=30, JOB_ORPHANED_SECONDS=120)
+    app.add_url_rule(
+        "/jobs/<job_id>", view_func=service.JobStatusService.as_view("job-status")
+    )
+    with app.app_context():
+        yield app
+
+
+def insert_job(db, status, heartbeat_seconds_ago=None):
+    job = {"status": status, "processed": 0, "total": None}
+    if heartbeat_seconds_ago is not None:
+        job["heartbeat_at"] = datetime.now(timezone.utc) - timedelta(
+            seconds=heartbeat_seconds_ago
+        )
+    return db.jobs.insert_one(job).inserted_id
+
+
+def test_jobs_without_heartbeat_are_failed(app, db):
+    stale = insert_job(db, JOB_STATUS_RUNNING, 600)
+    queued = insert_job(db, JOB_STATUS_QUEUED)
+    alive = insert_job(db, JOB_STATUS_RUNNING, 10)
+    completed = insert_job(db, JOB_STATUS_COMPLETED, 600)
+
+    assert fail_orphaned_jobs(db) == 2
+
+    statuses = {job["_id"]: job for job in db.jobs.find()}
+    assert statuses[stale]["status"] == JOB_STATUS_FAILED
+    assert statuses[stale]["error"] == runner.JOB_ORPHANED_ERROR
+    assert statuses[queued]["status"] == JOB_STATUS_FAILED
+    assert statuses[alive]["status"] == JOB_STATUS_RUNNING
+    assert statuses[completed]["status"] == JOB_STATUS_COMPLETED
+
+
+def test_status_of_orphaned_job_is_failed(app, db):
+    stale = insert_job(db, JOB_STATUS_RUNNING, 600)
+    alive = insert_job(db, JOB_STATUS_RUNNING, 10)
+
+    client = app.test_client()
+    assert client.get(f"/jobs/{stale}").get_json()["data"]["status"] == "failed"
+    assert client.get(f"/jobs/{alive}").get_json()["data"]["status"] == "running"
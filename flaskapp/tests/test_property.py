@@ -0,0 +1,23 @@
+import pytest
+from flask import Flask
+
+from modules.property import service
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Invalid filters are rejected before the database is queried
+    monkeypatch.setattr(service, "get_db", lambda: None)
+    app = Flask(__name__)
+    app.add_url_rule(
+        "/properties", view_func=service.PropertyListService.as_view("properties")
+    )
+    return app.test_client()
+
+
+@pytest.mark.parametrize("value", ["abc", "nan", "inf"])
+def test_invalid_min_purchase_headroom_is_rejected(client, value):
+    response = client.get("/properties", query_string={"min_purchase_headroom": value})
+
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "min_purchase_headroom must be a number"
@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+from flask import Flask
+
+from modules.feasibility import service
+from modules.feasibility.scenario import (
+    FeasibilityScenarioCalculator,
+    build_scenarios,
+    validate_scenario_request,
+)
+from modules.feasibility.vectorized import (
+    CALCULATION_CONFIG_FIELDS,
+    FeasibilityVectorizedCalculator,
+)
+from modules.summary.comparables import ComparablesIndex
+
+
+@pytest.fixture
+def properties(random_properties):
+    return random_properties(20)
+
+
+@pytest.fixture
+def client(monkeypatch, configuration, strategies, comparable_averages, properties):
+    class CalculateService:
+        # FeasibilityCalculateService over fixtures instead of Mongo
+        def __init__(self):
+            self.config = configuration
+            self.comparables = ComparablesIndex(None, None, comparable_averages)
+
+        def fetch_properties(self, projection=None):
+            return properties
+
+        def get_strategies(self):
+            return strategies
+
+    monkeypatch.setattr(service, "FeasibilityCalculateService", CalculateService)
+    app = Flask(__name__)
+    app.add_url_rule(
+        "/feasibility/scenarios",
+        view_func=service.FeasibilityScenarioService.as_view("feasibility-scenarios"),
+    )
+    return app.test_client()
+
+
+def test_grid_of_unused_config_field_is_rejected(client):
+    response = client.post(
+        "/feasibility/scenarios", json={"grid": {"residential_loan_lvr": [0.7, 0.8]}}
+    )
+
+    assert response.status_code == 400
+    assert "residential_loan_lvr" in response.get_json()["message"]
+
+
+@pytest.mark.parametrize("top_n", ["ten", None, 0, -1, 1000])
+def test_invalid_top_n_is_rejected(client, top_n):
+    response = client.post(
+        "/feasibility/scenarios", json={"grid": {"stamp_duty": [0.05]}, "top_n": top_n}
+    )
+
+    assert response.status_code == 400
+
+
+def expected_aggregates(config, strategies, properties, comparable_averages, top_n):
+    """Aggregates of one scenario from a single-config vectorized run"""
+    averages = ComparablesIndex(None, None, comparable_averages).averages
+    results = FeasibilityVectorizedCalculator(config, strategies).calculate_properties(
+        properties, averages
+    )
+    names = sorted(strategies, key=strategies.get)
+    highest_margin = np.array([result["highest_margin"] for result in results])
+    top = np.argsort(-highest_margin, kind="stable")[:top_n]
+    return {
+        "feasible_count": sum(result["feasible"] for result in results),
+        "strategy_feasible_count": {
+            name: sum(result[f"{name}_gross_profit_on_cost"] > 0 for result in results)
+            for name in names
+        },
+        "margin_distribution": {
+            **{
+                f"p{p}": pytest.approx(np.percentile(highest_margin, p), abs=1e-4)
+                for p in [10, 25, 50, 75, 90]
+            },
+            "mean": pytest.approx(highest_margin.mean(), abs=1e-4),
+        },
+        "top_properties": [
+            {
+                "_id": str(results[i]["_id"]),
+                "address": None,
+                "suburb": properties[i]["suburb"],
+                "highest_margin": pytest.approx(results[i]["highest_margin"]),
+                "strategy": max(
+                    names, key=lambda name: results[i][f"{name}_gross_profit_on_cost"]
+                ),
+            }
+            for i in top
+        ],
+    }
+
+
+def test_grid_scenarios_are_evaluated(
+    client, configuration, strategies, comparable_averages, properties
+):
+    base = {"renovation_uplift": 0.2}
+    grid = {"build_cost_m2": [2500, 3500], "stamp_duty": [0.04, 0.05]}
+    response = client.post(
+        "/feasibility/scenarios", json={"base": base, "grid": grid, "top_n": 5}
+    )
+
+    assert response.status_code == 200
+    scenarios = response.get_json()["data"]["scenarios"]
+    assert [s["overrides"] for s in scenarios] == build_scenarios(grid)
+    for scenario in scenarios:
+        expected = expected_aggregates(
+            {**configuration, **base, **scenario["overrides"]},
+            strategies,
+            properties,
+            comparable_averages,
+            5,
+        )
+        assert scenario["properties"] == len(properties)
+        for name, value in expected.items():
+            assert scenario[name] == value, (scenario["overrides"], name)
+
+
+def test_every_scenario_field_is_evaluated_per_scenario(
+    configuration, strategies, comparable_averages, random_properties
+):
+    properties = random_properties(5)
+    averages = ComparablesIndex(None, None, comparable_averages).averages
+    calculator = FeasibilityScenarioCalculator(configuration, strategies, 3)
+
+    # One field at a time, each scenario must match a run with its override
+    for field in CALCULATION_CONFIG_FIELDS:
+        grid = {field: [0.1, 0.3]}
+        assert validate_scenario_request({}, grid) is None
+        scenarios = calculator.evaluate(properties, averages, build_scenarios(grid))
+        assert len(scenarios) == 2
+        for scenario in scenarios:
+            expected = expected_aggregates(
+                {**configuration, **scenario["overrides"]},
+                strategies,
+                properties,
+                comparable_averages,
+                3,
+            )
+            for name, value in expected.items():
+                assert scenario[name] == value, (scenario["overrides"], name)
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from modules.feasibility.scoring import score_ndjson
+from modules.feasibility.service import FeasibilityCalculateService
+from modules.summary.comparables import ComparablesIndex
+
+
+def score(lines, configuration, comparable_averages):
+    results = score_ndjson(
+        lines,
+        configuration,
+        FeasibilityCalculateService.get_strategies(None),
+        ComparablesIndex(None, None, comparable_averages).averages,
+    )
+    # Strict parsing, bare NaN or Infinity tokens are not JSON
+    return [
+        json.loads(line, parse_constant=pytest.fail) for line in results
+    ]
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {"size": 800, "minimum_lot_size_subdivision": 0},
+        {"size": 800, "minimum_lot_size_duplex": -100},
+        {"size": float("nan")},
+        {"find_price": float("inf")},
+    ],
+)
+def test_invalid_numbers_yield_error_records(
+    configuration, comparable_averages, record
+):
+    lines = [
+        json.dumps({"size": 800, "bed": 3, "suburb": "Kellyville"}),
+        json.dumps(record),
+    ]
+
+    valid, invalid = score(lines, configuration, comparable_averages)
+
+    assert valid["id"] == 1
+    assert invalid["line"] == 2
+    assert "error" in invalid
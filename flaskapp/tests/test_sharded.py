@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import mongomock
+import pytest
+
+from modules.feasibility import sharded
+from modules.feasibility.incremental import MODE_INCREMENTAL, select_stale_properties
+from modules.summary.comparables import ComparablesIndex
+
+
+class Progress:
+    def start(self, total):
+        self.total = total
+        self.processed = 0
+
+    def advance(self, count=1):
+        self.processed += count
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = mongomock.MongoClient()
+    # Shards share the test client and run on threads instead of processes
+    monkeypatch.setattr(client, "close", lambda: None)
+    monkeypatch.setattr(sharded, "MongoClient", lambda uri: client)
+    monkeypatch.setattr(
+        sharded,
+        "ProcessPoolExecutor",
+        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers),
+    )
+    return client
+
+
+def test_sharded_progress_counts_stale_properties(
+    client, configuration, strategies, comparable_averages, random_properties
+):
+    comparables = ComparablesIndex(None, None, comparable_averages)
+    properties = [{**p, "for_sale": "FOR_SALE"} for p in random_properties(40)]
+    _, stamps = select_stale_properties(
+        properties[:15], configuration["version"], comparables, MODE_INCREMENTAL
+    )
+    client.db.properties.insert_many(
+        [{**p, **stamps.get(p["_id"], {})} for p in properties]
+    )
+    progress = Progress()
+
+    result = sharded.run_sharded_feasibility(
+        client.db,
+        {
+            "FEASIBILITY_PROCESSES": 3,
+            "FEASIBILITY_SHARD_BY": sharded.SHARD_BY_ID,
+            "MONGO_URI": None,
+            "DATABASE": "db",
+            "BATCH_SIZE": 10,
+        },
+        configuration,
+        strategies,
+        comparables,
+        MODE_INCREMENTAL,
+        progress,
+    )
+
+    assert result["total"] == 40
+    assert result["processed"] == 25
+    assert progress.total == progress.processed == 25
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from modules.summary import service
+from modules.summary.service import (
+    COMPARABLES_REBUILD_LOCK_ID,
+    SummaryCalculateService,
+)
+
+
+class Progress:
+    def start(self, total):
+        pass
+
+    def advance(self, count=1):
+        pass
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def summary(monkeypatch, db):
+    monkeypatch.setattr(service, "get_db", lambda: db)
+    return SummaryCalculateService()
+
+
+def test_rebuild_fails_while_another_holds_the_lock(summary, db):
+    summary.acquire_rebuild_lock("nightly")
+
+    with pytest.raises(RuntimeError):
+        summary.rebuild(Progress())
+
+    # The failed rebuild leaves the other's lock in place
+    assert db.jobs.find_one({"_id": COMPARABLES_REBUILD_LOCK_ID})["owner"] == "nightly"
+
+
+def test_lock_is_released_and_expires(summary, db):
+    summary.acquire_rebuild_lock("nightly")
+    summary.release_rebuild_lock("nightly")
+    summary.acquire_rebuild_lock("manual")
+
+    db.jobs.update_one(
+        {"_id": COMPARABLES_REBUILD_LOCK_ID},
+        {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+    )
+    summary.acquire_rebuild_lock("nightly")
+    assert db.jobs.find_one({"_id": COMPARABLES_REBUILD_LOCK_ID})["owner"] == "nightly"
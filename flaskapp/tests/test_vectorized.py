@@ -0,0 +1,56 @@
+import pytest
+
+from modules.feasibility.vectorized import FeasibilityVectorizedCalculator
+
+
+@pytest.fixture
+def vectorized_calculator(configuration, strategies):
+    return FeasibilityVectorizedCalculator(configuration, strategies)
+
+
+def test_vectorized_matches_scalar(
+    scalar_calculator, vectorized_calculator, random_properties
+):
+    properties = random_properties(500)
+    vectorized_results = vectorized_calculator.calculate_properties(
+        properties, scalar_calculator.comparables.averages
+    )
+
+    assert len(vectorized_results) == len(properties)
+    for property, vectorized_result in zip(properties, vectorized_results):
+        scalar_result = scalar_calculator.calculate_property(property)
+        # Every strategy's fields plus highest_margin and feasible
+        for field, value in scalar_result.items():
+            assert vectorized_result[field] == pytest.approx(value, abs=0.01), (
+                property["_id"],
+                field,
+            )
+
+
+@pytest.mark.parametrize(
+    "field", ["minimum_lot_size_subdivision", "minimum_lot_size_duplex"]
+)
+@pytest.mark.parametrize("lot_size", [0, -300])
+def test_non_positive_lot_size_is_not_subdivided(
+    scalar_calculator,
+    vectorized_calculator,
+    random_properties,
+    caplog,
+    field,
+    lot_size,
+):
+    properties = random_properties(20)
+    properties[3] = {**properties[3], "size": 1500.0, field: lot_size}
+
+    vectorized_results = vectorized_calculator.calculate_properties(
+        properties, scalar_calculator.comparables.averages
+    )
+
+    # The rest of the portfolio is still evaluated, in parity with the
+    # scalar path
+    assert len(vectorized_results) == len(properties)
+    for property, vectorized_result in zip(properties, vectorized_results):
+        scalar_result = scalar_calculator.calculate_property(property)
+        for field_name, value in scalar_result.items():
+            assert vectorized_result[field_name] == pytest.approx(value, abs=0.01)
+    assert "['3']" in caplog.text
@@ -0,0 +1,108 @@
+"""
+Benchmark sequential against fanned-out search pagination.
+
+Serves search result pages from a local HTTP server with a fixed latency
+and crawls them with DomainBuySpider, once following page N+1 only after
+page N and once scheduling every page when page 1 arrives. Listings are
+left empty and the search has no postcode, so only pagination is measured
+and no page counts are written to Redis. The project's concurrency
+settings are kept; the download delay, throttling, middlewares, pipelines
+and the Redis frontier are turned off.
+
+    cd scrapy_redis && python -m benchmarks.search_fanout --pages 30
+"""
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def serve_search_pages(port, total_pages, latency):
+    class SearchPageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            query = parse_qs(urlparse(self.path).query)
+            page = int(query.get("page", ["1"])[0])
+            body = json.dumps({"props": {
+                "listingsMap": {},
+                "currentPage": page,
+                "totalPages": total_pages,
+            }}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), SearchPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_crawl(fanout, port, result):
+    # Runs in a fresh process, a Twisted reactor cannot be restarted
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    from scrapy_redis.spiders.domain_buy import DomainBuySpider
+
+    class LocalDomainBuySpider(DomainBuySpider):
+        allowed_domains = ["127.0.0.1"]
+
+    settings = get_project_settings()
+    settings.setdict({
+        "SEARCH_PAGE_FANOUT": fanout,
+        "SCHEDULER": "scrapy.core.scheduler.Scheduler",
+        "DUPEFILTER_CLASS": "scrapy.dupefilters.RFPDupeFilter",
+        "ITEM_PIPELINES": {},
+        "DOWNLOADER_MIDDLEWARES": {},
+        "DOWNLOAD_DELAY": 0,
+        "AUTOTHROTTLE_ENABLED": False,
+        "LOG_LEVEL": "WARNING",
+    }, priority="cmdline")
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(LocalDomainBuySpider)
+    started = time.perf_counter()
+    process.crawl(crawler, domain_buy=f"http://127.0.0.1:{port}/?sort=default")
+    process.start()
+    result["seconds"] = time.perf_counter() - started
+    result["pages"] = crawler.stats.get_value("response_received_count")
+
+
+def measure(fanout, port):
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        result = manager.dict()
+        process = context.Process(target=run_crawl, args=(fanout, port, result))
+        process.start()
+        process.join()
+        return dict(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+
+    server = serve_search_pages(args.port, args.pages, args.latency)
+    try:
+        sequential = measure(False, args.port)
+        fanout = measure(True, args.port)
+    finally:
+        server.shutdown()
+
+    print(f"{args.pages} pages, {args.latency * 1000:.0f} ms latency")
+    for name, result in (("sequential", sequential), ("fan-out", fanout)):
+        print(f"{name:>10}: {result['seconds']:.2f} s for {result['pages']} pages")
+    print(f"   speedup: {sequential['seconds'] / fanout['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
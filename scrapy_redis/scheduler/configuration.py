@@ -10,5 +10,23 @@ class Config:
         'FLASKAPP_URL', 'http://flaskapp.app.local:5001/api')
     DEFAULT_TIMEOUT = int(os.environ.get(
         'FLASKAPP_DEFAULT_TIMEOUT', 1800))  # 30 mins
+    REQUEST_TIMEOUT = int(os.environ.get(
+        'FLASKAPP_REQUEST_TIMEOUT', 30))  # per HTTP call
+    JOB_POLL_INTERVAL = int(os.environ.get(
+        'FLASKAPP_JOB_POLL_INTERVAL', 15))  # seconds between job status checks
+    # Comparables are maintained by the crawler pipeline, the full rebuild
+    # at the end of a run is only a safety net
+    SUMMARY_ON_FINISH = os.environ.get(
+        'SUMMARY_ON_FINISH', 'true').lower() == 'true'
+    # 'subprocess' runs `scrapy crawl` per task, 'inprocess' runs crawls on a
+    # long-lived reactor in the worker (use with the threads pool)
+    SPIDER_RUNNER = os.environ.get('SPIDER_RUNNER', 'subprocess')
+    SPIDER_MAX_CRAWLERS = int(os.environ.get('SPIDER_MAX_CRAWLERS', 4))
+    SPIDER_JOB_CONCURRENCY = int(os.environ.get(
+        'SPIDER_JOB_CONCURRENCY', 4))  # CONCURRENT_REQUESTS per crawl job
+    # Postcodes are packed into crawl tasks of about this many search pages,
+    # using the page counts recorded by the previous run
+    WORK_UNIT_PAGES = int(os.environ.get('WORK_UNIT_PAGES', 60))
+    DEFAULT_POSTCODE_PAGES = int(os.environ.get('DEFAULT_POSTCODE_PAGES', 2))
     FLASK_API_USERNAME = os.environ.get('USERNAME')
     FLASK_API_PASSWORD = os.environ.get('PASSWORD')
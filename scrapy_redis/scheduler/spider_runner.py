@@ -0,0 +1,112 @@
+import logging
+import threading
+from concurrent.futures import Future
+from scheduler.configuration import Config
+
+logger = logging.getLogger(__name__)
+
+# One runner, reactor thread and set of project settings per worker process
+_spider_runner = None
+_spider_runner_lock = threading.Lock()
+
+
+class InProcessSpiderRunner:
+    """
+    Runs crawl jobs as concurrent crawlers on one long-lived Twisted reactor.
+
+    The reactor runs in a daemon thread for the lifetime of the worker
+    process, so Scrapy is imported, the reactor created and the Mongo client
+    connected once instead of once per postcode. Celery threads submit jobs
+    with crawl() and block until their crawler finishes.
+    """
+
+    def __init__(self, max_crawlers, job_concurrency):
+        """
+        :param max_crawlers: int, crawlers allowed to run at the same time
+        :param job_concurrency: int, CONCURRENT_REQUESTS budget of each crawler
+        """
+        self.job_concurrency = job_concurrency
+        self.slots = threading.BoundedSemaphore(max_crawlers)
+        self.started = threading.Event()
+        self.reactor = None
+        self.runner = None
+        self.settings = None
+        self.thread = threading.Thread(
+            target=self.run_reactor, name="scrapy-reactor", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.started.wait()
+
+    def run_reactor(self):
+        # Imported here so the reactor is installed in this thread with the
+        # event loop it will run
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.utils.project import get_project_settings
+        from scrapy.utils.reactor import install_reactor
+
+        self.settings = get_project_settings()
+        install_reactor(self.settings['TWISTED_REACTOR'])
+        from twisted.internet import reactor
+
+        self.reactor = reactor
+        self.runner = CrawlerRunner(self.settings)
+        reactor.callWhenRunning(self.started.set)
+        logger.info("Scrapy reactor started for in-process crawling.")
+        reactor.run(installSignalHandlers=False)
+
+    def start_crawl(self, future, spider_name, kwargs):
+        """Create the crawler on the reactor thread and wire its outcome."""
+        from scrapy.crawler import Crawler
+
+        try:
+            # Shared project settings with this job's concurrency budget
+            settings = self.settings.copy()
+            settings.set('CONCURRENT_REQUESTS', self.job_concurrency,
+                         priority='cmdline')
+            crawler = Crawler(
+                self.runner.spider_loader.load(spider_name), settings)
+            deferred = self.runner.crawl(crawler, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        def finished(result):
+            stats = crawler.stats.get_stats() if crawler.stats else {}
+            future.set_result({
+                'spider': spider_name,
+                'finish_reason': stats.get('finish_reason'),
+                'item_scraped_count': stats.get('item_scraped_count', 0),
+                'response_received_count': stats.get(
+                    'response_received_count', 0),
+            })
+
+        def failed(failure):
+            future.set_exception(failure.value)
+
+        deferred.addCallbacks(finished, failed)
+
+    def crawl(self, spider_name, **kwargs):
+        """
+        Run one crawl job and wait for it to finish.
+
+        :param spider_name: str, the spider to run
+        :param kwargs: spider arguments, as passed with -a on the command line
+        :return: dict, the crawl's finish reason and counters
+        """
+        with self.slots:
+            future = Future()
+            self.reactor.callFromThread(
+                self.start_crawl, future, spider_name, kwargs)
+            return future.result()
+
+
+def get_spider_runner():
+    """Get the worker's in-process runner, starting its reactor on first use."""
+    global _spider_runner
+    with _spider_runner_lock:
+        if _spider_runner is None:
+            _spider_runner = InProcessSpiderRunner(
+                Config.SPIDER_MAX_CRAWLERS, Config.SPIDER_JOB_CONCURRENCY)
+            _spider_runner.start()
+        return _spider_runner
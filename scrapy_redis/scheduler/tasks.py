@@ -1,13 +1,15 @@
 import time
 import pandas as pd
 import subprocess
-from scrapy_redis.helpers.constants import Constants
 from scheduler.configuration import Config
+from scheduler.spider_runner import get_spider_runner
+from scrapy_redis.frontier import clear_frontier
 from celery import shared_task, chain, group
 from requests.auth import HTTPBasicAuth
 import requests
 import logging
 import os
+import uuid
 import redis
 import sys
 sys.setrecursionlimit(2000)  # Increase the recursion limit
@@ -24,6 +26,9 @@ redis_client = redis.StrictRedis.from_url(Config.CELERY_BROKER_URL)
 
 @shared_task(acks_late=True)
 def run_scrapy_spider(spider_name, **kwargs):
+    if Config.SPIDER_RUNNER == 'inprocess':
+        return run_spider_in_process(spider_name, **kwargs)
+
     try:
         # Construct the Scrapy command
         command = ['scrapy', 'crawl', spider_name]
@@ -52,32 +57,88 @@ def run_scrapy_spider(spider_name, **kwargs):
         return f"Error running Scrapy spider or calculate final task"
 
 
-@shared_task(acks_late=True)
-def call_flask_api(result=None, endpoint=None, **kwargs):
+def run_spider_in_process(spider_name, **kwargs):
+    """Run a crawl job on the worker's long-lived reactor."""
     try:
-        url = f"{Config.FLASKAPP_URL}/{endpoint}"
-        logger.info(
-            f"Sending request to Flask API endpoint '{endpoint}' with no payload and timeout={Config.DEFAULT_TIMEOUT}")
-
-        response = requests.post(
-            url,
-            timeout=Config.DEFAULT_TIMEOUT,
-            auth=HTTPBasicAuth(Config.FLASK_API_USERNAME,
-                               Config.FLASK_API_PASSWORD)
+        stats = get_spider_runner().crawl(spider_name, **kwargs)
+        logger.info(f"Successfully ran Scrapy spider: {spider_name} {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"Error running Scrapy spider: {e}")
+        return "Error running Scrapy spider"
+    finally:
+        redis_client.incr('completed_tasks')
+        check_and_trigger_final_chain()
+
+
+@shared_task(bind=True, acks_late=True, max_retries=None)
+def call_flask_api(self, result=None, endpoint=None, job_id=None, started_at=None, **kwargs):
+    """
+    Start a background job on the Flask API and wait for it to finish.
+
+    The endpoint only enqueues the job and returns its id, so instead of
+    holding a socket open this task re-schedules itself every
+    JOB_POLL_INTERVAL seconds to check the job status.
+    """
+    auth = HTTPBasicAuth(Config.FLASK_API_USERNAME, Config.FLASK_API_PASSWORD)
+    try:
+        if job_id is None:
+            url = f"{Config.FLASKAPP_URL}/{endpoint}"
+            logger.info(
+                f"Sending request to Flask API endpoint '{endpoint}' with no payload and timeout={Config.REQUEST_TIMEOUT}")
+
+            response = requests.post(
+                url, timeout=Config.REQUEST_TIMEOUT, auth=auth)
+            if response.status_code != 202:
+                logger.error(
+                    f"Failed to send request: {response.status_code}, {response.text}")
+                return f"Failed to send request: {response.status_code}, {response.text}"
+
+            job_id = response.json()["data"]["job_id"]
+            started_at = time.time()
+            logger.info(f"Flask API job {job_id} queued for '{endpoint}'.")
+
+        response = requests.get(
+            f"{Config.FLASKAPP_URL}/jobs/{job_id}",
+            timeout=Config.REQUEST_TIMEOUT,
+            auth=auth
         )
-        if response.status_code == 200:
-            logger.info("Request sent successfully.")
-            return True
-        else:
-            logger.error(
-                f"Failed to send request: {response.status_code}, {response.text}")
-            return f"Failed to send request: {response.status_code}, {response.text}"
-    except requests.Timeout:
-        logger.error("Request to Flask API timed out.")
-        return "Request to Flask API timed out."
+        if response.status_code == 404:
+            # The job record is gone, nothing will ever finish it
+            logger.error(f"Flask API job {job_id} not found.")
+            return f"Flask API job not found: {job_id}"
+        response.raise_for_status()
+        job = response.json()["data"]
     except requests.RequestException as e:
-        logger.error(f"Request to Flask API failed: {e}")
-        return "Request to Flask API failed"
+        if job_id is None:
+            logger.error(f"Request to Flask API failed: {e}")
+            return "Request to Flask API failed"
+        # The job keeps running server side, check again later
+        logger.warning(f"Failed to fetch status of job {job_id}: {e}")
+        job = {"status": "unknown"}
+
+    if job["status"] == "completed":
+        logger.info(f"Flask API job {job_id} for '{endpoint}' completed.")
+        return True
+
+    # Jobs whose API process was restarted are reported failed as soon as
+    # their heartbeat stops, instead of waiting for DEFAULT_TIMEOUT
+    if job["status"] == "failed":
+        logger.error(f"Flask API job {job_id} failed: {job.get('error')}")
+        return f"Flask API job failed: {job.get('error')}"
+
+    if time.time() - started_at > Config.DEFAULT_TIMEOUT:
+        logger.error(f"Flask API job {job_id} timed out.")
+        return "Flask API job timed out."
+
+    logger.info(
+        f"Flask API job {job_id} is {job['status']}: {job.get('processed')}/{job.get('total')}, "
+        f"ETA {job.get('eta_seconds')}s")
+    raise self.retry(
+        kwargs={"endpoint": endpoint, "job_id": job_id,
+                "started_at": started_at},
+        countdown=Config.JOB_POLL_INTERVAL
+    )
 
 
 @shared_task(acks_late=True)
@@ -90,6 +151,13 @@ def log_done(*args, **kwargs):
 
     logger.info("Task counters reset for future runs.")
 
+    # Drop the shared request frontier of the finished run
+    run_id = redis_client.get('frontier_run_id')
+    if run_id:
+        clear_frontier(redis_client, run_id.decode())
+        redis_client.delete('frontier_run_id')
+        logger.info("Request frontier cleared.")
+
     # Set the global ready-to-terminate flag
     redis_client.set('all_workers_ready_to_terminate', 'true')
 
@@ -102,31 +170,76 @@ def check_and_trigger_final_chain():
 
     if completed_tasks >= total_expected_tasks:
         # Trigger the final chain
-        chain(
-            call_flask_api.s(endpoint="summary"),
+        steps = [
             call_flask_api.s(endpoint="feasibility"),
+            call_flask_api.s(endpoint="feasibility/simulation"),
             log_done.s()
-        ).apply_async()
+        ]
+        if Config.SUMMARY_ON_FINISH:
+            steps.insert(0, call_flask_api.s(endpoint="summary"))
+        chain(*steps).apply_async()
         logger.info("Final chain triggered.")
 
 
-def create_spider_tasks(df, spider_name, url_template):
+def fetch_postcode_pages(spider_name):
+    """
+    Read the search page count of every postcode seen by the previous run.
+
+    :param spider_name: The spider the page counts were recorded by.
+    :return: A dict of postcode to page count.
+    """
+    pages = redis_client.hgetall(f'search_pages:{spider_name}')
+    return {postcode.decode(): int(count) for postcode, count in pages.items()}
+
+
+def build_work_units(postcodes, postcode_pages, max_pages):
+    """
+    Packs postcodes into work units of roughly max_pages search pages.
+
+    Postcodes are placed largest first into the first unit with room left,
+    so a few large postcodes do not end up in one long-running task while
+    small ones are spread thin. Postcodes without a recorded page count are
+    assumed to take Config.DEFAULT_POSTCODE_PAGES pages.
+
+    :param postcodes: A list of postcodes.
+    :param postcode_pages: A dict of postcode to expected page count.
+    :param max_pages: The page budget of one work unit.
+    :return: A list of work units, each a list of postcodes.
     """
-    Generates a list of Celery tasks to run Scrapy spiders based on the DataFrame.
+    expected = {
+        postcode: max(1, postcode_pages.get(
+            postcode, Config.DEFAULT_POSTCODE_PAGES))
+        for postcode in dict.fromkeys(postcodes)
+    }
+    units = []
+    for postcode in sorted(expected, key=lambda p: (-expected[p], p)):
+        for unit in units:
+            if unit['pages'] + expected[postcode] <= max_pages:
+                break
+        else:
+            unit = {'pages': 0, 'postcodes': []}
+            units.append(unit)
+        unit['pages'] += expected[postcode]
+        unit['postcodes'].append(postcode)
+    return [unit['postcodes'] for unit in units]
 
-    :param df: pandas DataFrame containing data with columns including 'Post Code'.
+
+def create_spider_tasks(postcodes, spider_name, run_id):
+    """
+    Generates one Celery task per work unit of postcodes.
+
+    :param postcodes: A list of postcodes to crawl.
     :param spider_name: The name of the spider to run (as defined in SPIDER_MAP).
-    :param url_template: The URL template where the 'Post Code' will be inserted.
+    :param run_id: The crawl run whose request frontier the tasks share.
     :return: A list of Celery tasks.
     """
-    url_key = 'domain_sold' if spider_name == 'domain_sold' else 'domain_buy'
-
-    return df.apply(
-        lambda row: run_scrapy_spider.s(
-            spider_name, **{url_key: url_template.format(postcode=row['Post Code'])}
-        ),
-        axis=1
-    ).tolist()
+    work_units = build_work_units(
+        postcodes, fetch_postcode_pages(spider_name), Config.WORK_UNIT_PAGES)
+    return [
+        run_scrapy_spider.s(spider_name, postcodes=','.join(work_unit),
+                            frontier_run_id=run_id)
+        for work_unit in work_units
+    ]
 
 
 @shared_task(acks_late=True)
@@ -134,6 +247,10 @@ def start_crawling():
     # Set the global ready-to-terminate flag
     redis_client.set('all_workers_ready_to_terminate', 'false')
 
+    # Start a fresh shared request frontier for this run
+    run_id = uuid.uuid4().hex
+    redis_client.set('frontier_run_id', run_id)
+
     # Read the Excel file and filter for NSW postcodes
     current_dir = os.path.dirname(os.path.abspath(__file__))
     # Construct the file path relative to the script location
@@ -151,32 +268,15 @@ def start_crawling():
     # Filter rows where the State is 'NSW'
     df_nsw = df_cleaned[df_cleaned['State'] == 'NSW']
 
-    sold_chunks = [
-        df_nsw[i:i + 100].to_dict(orient='records') for i in range(0, len(df_nsw), 100)]
-    sale_chunks = [
-        df_nsw[i:i + 100].to_dict(orient='records') for i in range(0, len(df_nsw), 100)]
+    postcodes = [str(postcode) for postcode in df_nsw['Post Code']]
+    sold_spider_tasks = create_spider_tasks(postcodes, 'domain_sold', run_id)
+    sale_spider_tasks = create_spider_tasks(postcodes, 'domain_buy', run_id)
 
     # Set the total expected tasks in Redis
-    total_expected_tasks = sum(
-        len(chunk) for chunk in sold_chunks) + sum(len(chunk) for chunk in sale_chunks)
+    total_expected_tasks = len(sold_spider_tasks) + len(sale_spider_tasks)
     redis_client.set('total_expected_tasks', total_expected_tasks)
 
-    # Start all batches without waiting for completion of previous ones
-    for i, (sold_chunk, sale_chunk) in enumerate(zip(sold_chunks, sale_chunks)):
-        sold_chunk_df = pd.DataFrame(sold_chunk)
-        sale_chunk_df = pd.DataFrame(sale_chunk)
-
-        # Create spider tasks for the next chunk
-        sold_spider_tasks = create_spider_tasks(
-            sold_chunk_df, 'domain_sold', Constants.DOMAIN_SOLD + "&postcode={postcode}")
-
-        sale_spider_tasks = create_spider_tasks(
-            sale_chunk_df, 'domain_buy', Constants.DOMAIN_BUY + "&postcode={postcode}")
-
-        # Create a group of tasks
-        batch_group = group(sold_spider_tasks + sale_spider_tasks)
-
-        # Schedule the batch to run independently
-        batch_group.apply_async()
+    # Start all work units without waiting for completion of previous ones
+    group(sold_spider_tasks + sale_spider_tasks).apply_async()
 
     logger.info("All crawling tasks have been initiated.")
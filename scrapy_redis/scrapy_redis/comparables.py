@@ -0,0 +1,135 @@
+import logging
+from bson import ObjectId
+from pymongo import (
+    ASCENDING, DESCENDING, DeleteMany, ReplaceOne, ReturnDocument)
+
+# Comparable type of each listing property type, mirrors the summary
+# service of the Flask API
+COMPARABLE_PROPERTY_MAP = {
+    "HOUSE": ["House"],
+    "DUPLEX": ["Duplex"],
+    "TOWNHOUSE": ["Townhouse"],
+    "LAND": ["Development Site", "New Land", "Vacant Land"],
+}
+
+COMPARABLES_PER_GROUP = 10
+COMPARABLE_VERSION_COLLECTION = "comparable_version"
+COMPARABLE_VERSION_ID = "comparables"
+
+SUMMARY_FIELDS = ["address", "sold_price", "sold_date", "bath", "car", "size"]
+
+
+class ComparablesMaintainer:
+    """
+    Keeps comparable_summary and comparable_average current while SOLD
+    items are upserted, instead of waiting for the end-of-run rebuild.
+
+    Only the (property_type, suburb, bed) groups touched by a batch are
+    refreshed, each from an indexed query limited to the latest sales.
+    Summaries are replaced in place by sale, so readers never see a group
+    emptied, and a new comparables version is published once per crawl if
+    any average changed.
+    """
+
+    def __init__(self, db, collection_name):
+        self.db = db
+        self.properties = db[collection_name]
+        self.comparable_types = {
+            listing_type: property_type
+            for property_type, listing_types in COMPARABLE_PROPERTY_MAP.items()
+            for listing_type in listing_types
+        }
+        self.changed = False
+
+    def ensure_indexes(self):
+        """Index the lookup of the latest sales of a comparable group."""
+        self.properties.create_index(
+            [
+                ("for_sale", ASCENDING),
+                ("property_type", ASCENDING),
+                ("suburb", ASCENDING),
+                ("bed", ASCENDING),
+                ("sold_date", DESCENDING),
+            ]
+        )
+
+    def affected_groups(self, items):
+        """Collect the comparable groups of the SOLD items of a batch."""
+        groups = set()
+        for item in items:
+            property_type = self.comparable_types.get(item.get('property_type'))
+            if item.get('for_sale') == "SOLD" and property_type:
+                groups.add((property_type, item.get('suburb'), item.get('bed')))
+        return groups
+
+    def refresh_group(self, property_type, suburb, bed):
+        """
+        Recompute the top sales and the average of one comparable group.
+
+        :return: bool, whether the average price of the group changed
+        """
+        latest_sales = list(
+            self.properties.find(
+                {
+                    "for_sale": "SOLD",
+                    "property_type": {
+                        "$in": COMPARABLE_PROPERTY_MAP[property_type]},
+                    "suburb": suburb,
+                    "bed": bed,
+                },
+                {"_id": 0, **{field: 1 for field in SUMMARY_FIELDS}},
+            ).sort("sold_date", DESCENDING).limit(COMPARABLES_PER_GROUP)
+        )
+        if not latest_sales:
+            return False
+
+        group = {"property_type": property_type, "suburb": suburb, "bed": bed}
+        summaries = []
+        for sale in latest_sales:
+            sale["sold_price"] = sale.get("sold_price") or 0
+            summaries.append({**group, **sale})
+
+        # Upsert the current sales by key, then drop the ones pushed out
+        sale_keys = [
+            {"address": doc.get("address"), "sold_date": doc.get("sold_date")}
+            for doc in summaries
+        ]
+        self.db.comparable_summary.bulk_write(
+            [ReplaceOne({**group, **key}, doc, upsert=True)
+             for key, doc in zip(sale_keys, summaries)]
+            + [DeleteMany({**group, "$nor": sale_keys})]
+        )
+        average_price = sum(
+            doc["sold_price"] for doc in summaries) / len(summaries)
+        previous = self.db.comparable_average.find_one_and_update(
+            group, {"$set": {"average_price": average_price}}, upsert=True,
+            return_document=ReturnDocument.BEFORE)
+        return previous is None or previous.get("average_price") != average_price
+
+    def update(self, items):
+        """Refresh the groups affected by a written batch."""
+        groups = self.affected_groups(items)
+        if not groups:
+            return 0
+
+        for property_type, suburb, bed in groups:
+            if self.refresh_group(property_type, suburb, bed):
+                self.changed = True
+        logging.info(f"Refreshed {len(groups)} comparable groups.")
+        return len(groups)
+
+    def publish(self):
+        """
+        Stamp a new comparables version so the API reloads its cached
+        index, if any average changed since the last stamp.
+        """
+        if not self.changed:
+            return False
+        self.db[COMPARABLE_VERSION_COLLECTION].update_one(
+            {"_id": COMPARABLE_VERSION_ID},
+            {"$set": {"version": ObjectId()}},
+            upsert=True,
+        )
+        self.changed = False
+        logging.info("Published a new comparables version.")
+        return True
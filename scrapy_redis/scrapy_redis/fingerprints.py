@@ -0,0 +1,234 @@
+import hashlib
+import json
+from .frontier import frontier_key, get_frontier_run_id, get_redis_server
+
+# Redis hash per spider of the fingerprint of every stored listing, kept
+# across crawl runs so unchanged listings are not fetched again
+LISTING_FINGERPRINTS_KEY = "listing_fingerprints:{spider_name}"
+
+
+def search_digest(search_url):
+    """Short stable id of a search URL for Redis keys."""
+    return hashlib.sha1(search_url.encode()).hexdigest()
+
+
+def listing_fingerprint(listing_model):
+    """Fingerprint the search result fields that change with a listing."""
+    fields = [listing_model.get(field) for field in ("price", "auction", "url")]
+    return hashlib.sha1(
+        json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ListingFingerprints:
+    """
+    Fingerprints of the listings already stored, checked a search page at a
+    time before following any advert.
+    """
+
+    def __init__(self, server, key):
+        self.server = server
+        self.key = key
+
+    @classmethod
+    def from_settings(cls, settings, spider_name):
+        return cls(get_redis_server(settings),
+                   LISTING_FINGERPRINTS_KEY.format(spider_name=spider_name))
+
+    def changed(self, fingerprints):
+        """
+        :param fingerprints: dict, fingerprint of each listing by data_id
+        :return: set, data_ids of the new or changed listings
+        """
+        if not fingerprints:
+            return set()
+        data_ids = list(fingerprints)
+        stored = self.server.hmget(self.key, data_ids)
+        return {
+            data_id for data_id, known in zip(data_ids, stored)
+            if known is None or known.decode() != fingerprints[data_id]
+        }
+
+    def record(self, fingerprints):
+        """Remember the fingerprints of listings that have been stored."""
+        if fingerprints:
+            self.server.hset(self.key, mapping=fingerprints)
+
+
+def search_page_fingerprint(listings_map, total_pages):
+    """Fingerprint the listings, their prices and the page count of a search page."""
+    listings = sorted(
+        (listing_id, (listing or {}).get("listingModel", {}).get("price"))
+        for listing_id, listing in listings_map.items())
+    return hashlib.sha1(json.dumps(
+        [listings, total_pages], default=str).encode()).hexdigest()
+
+
+class SearchPageFingerprints:
+    """
+    First page fingerprint of every search, to tell searches where nothing
+    moved since the previous run.
+
+    The fingerprint of a first page is only stored once every page of its
+    search has been parsed, a search cut short is walked again by the next
+    run. A fingerprint expires max_age seconds after it last changed, so
+    even a quiet search is walked in full once in a while.
+    """
+
+    def __init__(self, server, spider_name, max_age, run_id):
+        self.server = server
+        self.spider_name = spider_name
+        self.max_age = max_age
+        self.run_id = run_id
+
+    @classmethod
+    def from_spider(cls, spider):
+        return cls(get_redis_server(spider.settings), spider.name,
+                   spider.settings.getint('SEARCH_PAGE_MAX_AGE'),
+                   get_frontier_run_id(spider))
+
+    def key(self, search_url):
+        return f"search_page_fingerprint:{self.spider_name}:{search_digest(search_url)}"
+
+    def run_key(self, search_url, name):
+        """Key of what the current run collected for a search."""
+        return frontier_key(
+            self.run_id, self.spider_name,
+            f"search_{name}:{search_digest(search_url)}")
+
+    def unchanged(self, search_url, fingerprint):
+        """
+        Compare the fingerprint of a search's first page with the stored one.
+
+        :return: bool, True if the search is the same as in the previous run
+        """
+        stored = self.server.get(self.key(search_url))
+        return stored is not None and stored.decode() == fingerprint
+
+    def page_parsed(self, search_url, page, total_pages, fingerprint=None):
+        """
+        Count a parsed page of a search, storing the first page fingerprint
+        once its last page has been parsed.
+
+        :param fingerprint: str, the fingerprint of the first page
+        """
+        pages_key = self.run_key(search_url, 'pages')
+        with self.server.pipeline() as pipe:
+            if fingerprint is not None:
+                # The first page starts the walk, pages left from a walk cut
+                # short under the same run id do not count towards it
+                pipe.delete(pages_key)
+                pipe.set(self.run_key(search_url, 'fingerprint'), fingerprint)
+            pipe.sadd(pages_key, page)
+            pipe.scard(pages_key)
+            parsed = pipe.execute()[-1]
+        if parsed >= total_pages:
+            self.commit(search_url)
+
+    def commit(self, search_url):
+        """Store the first page fingerprint collected by a walk."""
+        fingerprint_key = self.run_key(search_url, 'fingerprint')
+        fingerprint = self.server.get(fingerprint_key)
+        if fingerprint is None:
+            # Committed by the crawler that parsed another last page
+            return
+        with self.server.pipeline() as pipe:
+            pipe.set(self.key(search_url), fingerprint, ex=self.max_age or None)
+            pipe.delete(fingerprint_key, self.run_key(search_url, 'pages'))
+            pipe.execute()
+
+
+class SearchHistory:
+    """
+    Marks the searches whose every result page has been parsed.
+
+    A sold search sorted newest first can stop at its first page holding no
+    new sale, but only once its older pages are known to be stored. Pages
+    parsed in the current run are collected in the frontier, the search is
+    marked complete when all of them have been seen. The mark expires after
+    max_age seconds so the full history is walked again once in a while.
+    """
+
+    def __init__(self, server, spider_name, max_age, run_id):
+        self.server = server
+        self.spider_name = spider_name
+        self.max_age = max_age
+        self.run_id = run_id
+
+    @classmethod
+    def from_spider(cls, spider):
+        return cls(get_redis_server(spider.settings), spider.name,
+                   spider.settings.getint('SEARCH_PAGE_MAX_AGE'),
+                   get_frontier_run_id(spider))
+
+    def key(self, search_url):
+        return f"search_history:{self.spider_name}:{search_digest(search_url)}"
+
+    def complete(self, search_url):
+        """Whether every page of a search was parsed by a recent run."""
+        return bool(self.server.exists(self.key(search_url)))
+
+    def page_parsed(self, search_url, page, total_pages):
+        """Count a parsed page, marking the search complete after the last one."""
+        pages_key = frontier_key(
+            self.run_id, self.spider_name, f"pages:{search_digest(search_url)}")
+        with self.server.pipeline() as pipe:
+            pipe.sadd(pages_key, page)
+            pipe.scard(pages_key)
+            _, parsed = pipe.execute()
+        if parsed >= total_pages:
+            self.server.set(self.key(search_url), total_pages,
+                            ex=self.max_age or None)
+            self.server.delete(pages_key)
+
+
+def item_content_hash(item):
+    """Stable hash of every field of a scraped item."""
+    return hashlib.blake2b(
+        json.dumps(item, sort_keys=True, separators=(",", ":"),
+                   default=str).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+class ContentHashCache:
+    """
+    Content hash of the stored items by (data_id, for_sale), so unchanged
+    items are told apart without reading their documents.
+
+    Hashes are loaded a batch at a time, with one projected $in query on
+    data_id per for_sale for the items not known yet, and kept for the rest
+    of the crawl.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+
+    def load(self, collection, items):
+        """
+        Load the stored hashes of the items of a batch not known yet.
+
+        :param items: list, the item dicts of the batch
+        :return: int, number of hashes loaded
+        """
+        by_status = {}
+        for item in items:
+            if (item["data_id"], item["for_sale"]) not in self.hashes:
+                by_status.setdefault(item["for_sale"], []).append(
+                    item["data_id"])
+        loaded = 0
+        for for_sale, data_ids in by_status.items():
+            for doc in collection.find(
+                    {"data_id": {"$in": data_ids}, "for_sale": for_sale,
+                     "content_hash": {"$exists": True}},
+                    {"_id": 0, "data_id": 1, "content_hash": 1}):
+                self.hashes[(doc.get("data_id"), for_sale)] = \
+                    doc["content_hash"]
+                loaded += 1
+        return loaded
+
+    def get(self, item):
+        return self.hashes.get((item["data_id"], item["for_sale"]))
+
+    def update(self, items_hashes):
+        for item, content_hash in items_hashes:
+            self.hashes[(item["data_id"], item["for_sale"])] = content_hash
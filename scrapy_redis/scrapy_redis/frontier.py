@@ -0,0 +1,193 @@
+import logging
+import pickle
+import uuid
+import redis
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.utils.misc import create_instance, load_object
+from scrapy.utils.request import request_from_dict
+
+
+def get_redis_server(settings):
+    """Create a Redis client from the REDIS_URL setting."""
+    return redis.StrictRedis.from_url(settings.get('REDIS_URL'))
+
+
+def get_frontier_run_id(spider):
+    """
+    The crawl run whose frontier a spider shares, given by the scheduler as
+    the frontier_run_id spider argument. Crawls started outside a scheduled
+    run, e.g. by hand or through ScrapyRT, get a run of their own that is
+    dropped when they close, so they never see an earlier crawl's
+    fingerprints.
+    """
+    if not getattr(spider, 'frontier_run_id', None):
+        spider.frontier_run_id = uuid.uuid4().hex
+        spider.frontier_run_owned = True
+    return spider.frontier_run_id
+
+
+def frontier_key(run_id, spider_name, suffix):
+    """Build the key of a frontier structure of a crawl run."""
+    return f"frontier:{run_id}:{spider_name}:{suffix}"
+
+
+def clear_frontier(server, run_id, spider_name=None):
+    """Drop the frontier structures of a crawl run, of every spider by default."""
+    pattern = frontier_key(run_id, spider_name or '*', '*')
+    keys = list(server.scan_iter(pattern))
+    if keys:
+        server.delete(*keys)
+    return len(keys)
+
+
+class RedisDupeFilter(BaseDupeFilter):
+    """Request fingerprint set shared by every crawler of a spider."""
+
+    def __init__(self, server, fingerprinter, debug=False):
+        self.server = server
+        self.fingerprinter = fingerprinter
+        self.debug = debug
+        self.key = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            get_redis_server(crawler.settings),
+            crawler.request_fingerprinter,
+            crawler.settings.getbool('DUPEFILTER_DEBUG'),
+        )
+
+    def open(self):
+        # The key is bound by RedisScheduler.open once the spider is known
+        return None
+
+    def bind(self, spider):
+        self.key = frontier_key(
+            get_frontier_run_id(spider), spider.name, 'dupefilter')
+
+    def request_seen(self, request):
+        fingerprint = self.fingerprinter.fingerprint(request).hex()
+        return self.server.sadd(self.key, fingerprint) == 0
+
+    def log(self, request, spider):
+        if self.debug:
+            logging.debug(f"Filtered duplicate request: {request}")
+        spider.crawler.stats.inc_value('dupefilter/filtered', spider=spider)
+
+
+class RedisScheduler(BaseScheduler):
+    """
+    Priority queue shared through Redis by every replica running a spider.
+
+    Listing, detail and profile requests discovered by any postcode crawl
+    are pushed to one sorted set per spider, so idle crawlers take over the
+    pending work of busy ones. A crawler only goes idle once the shared
+    queue is empty.
+    """
+
+    def __init__(self, server, dupefilter, stats):
+        self.server = server
+        self.df = dupefilter
+        self.stats = stats
+        self.spider = None
+        self.queue_key = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter_class = load_object(crawler.settings['DUPEFILTER_CLASS'])
+        return cls(
+            get_redis_server(crawler.settings),
+            create_instance(dupefilter_class, crawler.settings, crawler),
+            crawler.stats,
+        )
+
+    def open(self, spider):
+        self.spider = spider
+        self.queue_key = frontier_key(
+            get_frontier_run_id(spider), spider.name, 'requests')
+        if isinstance(self.df, RedisDupeFilter):
+            self.df.bind(spider)
+        logging.info(
+            f"Shared frontier {self.queue_key} opened with "
+            f"{self.server.zcard(self.queue_key)} pending requests.")
+        return self.df.open()
+
+    def close(self, reason):
+        if getattr(self.spider, 'frontier_run_owned', False):
+            # Nothing else crawls in a run of its own
+            clear_frontier(self.server, self.spider.frontier_run_id,
+                           self.spider.name)
+        return self.df.close(reason)
+
+    def has_pending_requests(self):
+        return self.server.zcard(self.queue_key) > 0
+
+    def enqueue_request(self, request):
+        if not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+        data = pickle.dumps(
+            request.to_dict(spider=self.spider), protocol=pickle.HIGHEST_PROTOCOL)
+        # Lower scores pop first, so higher Scrapy priorities go negative
+        self.server.zadd(self.queue_key, {data: -request.priority})
+        self.stats.inc_value('scheduler/enqueued/redis', spider=self.spider)
+        return True
+
+    def next_request(self):
+        popped = self.server.zpopmin(self.queue_key)
+        if not popped:
+            return None
+        data, _ = popped[0]
+        self.stats.inc_value('scheduler/dequeued/redis', spider=self.spider)
+        return request_from_dict(pickle.loads(data), spider=self.spider)
+
+
+class RedisJoinBuffer:
+    """
+    Pairs the parts of a record fetched by concurrent requests.
+
+    The requests may be handled by different replicas sharing the frontier,
+    so parts are kept in one Redis hash per spider and crawl run. Each part
+    is stored and counted in one transaction, the request that stores the
+    last part receives all of them.
+    """
+
+    # Parts left by failed requests are dropped with the key after a day
+    TTL_SECONDS = 24 * 60 * 60
+
+    def __init__(self, server, key, parts):
+        self.server = server
+        self.key = key
+        self.parts = parts
+
+    @classmethod
+    def from_spider(cls, spider, name, parts):
+        return cls(get_redis_server(spider.settings),
+                   frontier_key(get_frontier_run_id(spider), spider.name, name),
+                   parts)
+
+    def add(self, join_id, part, value):
+        """
+        Store one part of a record.
+
+        :param join_id: str, the id shared by the parts of the record
+        :param part: str, the name of the part being stored
+        :param value: the part, anything that can be pickled
+        :return: dict, every part by name once complete, otherwise None
+        """
+        fields = [f"{join_id}:{name}" for name in self.parts]
+        count_field = f"{join_id}:count"
+        with self.server.pipeline() as pipe:
+            pipe.hset(self.key, f"{join_id}:{part}",
+                      pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            pipe.hincrby(self.key, count_field, 1)
+            pipe.hmget(self.key, fields)
+            pipe.expire(self.key, self.TTL_SECONDS)
+            _, count, values, _ = pipe.execute()
+
+        if count < len(self.parts):
+            return None
+        self.server.hdel(self.key, count_field, *fields)
+        return {name: pickle.loads(value)
+                for name, value in zip(self.parts, values)}
@@ -34,6 +34,7 @@ class Constants:
     DOMAIN_SOLD = (
         f"{DOMAIN_BASE_URL}/sold-listings/?ptype=development-site,duplex,free-standing,"
         "new-land,town-house,vacant-land&excludepricewithheld=1&landsizeunit=m2"
+        "&sort=solddate-desc"
     )
     DOMAIN_PROPERTY_PROFILE = f"{DOMAIN_BASE_URL}/property-profile"
     DOMAIN_SUBURB_PROFILE = f"{DOMAIN_BASE_URL}/suburb-profile"
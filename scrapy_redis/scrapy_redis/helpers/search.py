@@ -0,0 +1,355 @@
+import json
+import logging
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse
+import scrapy
+from scrapy.loader import ItemLoader
+from ..frontier import get_redis_server
+from ..fingerprints import (
+    ListingFingerprints,
+    SearchHistory,
+    SearchPageFingerprints,
+    listing_fingerprint,
+    search_page_fingerprint,
+)
+from ..items import DomainItem, ListingSeenItem
+from .constants import Constants
+
+# Search URLs contain commas (ptype=a,b,c), so lists of them use a pipe
+SEARCH_URL_SEPARATOR = "|"
+POSTCODE_SEPARATOR = ","
+
+# Redis hash per spider holding the last seen page count of every postcode,
+# read by the scheduler to size its work units
+SEARCH_PAGES_KEY = "search_pages:{spider_name}"
+
+# Bands a search is split into once it has too many result pages. Bounds
+# are shared by neighbouring bands, the dupefilter drops listings seen twice.
+PRICE_BANDS = [
+    "0-500000", "500000-750000", "750000-1000000", "1000000-1500000",
+    "1500000-2000000", "2000000-3000000", "3000000-any",
+]
+LAND_SIZE_BOUNDS = [0, 300, 600, 1000, 2000, 5000, 10000]
+
+
+def search_page_priority(page):
+    """Earlier search pages first, so listings are discovered in order."""
+    return -page
+
+
+def detail_priority(page):
+    """
+    Listing details of a search page share the priority of the page after
+    it, so detail and profile requests interleave with the fanned-out search
+    pages instead of waiting behind all of them or starving them.
+    """
+    return search_page_priority(page + 1)
+
+
+def get_postcode(url):
+    """Extract the postcode filter of a search URL, None if it has none."""
+    values = parse_qs(urlparse(url).query).get("postcode")
+    return values[0] if values else None
+
+
+def build_search_urls(base_url, search_urls=None, postcodes=None):
+    """
+    Resolve the spider arguments into the search URLs to seed.
+
+    :param base_url: str, the search URL postcodes are appended to
+    :param search_urls: str, one search URL or several separated by '|'
+    :param postcodes: str, postcodes separated by ','
+    :return: list, (postcode, search URL) tuples
+    """
+    urls = []
+    if search_urls:
+        urls.extend(
+            url.strip() for url in search_urls.split(SEARCH_URL_SEPARATOR)
+            if url.strip())
+    if postcodes:
+        urls.extend(
+            f"{base_url}&postcode={postcode.strip()}"
+            for postcode in str(postcodes).split(POSTCODE_SEPARATOR)
+            if postcode.strip())
+    if not urls:
+        urls.append(base_url)
+    return [(get_postcode(url), url) for url in urls]
+
+
+def with_query_param(url, name, value):
+    """Set one query parameter of a URL, keeping the others in order."""
+    parts = urlparse(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if any(k == name for k, _ in query):
+        query = [(k, value if k == name else v) for k, v in query]
+    else:
+        query.append((name, value))
+    return parts._replace(query=urlencode(query, safe=",-")).geturl()
+
+
+def split_land_size(land_size):
+    """Split a 'min-max' land size filter into the bands within it."""
+    low, _, high = (land_size or "0-any").partition("-")
+    low = int(low) if low.isdigit() else 0
+    high = int(high) if high.isdigit() else None
+    bounds = [low] + [bound for bound in LAND_SIZE_BOUNDS
+                      if bound > low and (high is None or bound < high)]
+    ends = [str(bound) for bound in bounds[1:]] + [str(high or "any")]
+    return [f"{start}-{end}" for start, end in zip(bounds, ends)]
+
+
+def split_search_url(url):
+    """
+    Partition a search into narrower searches that together cover it, first
+    by property type, then by price band, then by land size band.
+
+    :param url: str, the search URL whose results exceed the page cap
+    :return: list, the sub-query URLs, empty once nothing is left to split
+    """
+    params = dict(parse_qsl(urlparse(url).query, keep_blank_values=True))
+    property_types = [ptype for ptype in params.get("ptype", "").split(",")
+                      if ptype]
+    if len(property_types) > 1:
+        return [with_query_param(url, "ptype", ptype)
+                for ptype in property_types]
+    if "price" not in params:
+        return [with_query_param(url, "price", band) for band in PRICE_BANDS]
+    land_sizes = split_land_size(params.get("landsize"))
+    if len(land_sizes) > 1:
+        return [with_query_param(url, "landsize", band) for band in land_sizes]
+    return []
+
+
+def inc_postcode_stat(spider, postcode, name, count=1):
+    """Count a per-postcode stat, e.g. postcode/2000/pages."""
+    if postcode:
+        spider.crawler.stats.inc_value(f"postcode/{postcode}/{name}", count)
+
+
+def record_search_pages(spider, postcode, total_pages):
+    """Keep the page count of a postcode search for stats and scheduling."""
+    if not postcode:
+        return
+    spider.crawler.stats.set_value(
+        f"postcode/{postcode}/total_pages", total_pages)
+    get_redis_server(spider.settings).hset(
+        SEARCH_PAGES_KEY.format(spider_name=spider.name), postcode, total_pages)
+
+
+class SearchSpiderMixin:
+    """
+    Search result crawling shared by the buy and sold spiders: seeding the
+    search URLs, reading listings off result pages, skipping unchanged
+    listings and searches, and splitting and paginating searches.
+
+    Spiders set for_sale, search_urls and default_search_url, and define
+    detail_requests(item, page, postcode), yielding the requests following
+    a new or changed listing of a search page.
+    """
+
+    for_sale = None
+
+    _listing_fingerprints = None
+    _search_page_fingerprints = None
+    _search_history = None
+
+    @property
+    def listing_fingerprints(self):
+        """Fingerprints of the listings stored by previous runs."""
+        if self._listing_fingerprints is None:
+            self._listing_fingerprints = ListingFingerprints.from_settings(
+                self.settings, self.name)
+        return self._listing_fingerprints
+
+    @property
+    def search_page_fingerprints(self):
+        """First page fingerprints of the searches of previous runs."""
+        if self._search_page_fingerprints is None:
+            self._search_page_fingerprints = SearchPageFingerprints.from_spider(
+                self)
+        return self._search_page_fingerprints
+
+    @property
+    def search_history(self):
+        """Searches whose full history has been stored."""
+        if self._search_history is None:
+            self._search_history = SearchHistory.from_spider(self)
+        return self._search_history
+
+    def search_unchanged(self, search_url, fingerprint):
+        """Whether the first page of a search matches the previous run."""
+        if not self.settings.getbool('SEARCH_PAGE_SHORT_CIRCUIT'):
+            return False
+        return self.search_page_fingerprints.unchanged(search_url, fingerprint)
+
+    def search_page_parsed(self, search_url, current_page, total_pages,
+                           fingerprint):
+        """Count a page of a search that is walked in full."""
+        if self.settings.getbool('SEARCH_PAGE_SHORT_CIRCUIT'):
+            self.search_page_fingerprints.page_parsed(
+                search_url, current_page, total_pages, fingerprint)
+
+    def search_walk_stopped(self, search_url):
+        """
+        Store the first page fingerprint of a search whose walk stopped
+        early because the rest of it is known.
+        """
+        if self.settings.getbool('SEARCH_PAGE_SHORT_CIRCUIT'):
+            self.search_page_fingerprints.commit(search_url)
+
+    def changed_listings(self, items):
+        """Data ids of the listings of a search page worth fetching again."""
+        data_ids = {item['data_id'] for item in items}
+        if not self.settings.getbool('INCREMENTAL_CRAWL'):
+            return data_ids
+        return self.listing_fingerprints.changed(
+            {item['data_id']: item['listing_fingerprint'] for item in items})
+
+    def start_requests(self):
+        for postcode, search_url in self.search_urls:
+            # Like Scrapy's own start requests, never dropped as duplicates,
+            # e.g. when a crawl task is retried within its run
+            yield scrapy.Request(
+                url=search_url,
+                callback=self.parse,
+                headers=self.headers,
+                dont_filter=True,
+                meta={'search_url': search_url, 'postcode': postcode}
+            )
+
+    def parse(self, response):
+        try:
+            # Ensure the response body is correctly decoded and parsed
+            json_resp = json.loads(response.body)
+            # Pages can be fetched by any replica sharing the frontier, so
+            # the search URL travels with the request
+            search_url = response.meta.get('search_url', self.default_search_url)
+            postcode = response.meta.get('postcode')
+            inc_postcode_stat(self, postcode, 'pages')
+
+            # Access the nested keys correctly
+            props = json_resp.get("props", {})
+
+            # Page number of this response, used to rank its detail requests
+            page = props.get("currentPage", 1)
+
+            # Filter dictionary using the list of strings
+            listings_map = props.get("listingsMap", {})
+            property_advs = {k: v for k,
+                             v in listings_map.items() if len(k) == 10}
+            items = self.load_listings(response, property_advs)
+
+            # Listings unchanged since they were stored are only marked as
+            # seen, their advert and profile are not fetched again
+            changed = self.changed_listings(items)
+            for item in items:
+                if item['data_id'] not in changed:
+                    inc_postcode_stat(self, postcode, 'unchanged')
+                    yield ListingSeenItem(
+                        data_id=item['data_id'], for_sale=self.for_sale)
+                    continue
+                yield from self.detail_requests(item, page, postcode)
+
+            yield from self.follow_search(
+                response, search_url, postcode, listings_map,
+                props["currentPage"], props["totalPages"], changed)
+        except json.JSONDecodeError as e:
+            logging.error(f"JSON Decode Error: {e}")
+
+    def load_listings(self, response, property_advs):
+        """Load the listings of a search result page into items."""
+        items = []
+        for adv_id, adv in property_advs.items():
+            loader = ItemLoader(item=DomainItem(), response=response)
+            loader.add_value('short_address', adv.get(
+                'listingModel', {}).get('address', {}).get('street'))
+            loader.add_value('latitude', adv.get(
+                'listingModel', {}).get('address', {}).get('lat'))
+            loader.add_value('longtitude', adv.get(
+                'listingModel', {}).get('address', {}).get('lng'))
+            loader.add_value('auction', adv.get(
+                'listingModel', {}).get('auction'))
+
+            url_suf_path = adv.get('listingModel', {}).get('url')
+
+            loader.add_value(
+                'data_id', url_suf_path[1:] if url_suf_path.startswith('/') else url_suf_path)
+            loader.add_value('property_id', adv_id)
+            loader.add_value(
+                'advert_web_link', f"{Constants.DOMAIN_BASE_URL}{url_suf_path}")
+            loader.add_value('listing_fingerprint', listing_fingerprint(
+                adv.get('listingModel', {})))
+            items.append(loader.load_item())
+        return items
+
+    def history_pages(self, search_url, postcode, current_page, total_pages,
+                      changed):
+        """
+        Pages to follow for a search whose stored history makes the rest of
+        it known, None to paginate the search as usual.
+        """
+        return None
+
+    def follow_search(self, response, search_url, postcode, listings_map,
+                      current_page, total_pages, changed):
+        """Split, paginate or stop a search after one of its pages."""
+        if current_page == 1 and not response.meta.get('split'):
+            record_search_pages(self, postcode, total_pages)
+
+        # Searches at the page cap are re-issued as narrower sub-queries
+        # crawled side by side, listings they share are dropped by the
+        # dupefilter
+        page_cap = self.settings.getint('SEARCH_SPLIT_PAGES')
+        sub_queries = split_search_url(search_url) if (
+            current_page == 1 and page_cap and total_pages >= page_cap) else []
+
+        # A search whose first page and page count match the previous
+        # run is not paginated, nothing moved in it. Split searches are
+        # left to the first pages of their sub-queries. Listings past the
+        # first page of a skipped search wait for the walk that follows
+        # the expiry of its fingerprint.
+        fingerprint = search_page_fingerprint(listings_map, total_pages) \
+            if current_page == 1 else None
+        unchanged = current_page == 1 and not sub_queries and \
+            self.search_unchanged(search_url, fingerprint)
+        if not unchanged and not sub_queries:
+            self.search_page_parsed(
+                search_url, current_page, total_pages, fingerprint)
+        for sub_query in sub_queries:
+            yield scrapy.Request(
+                url=sub_query,
+                callback=self.parse,
+                headers=self.headers,
+                priority=search_page_priority(current_page),
+                meta={'search_url': sub_query, 'postcode': postcode,
+                      'split': True}
+            )
+
+        history_pages = None
+        if not unchanged and not sub_queries:
+            history_pages = self.history_pages(
+                search_url, postcode, current_page, total_pages, changed)
+
+        # The first page knows the page count, so every remaining page
+        # is scheduled at once instead of one after another
+        if unchanged:
+            inc_postcode_stat(self, postcode, 'unchanged_searches')
+            next_pages = []
+        elif sub_queries:
+            inc_postcode_stat(
+                self, postcode, 'split_queries', len(sub_queries))
+            next_pages = []
+        elif history_pages is not None:
+            next_pages = history_pages
+        elif self.settings.getbool('SEARCH_PAGE_FANOUT'):
+            next_pages = range(2, total_pages + 1) if current_page == 1 else []
+        else:
+            next_pages = [current_page + 1] if current_page < total_pages else []
+
+        for next_page in next_pages:
+            yield scrapy.Request(
+                url=f'{search_url}&page={next_page}',
+                callback=self.parse,
+                headers=self.headers,
+                priority=search_page_priority(next_page),
+                meta={'search_url': search_url, 'postcode': postcode}
+            )
@@ -0,0 +1,124 @@
+import logging
+import os
+import sqlite3
+import time
+import zstandard
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+# Share of HTTPCACHE_MAX_BYTES kept after an eviction, so the cache does
+# not evict again on every store once it is full
+EVICTION_TARGET = 0.9
+ZSTD_LEVEL = 3
+
+
+class SqliteCacheStorage:
+    """
+    HTTP cache storage in one SQLite file with zstd compressed bodies.
+
+    Entries are keyed by request fingerprint, i.e. method, canonical URL and
+    body. Each entry expires after the TTL of the callback its request was
+    made for (HTTPCACHE_CALLBACK_TTLS), falling back to
+    HTTPCACHE_EXPIRATION_SECS. Once the stored bodies exceed
+    HTTPCACHE_MAX_BYTES, expired entries and then the oldest ones are evicted.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.callback_ttls = settings.getdict('HTTPCACHE_CALLBACK_TTLS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES')
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.db = None
+        self.size = 0
+        self._fingerprinter = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, 'httpcache.sqlite')
+        # Crawlers of every spider in the process share the file
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'fingerprint TEXT PRIMARY KEY, url TEXT, status INTEGER, '
+            'headers BLOB, body BLOB, size INTEGER, '
+            'stored_at REAL, expires_at REAL)'
+        )
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_stored_at '
+            'ON responses (stored_at)')
+        self.size = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        logging.debug(
+            f"Using SQLite HTTP cache {path} holding {self.size} bytes.")
+
+    def close_spider(self, spider):
+        self.db.close()
+
+    def request_ttl(self, request):
+        """TTL of a response, by the name of the callback of its request."""
+        callback = getattr(request.callback, '__name__', 'parse')
+        return self.callback_ttls.get(callback, self.expiration_secs)
+
+    def retrieve_response(self, spider, request):
+        row = self.db.execute(
+            'SELECT url, status, headers, body, expires_at FROM responses '
+            'WHERE fingerprint = ?',
+            (self._fingerprinter.fingerprint(request).hex(),)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, expires_at = row
+        if expires_at and expires_at < time.time():
+            return None
+
+        headers = Headers(headers_raw_to_dict(headers))
+        body = self.decompressor.decompress(body)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        fingerprint = self._fingerprinter.fingerprint(request).hex()
+        body = self.compressor.compress(response.body)
+        now = time.time()
+        ttl = self.request_ttl(request)
+
+        previous = self.db.execute(
+            'SELECT size FROM responses WHERE fingerprint = ?',
+            (fingerprint,)).fetchone()
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (fingerprint, response.url, response.status,
+             headers_dict_to_raw(response.headers), body, len(body),
+             now, now + ttl if ttl > 0 else None)
+        )
+        self.size += len(body) - (previous[0] if previous else 0)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the oldest, until under the budget."""
+        self.db.execute(
+            'DELETE FROM responses WHERE expires_at < ?', (time.time(),))
+        self.size = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        excess = self.size - int(self.max_bytes * EVICTION_TARGET)
+        if excess > 0:
+            cutoff = None
+            freed = 0
+            for stored_at, size in self.db.execute(
+                    'SELECT stored_at, size FROM responses ORDER BY stored_at'):
+                freed += size
+                cutoff = stored_at
+                if freed >= excess:
+                    break
+            self.db.execute(
+                'DELETE FROM responses WHERE stored_at <= ?', (cutoff,))
+            self.size = self.db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        logging.info(f"HTTP cache evicted down to {self.size} bytes.")
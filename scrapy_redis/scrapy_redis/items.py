@@ -150,3 +150,13 @@ class DomainItem(scrapy.Item):
     upper_price = scrapy.Field(
         output_processor=TakeFirst()
     )
+    listing_fingerprint = scrapy.Field(
+        output_processor=TakeFirst()
+    )
+
+
+class ListingSeenItem(scrapy.Item):
+    # An unchanged listing found again by a search, only its last_seen is
+    # updated
+    data_id = scrapy.Field()
+    for_sale = scrapy.Field()
@@ -0,0 +1,171 @@
+import contextlib
+import fcntl
+import logging
+import os
+import pickle
+import time
+import uuid
+
+SEGMENT_SUFFIX = '.segment'
+REJECTED_SUFFIX = '.rejected'
+# Held by the crawl writing a journal, released when it closes or dies
+OWNER_LOCK = 'owner.lock'
+# Held while a crawl creates its journal and claims orphaned ones
+CLAIM_LOCK = 'claim.lock'
+
+
+def lock_file(path, blocking=True):
+    """
+    Open and exclusively flock a lock file.
+
+    :return: file, the open lock file, None if another holder has it and
+        blocking is off
+    """
+    lock = open(path, 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+@contextlib.contextmanager
+def locked(path):
+    lock = lock_file(path)
+    try:
+        yield
+    finally:
+        lock.close()
+
+
+def open_crawl_journal(root):
+    """
+    Journal of a new crawl, in a directory of its own under root, along with
+    the journals of earlier crawls that died before closing theirs.
+
+    Crawls hold the owner lock of their journal until they close it, the
+    journals whose owner lock is free are orphans. They are claimed under
+    the claim lock of root, so each one is replayed by a single crawl.
+
+    :param root: str, the journal directory of a spider
+    :return: tuple, the new BatchJournal and the claimed orphan journals
+    """
+    os.makedirs(root, exist_ok=True)
+    with locked(os.path.join(root, CLAIM_LOCK)):
+        journal = BatchJournal(os.path.join(root, uuid.uuid4().hex))
+        journal.hold()
+        orphans = []
+        for name in sorted(os.listdir(root)):
+            directory = os.path.join(root, name)
+            if directory == journal.directory or not os.path.isdir(directory):
+                continue
+            orphan = BatchJournal(directory)
+            if orphan.hold(blocking=False):
+                orphans.append(orphan)
+    return journal, orphans
+
+
+class BatchJournal:
+    """
+    Write-ahead journal of item batches, one segment file per batch.
+
+    A batch is appended before it is written to Mongo and acknowledged, i.e.
+    its segment deleted, once the write succeeded. Segments left behind by a
+    failed write or a killed process are replayed when the next crawl opens,
+    so every item is written at least once. Segments are named by creation
+    time, replaying them in name order keeps batches in the order they were
+    written.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.owner_lock = None
+        os.makedirs(directory, exist_ok=True)
+
+    def hold(self, blocking=True):
+        """
+        Take the owner lock of the journal.
+
+        :return: bool, False if another crawl holds it and blocking is off
+        """
+        self.owner_lock = lock_file(
+            os.path.join(self.directory, OWNER_LOCK), blocking)
+        return self.owner_lock is not None
+
+    def close(self):
+        """
+        Release the journal, removing its directory once nothing is left in
+        it. Segments still pending are claimed by the next crawl.
+        """
+        root = os.path.dirname(self.directory)
+        try:
+            with locked(os.path.join(root, CLAIM_LOCK)):
+                names = set(os.listdir(self.directory))
+                # Segments cut short by a dying crawl were never written to
+                for name in names:
+                    if name.endswith('.tmp'):
+                        os.remove(os.path.join(self.directory, name))
+                if {name for name in names
+                        if not name.endswith('.tmp')} == {OWNER_LOCK}:
+                    os.remove(os.path.join(self.directory, OWNER_LOCK))
+                    os.rmdir(self.directory)
+        except OSError as e:
+            logging.warning(f"Could not remove journal {self.directory}: {e}")
+        finally:
+            if self.owner_lock:
+                self.owner_lock.close()
+                self.owner_lock = None
+
+    def append(self, batch):
+        """
+        Durably store a batch before it is written.
+
+        :param batch: list, the item dicts of the batch
+        :return: str, path of the segment to acknowledge
+        """
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, name + SEGMENT_SUFFIX)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as segment:
+            pickle.dump(batch, segment, protocol=pickle.HIGHEST_PROTOCOL)
+            segment.flush()
+            os.fsync(segment.fileno())
+        # A segment only appears once complete
+        os.replace(tmp_path, path)
+        return path
+
+    def ack(self, path):
+        """Drop the segment of a batch that has been written."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already replayed and acknowledged by another crawler
+            pass
+
+    def reject(self, path):
+        """Set aside a batch Mongo refused, it is kept but not replayed."""
+        try:
+            os.replace(path, path[:-len(SEGMENT_SUFFIX)] + REJECTED_SUFFIX)
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        """Paths of the segments not acknowledged yet, oldest first."""
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def load(self, path):
+        """Read the batch of a segment, None if it vanished or is unreadable."""
+        try:
+            with open(path, 'rb') as segment:
+                return pickle.load(segment)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError) as e:
+            logging.error(f"Unreadable journal segment {path}: {e}")
+            self.reject(path)
+            return None
@@ -5,10 +5,25 @@
 
 
 # useful for handling different item types with a single interface
+import os
+import threading
 import time
+from datetime import datetime, timezone
 from itemadapter import ItemAdapter
-from pymongo import MongoClient, UpdateOne, errors
+from pymongo import MongoClient, UpdateMany, UpdateOne, errors
 import logging
+import redis
+from scrapy.utils.project import data_path
+from twisted.internet import defer, task, threads
+from scrapy_redis.comparables import ComparablesMaintainer
+from scrapy_redis.fingerprints import (
+    ContentHashCache,
+    ListingFingerprints,
+    item_content_hash,
+)
+from scrapy_redis.items import ListingSeenItem
+from scrapy_redis.journal import open_crawl_journal
+from scrapy_redis.writer import BackgroundWriter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,14 +31,16 @@ logger = logging.getLogger(__name__)
 
 # Global MongoClient instance
 mongo_client = None
+mongo_client_lock = threading.Lock()
 
 
-def connect_with_retry(uri, retries=5, backoff_factor=1):
+def connect_with_retry(uri, max_pool_size=1, retries=5, backoff_factor=1):
     """Connect to MongoDB with retries and exponential backoff."""
     for attempt in range(retries):
         try:
             client = MongoClient(
-                uri, maxPoolSize=1, socketTimeoutMS=10000, connectTimeoutMS=20000)
+                uri, maxPoolSize=max_pool_size, socketTimeoutMS=10000,
+                connectTimeoutMS=20000)
             # Test connection
             client.admin.command('ping')
             return client
@@ -35,11 +52,13 @@ def connect_with_retry(uri, retries=5, backoff_factor=1):
     raise Exception("Could not connect to MongoDB after multiple retries")
 
 
-def get_global_mongo_client(uri):
+def get_global_mongo_client(uri, max_pool_size=1):
     global mongo_client
-    if mongo_client is None:
-        mongo_client = connect_with_retry(uri)
-        logging.info("MongoDB client created successfully.")
+    # Crawlers running in one process may connect from several threads
+    with mongo_client_lock:
+        if mongo_client is None:
+            mongo_client = connect_with_retry(uri, max_pool_size)
+            logging.info("MongoDB client created successfully.")
     return mongo_client
 
 
@@ -49,78 +68,336 @@ class ScrapyRtPipeline:
 
 
 class MongoDBPineline(object):
+    """
+    Upserts items in batches from a background writer thread.
+
+    Batches are flushed when BATCH_SIZE items are collected or every
+    BATCH_FLUSH_SECS, and handed to a BackgroundWriter holding at most
+    MONGO_WRITER_QUEUE_SIZE pending batches, so Mongo round trips never
+    stall downloads and parsing. Writer lag and queue depth are reported
+    in the mongo_writer/* stats.
+
+    Each batch is journaled before it is handed to the writer, in a journal
+    directory of the crawl under JOURNAL_DIR/<spider>. Journals left by
+    crawls that failed to write or died are claimed and replayed when the
+    next crawl opens, so every flushed batch is written at least once.
+
+    With CHANGE_AWARE_UPSERTS, items whose content hash matches the stored
+    one only get last_seen updated and changed items only $set the fields
+    that differ.
+    """
+
     @classmethod
     def from_crawler(cls, crawler):
         mongo_uri = crawler.settings.get('MONGO_URI')
         mongo_db = crawler.settings.get('MONGO_DATABASE')
         collection_name = crawler.settings.get('MONGO_COLLECTION')
         batch_size = crawler.settings.get('BATCH_SIZE')
-        return cls(mongo_uri, mongo_db, collection_name, batch_size)
+        comparables_incremental = crawler.settings.getbool(
+            'COMPARABLES_INCREMENTAL')
+        return cls(mongo_uri, mongo_db, collection_name, batch_size,
+                   comparables_incremental, crawler.settings, crawler.stats,
+                   crawler.settings.getfloat('BATCH_FLUSH_SECS'),
+                   crawler.settings.getint('MONGO_WRITER_QUEUE_SIZE'),
+                   data_path(crawler.settings.get('JOURNAL_DIR'), createdir=True),
+                   crawler.settings.getbool('CHANGE_AWARE_UPSERTS'),
+                   crawler.settings.getint('MONGO_MAX_POOL_SIZE'))
 
-    def __init__(self, mongo_uri, mongo_db, collection_name, batch_size):
+    def __init__(self, mongo_uri, mongo_db, collection_name, batch_size,
+                 comparables_incremental=False, settings=None, stats=None,
+                 flush_secs=0, writer_queue_size=4, journal_dir=None,
+                 change_aware=False, max_pool_size=1):
         self.mongo_uri = mongo_uri
+        self.max_pool_size = max_pool_size
         self.mongo_db = mongo_db
         self.collection_name = collection_name
         self.batch_size = batch_size
+        self.comparables_incremental = comparables_incremental
 
         self.client = None
         self.db = None
         self.collection = None
+        self.comparables = None
+        self.settings = settings
+        self.fingerprints = None
         self.batch = []
+        # data_ids of unchanged listings seen again, by for_sale
+        self.seen = {}
+
+        self.change_aware = change_aware
+        self.content_hashes = None
+        self.journal_dir = journal_dir
+        self.journal = None
+        self.flush_secs = flush_secs
+        self.flush_loop = None
+        self.writer = BackgroundWriter(writer_queue_size, stats, 'mongo_writer')
 
     def open_spider(self, spider):
+        self.writer.start()
+        if self.flush_secs:
+            self.flush_loop = task.LoopingCall(self.flush_when_idle)
+            self.flush_loop.start(self.flush_secs, now=False)
+        # Connecting retries with sleeps, keep it off the reactor
+        return threads.deferToThread(self.connect, spider)
+
+    def connect(self, spider):
         try:
             # Use the global function to get or create the MongoClient
-            self.client = get_global_mongo_client(self.mongo_uri)
+            self.client = get_global_mongo_client(
+                self.mongo_uri, self.max_pool_size)
             self.db = self.client[self.mongo_db]
             self.collection = self.db[self.collection_name]
+            if self.comparables_incremental:
+                self.comparables = ComparablesMaintainer(
+                    self.db, self.collection_name)
+                self.comparables.ensure_indexes()
+            if self.settings is not None:
+                self.fingerprints = ListingFingerprints.from_settings(
+                    self.settings, spider.name)
+            if self.change_aware:
+                self.content_hashes = ContentHashCache()
             logging.info(
                 f"MongoDB connection to {self.mongo_db} opened successfully.")
         except Exception as e:
             logging.error(f"Failed to connect to MongoDB: {e}")
             raise
 
+        if self.journal_dir:
+            self.journal, orphans = open_crawl_journal(
+                os.path.join(self.journal_dir, spider.name))
+            for orphan in orphans:
+                self.replay_journal(orphan)
+
+    def replay_journal(self, journal):
+        """Write the batches of a journal left behind by an earlier crawl."""
+        segments = journal.pending()
+        if segments:
+            logging.info(f"Replaying {len(segments)} journaled batches.")
+        for segment in segments:
+            batch = journal.load(segment)
+            if batch is not None:
+                self.write_batch(batch, segment)
+        journal.close()
+
     def close_spider(self, spider):
-        try:
-            if self.batch:
-                self.insert_batch()
-        except Exception as e:
-            logging.error(f"Failed to insert batch during spider close: {e}")
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+        self.flush()
+        # Wait for the queued batches before the crawl is reported finished
+        drained = self.writer.drain()
+        if self.journal:
+            drained.addBoth(lambda result: self.journal.close() or result)
+        if self.comparables:
+            drained.addCallback(
+                lambda _: threads.deferToThread(self.publish_comparables))
+        return drained
+
+    def flush(self):
+        """Hand the collected items and seen listings to the writer."""
+        if self.batch:
+            batch, self.batch = self.batch, []
+            segment = self.journal.append(batch) if self.journal else None
+            self.writer.submit(self.write_batch, batch, segment)
+        if self.seen:
+            seen, self.seen = self.seen, {}
+            self.writer.submit(self.touch_seen, seen)
+
+    def flush_when_idle(self):
+        # Timed flush, skipped while the writer is busy with full batches
+        if not self.writer.full():
+            self.flush()
+
+    def flush_full_batch(self):
+        """
+        Flush once the writer has room. Until then items keep collecting in
+        the current batch and are held back, which slows the crawl down to
+        the speed Mongo is written at.
+        """
+        if len(self.batch) < self.batch_size and all(
+                len(seen) < self.batch_size for seen in self.seen.values()):
+            # Flushed by another item while this one waited
+            return defer.succeed(None)
+        if not self.writer.full():
+            self.flush()
+            return defer.succeed(None)
+        waiting = self.writer.wait_for_room()
+        waiting.addCallback(lambda _: self.flush_full_batch())
+        return waiting
 
     def process_item(self, item, spider):
-        try:
+        if isinstance(item, ListingSeenItem):
+            seen = self.seen.setdefault(item['for_sale'], [])
+            seen.append(item['data_id'])
+            if len(seen) < self.batch_size:
+                return item
+        else:
             # Append item to batch
             self.batch.append(dict(item))
+            # Check if batch size is reached, then flush
+            if len(self.batch) < self.batch_size:
+                return item
 
-            # Check if batch size is reached, then insert
-            if len(self.batch) >= self.batch_size:
-                self.insert_batch()
+        return self.flush_full_batch().addCallback(lambda _: item)
 
-            return item
-        except errors.PyMongoError as e:
-            logging.error(f"Error processing item: {e}")
-            raise
+    def write_batch(self, batch, segment=None):
+        """
+        Upsert a batch and update what depends on it, on the writer thread.
 
-    def insert_batch(self):
+        :param batch: list, the item dicts to upsert
+        :param segment: str, the journal segment of the batch
+        """
         try:
+            changed = self.insert_batch(batch)
+        except errors.BulkWriteError as e:
+            # Rejected documents fail the same way when replayed, the segment
+            # is set aside for inspection instead
+            logging.error(f"Bulk write error: {e.details}")
+            if segment:
+                self.journal.reject(segment)
+            return
+        except errors.PyMongoError as e:
+            logging.error(f"Error inserting batch, journaled for replay: {e}")
+            return
+
+        if segment:
+            self.journal.ack(segment)
+        self.record_fingerprints(batch)
+        self.update_comparables(changed)
+
+    def insert_batch(self, batch):
+        """
+        Upsert a batch.
+
+        :param batch: list, the item dicts to upsert
+        :return: list, the items that were new or changed
+        """
+        last_seen = datetime.now(timezone.utc)
+        if self.content_hashes is None:
             operations = []
-            for item in self.batch:
+            for item in batch:
                 operations.append(
                     UpdateOne(
                         {'data_id': item['data_id'],
                             'for_sale': item['for_sale']},
-                        {'$set': item},
+                        {'$set': {**item, 'last_seen': last_seen}},
                         upsert=True
                     )
                 )
-            # Perform bulk update
-            if operations:
-                self.collection.bulk_write(operations)
-                logging.info("Batch inserted successfully.")
+            changed, hashes = batch, []
+        else:
+            operations, changed, hashes = self.change_aware_operations(
+                batch, last_seen)
 
-            # Clear batch after insertion or update
-            self.batch = []
-        except errors.BulkWriteError as e:
-            logging.error(f"Bulk write error: {e.details}")
+        # Perform bulk update
+        if operations:
+            self.collection.bulk_write(operations)
+            logging.info(
+                f"Batch inserted successfully, {len(changed)} of "
+                f"{len(batch)} items new or changed.")
+        # Only remembered once written, a failed batch is compared again
+        if self.content_hashes is not None:
+            self.content_hashes.update(hashes)
+        return changed
+
+    def change_aware_operations(self, batch, last_seen):
+        """
+        Build the writes of a batch from the content hashes of its items.
+
+        :return: tuple, the operations, the new or changed items and their
+            (item, content hash) pairs
+        """
+        self.content_hashes.load(self.collection, batch)
+        unchanged = {}
+        hashes = []
+        for item in batch:
+            content_hash = item_content_hash(item)
+            if self.content_hashes.get(item) == content_hash:
+                unchanged.setdefault(item['for_sale'], []).append(
+                    item['data_id'])
+            else:
+                hashes.append((item, content_hash))
+
+        operations = [
+            UpdateMany({'data_id': {'$in': data_ids}, 'for_sale': for_sale},
+                       {'$set': {'last_seen': last_seen}})
+            for for_sale, data_ids in unchanged.items()
+        ]
+        previous = self.previous_documents(
+            [item for item, _ in hashes if self.content_hashes.get(item)])
+        for item, content_hash in hashes:
+            stored = previous.get((item['data_id'], item['for_sale']))
+            fields = item if stored is None else {
+                field: value for field, value in item.items()
+                if field not in stored or stored[field] != value
+            }
+            operations.append(
+                UpdateOne(
+                    {'data_id': item['data_id'],
+                        'for_sale': item['for_sale']},
+                    {'$set': {**fields, 'content_hash': content_hash,
+                              'last_seen': last_seen}},
+                    upsert=True
+                )
+            )
+        return operations, [item for item, _ in hashes], hashes
+
+    def previous_documents(self, items):
+        """Read the stored fields of changed items, by (data_id, for_sale)."""
+        by_status = {}
+        for item in items:
+            by_status.setdefault(item['for_sale'], []).append(item['data_id'])
+        fields = {field for item in items for field in item}
+
+        documents = {}
+        for for_sale, data_ids in by_status.items():
+            for doc in self.collection.find(
+                    {'data_id': {'$in': data_ids}, 'for_sale': for_sale},
+                    {'_id': 0, **{field: 1 for field in fields}}):
+                documents[(doc.get('data_id'), doc.get('for_sale'))] = doc
+        return documents
+
+    def touch_seen(self, seen):
+        """Mark the unchanged listings seen since the last touch."""
+        last_seen = datetime.now(timezone.utc)
+        operations = [
+            UpdateMany({'data_id': {'$in': data_ids}, 'for_sale': for_sale},
+                       {'$set': {'last_seen': last_seen}})
+            for for_sale, data_ids in seen.items()
+        ]
+        try:
+            self.collection.bulk_write(operations)
+        except errors.PyMongoError as e:
+            logging.error(f"Error touching seen listings: {e}")
+
+    def record_fingerprints(self, batch):
+        """
+        Remember the fingerprints of the stored batch, listings are only
+        skipped by later runs once they have been written.
+        """
+        if not self.fingerprints:
+            return
+        try:
+            self.fingerprints.record({
+                item['data_id']: item['listing_fingerprint']
+                for item in batch if item.get('listing_fingerprint')
+            })
+        except redis.RedisError as e:
+            # The listings are fetched again next run
+            logging.error(f"Error recording listing fingerprints: {e}")
+
+    def update_comparables(self, batch):
+        """Refresh the comparables touched by a written batch."""
+        if not self.comparables:
+            return
+        try:
+            self.comparables.update(batch)
+        except errors.PyMongoError as e:
+            # The end-of-run summary rebuild still corrects the comparables
+            logging.error(f"Error updating comparables: {e}")
+
+    def publish_comparables(self):
+        """Publish the comparables refreshed during the crawl, once."""
+        try:
+            self.comparables.publish()
         except errors.PyMongoError as e:
-            logging.error(f"Error inserting batch: {e}")
+            logging.error(f"Error publishing comparables version: {e}")
@@ -86,11 +86,21 @@ AUTOTHROTTLE_DEBUG = False
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-HTTPCACHE_ENABLED = False
-# HTTPCACHE_EXPIRATION_SECS = 3600
-# HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_ENABLED = os.getenv("HTTPCACHE_ENABLED", "false").lower() == "true"
+HTTPCACHE_EXPIRATION_SECS = 6 * 60 * 60
+HTTPCACHE_DIR = os.getenv("HTTPCACHE_DIR", "httpcache")
 HTTPCACHE_IGNORE_HTTP_CODES = [500, 502, 503, 504, 400, 403, 404, 408]
-# HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_STORAGE = "scrapy_redis.httpcache.SqliteCacheStorage"
+# Cache lifetime by request callback: search pages change within the day,
+# adverts slowly and property profile valuations rarely
+HTTPCACHE_CALLBACK_TTLS = {
+    "parse": 30 * 60,
+    "parse_property_adv": 6 * 60 * 60,
+    "parse_property_profile": 7 * 24 * 60 * 60,
+    "parse_prefetched_profile": 7 * 24 * 60 * 60,
+}
+# Compressed bodies kept on disk before the oldest entries are evicted
+HTTPCACHE_MAX_BYTES = int(os.getenv("HTTPCACHE_MAX_BYTES", 256 * 1024 * 1024))
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
@@ -102,8 +112,54 @@ MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DATABASE = os.getenv("DATABASE", "crawlingdb")
 MONGO_COLLECTION = os.getenv("COLLECTION", "properties")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 100))
-
-DUPEFILTER_CLASS = "scrapy.dupefilters.BaseDupeFilter"
+# Crawlers sharing a worker process share one Mongo client, each needs its
+# own connection for its background writer
+MONGO_MAX_POOL_SIZE = int(os.getenv(
+    "MONGO_MAX_POOL_SIZE", os.getenv("SPIDER_MAX_CRAWLERS", 4)))
+# Batches are also flushed every BATCH_FLUSH_SECS, and at most
+# MONGO_WRITER_QUEUE_SIZE of them wait for the background writer before
+# item processing is held back
+BATCH_FLUSH_SECS = float(os.getenv("BATCH_FLUSH_SECS", 5))
+MONGO_WRITER_QUEUE_SIZE = int(os.getenv("MONGO_WRITER_QUEUE_SIZE", 4))
+# Batches are journaled here until written, one directory per crawl under
+# JOURNAL_DIR/<spider>. Mount a volume to keep them
+# across container restarts
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+# Skip writing items whose content is unchanged and only $set the changed
+# fields of the others, comparing against the stored content hashes of
+# each batch
+CHANGE_AWARE_UPSERTS = os.getenv(
+    "CHANGE_AWARE_UPSERTS", "true").lower() == "true"
+# Maintain comparable_summary/comparable_average as SOLD items are written
+COMPARABLES_INCREMENTAL = os.getenv(
+    "COMPARABLES_INCREMENTAL", "true").lower() == "true"
+
+# Shared request frontier: every replica schedules into and consumes from
+# the same Redis queue and fingerprint set
+REDIS_URL = os.getenv(
+    "REDIS_URL", os.getenv("CELERY_BROKER_URL", "redis://redis.app.local:6379/0"))
+SCHEDULER = "scrapy_redis.frontier.RedisScheduler"
+# Schedule every search result page as soon as page 1 reports totalPages
+SEARCH_PAGE_FANOUT = os.getenv("SEARCH_PAGE_FANOUT", "true").lower() == "true"
+# Split searches reporting this many pages by property type, price band and
+# land size band, domain.com.au stops serving results after page 50 (0 disables)
+SEARCH_SPLIT_PAGES = int(os.getenv("SEARCH_SPLIT_PAGES", 50))
+# Fetch the property profile of a listing alongside its advert instead of
+# after it, pairing the two through a Redis join buffer
+PROFILE_PREFETCH = os.getenv("PROFILE_PREFETCH", "true").lower() == "true"
+# Only fetch the advert of listings that are new or whose search result
+# (price, auction, URL) changed, unchanged ones just get last_seen updated
+INCREMENTAL_CRAWL = os.getenv("INCREMENTAL_CRAWL", "true").lower() == "true"
+# Stop paginating a search whose first page (listings, prices, page count)
+# matches the previous run. A stored first page expires after
+# SEARCH_PAGE_MAX_AGE seconds, forcing a full walk of quiet searches.
+SEARCH_PAGE_SHORT_CIRCUIT = os.getenv(
+    "SEARCH_PAGE_SHORT_CIRCUIT", "true").lower() == "true"
+SEARCH_PAGE_MAX_AGE = int(os.getenv("SEARCH_PAGE_MAX_AGE", 7 * 24 * 60 * 60))
+# Page sold searches one page at a time once their history is stored,
+# stopping at the first page without a new sale (needs INCREMENTAL_CRAWL)
+SOLD_WATERMARK = os.getenv("SOLD_WATERMARK", "true").lower() == "true"
+DUPEFILTER_CLASS = "scrapy_redis.frontier.RedisDupeFilter"
 
 # Specify the number of items to crawl
 # CLOSESPIDER_ITEMCOUNT = 5
@@ -3,12 +3,19 @@ import logging
 import re
 import scrapy
 from scrapy.loader import ItemLoader
+from ..frontier import RedisJoinBuffer
 from ..helpers.constants import Constants
-from ..items import DomainItem
+from ..helpers.search import (
+    SearchSpiderMixin,
+    build_search_urls,
+    detail_priority,
+    inc_postcode_stat,
+)
 
 
-class DomainBuySpider(scrapy.Spider):
+class DomainBuySpider(SearchSpiderMixin, scrapy.Spider):
     name = "domain_buy"
+    for_sale = "FOR_SALE"
     allowed_domains = ["www.domain.com.au"]
     headers = {
         "Accept": "application/json",
@@ -18,68 +25,52 @@ class DomainBuySpider(scrapy.Spider):
         "User-Agent": Constants.USER_AGENT
     }
 
-    def __init__(self, domain_buy=None, *args, **kwargs):
+    def __init__(self, domain_buy=None, postcodes=None, *args, **kwargs):
         super(DomainBuySpider, self).__init__(*args, **kwargs)
         self.domain_buy = domain_buy or Constants.DOMAIN_BUY
-
-    def start_requests(self):
+        self.default_search_url = self.domain_buy
+        # One or more search URLs ('|' separated) and/or postcodes
+        # (',' separated) are seeded together in a single crawl
+        self.search_urls = build_search_urls(
+            Constants.DOMAIN_BUY, domain_buy, postcodes)
+        self._listing_joins = None
+
+    @property
+    def listing_joins(self):
+        """Join buffer pairing the advert and profile of prefetched listings."""
+        if self._listing_joins is None:
+            self._listing_joins = RedisJoinBuffer.from_spider(
+                self, 'listing_joins', ['advert', 'profile'])
+        return self._listing_joins
+
+    @staticmethod
+    def get_profile_slug(data_id):
+        """Address slug of a listing, its data_id without the listing id."""
+        return "-".join(data_id.split("-")[:-1])
+
+    def detail_requests(self, item, page, postcode):
         yield scrapy.Request(
-            url=self.domain_buy,
-            callback=self.parse,
-            headers=self.headers
+            url=item["advert_web_link"],
+            callback=self.parse_property_adv,
+            headers=self.headers,
+            priority=detail_priority(page),
+            meta={'item': item, 'postcode': postcode}
         )
 
-    def parse(self, response):
-        try:
-            # Ensure the response body is correctly decoded and parsed
-            json_resp = json.loads(response.body)
-
-            # Access the nested keys correctly
-            props = json_resp.get("props", {})
-
-            # Filter dictionary using the list of strings
-            listings_map = props.get("listingsMap", {})
-            property_advs = {k: v for k,
-                             v in listings_map.items() if len(k) == 10}
-
-            for adv_id, adv in property_advs.items():
-                loader = ItemLoader(item=DomainItem(), response=response)
-                loader.add_value('short_address', adv.get(
-                    'listingModel', {}).get('address', {}).get('street'))
-                loader.add_value('latitude', adv.get(
-                    'listingModel', {}).get('address', {}).get('lat'))
-                loader.add_value('longtitude', adv.get(
-                    'listingModel', {}).get('address', {}).get('lng'))
-                loader.add_value('auction', adv.get(
-                    'listingModel', {}).get('auction'))
-
-                url_suf_path = adv.get('listingModel', {}).get('url')
-
-                loader.add_value(
-                    'data_id', url_suf_path[1:] if url_suf_path.startswith('/') else url_suf_path)
-                loader.add_value('property_id', adv_id)
-                loader.add_value(
-                    'advert_web_link', f"{Constants.DOMAIN_BASE_URL}{url_suf_path}")
-
-                item = loader.load_item()
-
-                yield scrapy.Request(
-                    url=item["advert_web_link"],
-                    callback=self.parse_property_adv,
-                    headers=self.headers,
-                    meta={'item': item}
-                )
-
-            current_page = props["currentPage"]
-            total_pages = props["totalPages"]
-            if current_page < total_pages:
-                yield scrapy.Request(
-                    url=f'{self.domain_buy}&page={current_page + 1}',
-                    callback=self.parse,
-                    headers=self.headers
-                )
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON Decode Error: {e}")
+        # The profile is fetched alongside the advert rather than after
+        # it, the two are joined by data_id once both have arrived
+        if self.settings.getbool('PROFILE_PREFETCH'):
+            profile_slug = self.get_profile_slug(item['data_id'])
+            yield scrapy.Request(
+                url=f'{Constants.DOMAIN_PROPERTY_PROFILE}/{profile_slug}',
+                callback=self.parse_prefetched_profile,
+                errback=self.prefetched_profile_failed,
+                headers=self.headers,
+                priority=detail_priority(page),
+                meta={'data_id': item['data_id'],
+                      'profile_slug': profile_slug,
+                      'postcode': postcode}
+            )
 
     def parse_property_adv(self, response):
         try:
@@ -96,7 +87,9 @@ class DomainBuySpider(scrapy.Spider):
                     url=f'{Constants.DOMAIN_BASE_URL}/{redirect}',
                     callback=self.parse_property_adv,
                     headers=self.headers,
-                    meta={'item': response.meta['item']}
+                    priority=response.request.priority,
+                    meta={'item': response.meta['item'],
+                          'postcode': response.meta.get('postcode')}
                 )
             else:
                 page_info = digital_data.get(
@@ -161,66 +154,128 @@ class DomainBuySpider(scrapy.Spider):
 
                 item = loader.load_item()
                 profile_slug = props.get("propertyProfileUrlSlug")
-                yield scrapy.Request(
-                    url=f'{Constants.DOMAIN_PROPERTY_PROFILE}/{profile_slug}',
-                    callback=self.parse_property_profile,
-                    headers=self.headers,
-                    meta={'item': item}
-                )
+                if self.settings.getbool('PROFILE_PREFETCH'):
+                    yield from self.join_listing(
+                        response.request, item['data_id'], 'advert',
+                        {'item': item, 'profile_slug': profile_slug})
+                else:
+                    yield self.profile_request(
+                        response.request, item, profile_slug)
         except json.JSONDecodeError as e:
             logging.error(f"Extract Detail Error: {e}")
 
-    def parse_property_profile(self, response):
-        try:
-            loader = ItemLoader(
-                item=response.meta['item'], response=response)
-
-            script_tag = response.xpath(
-                "//script[@id='__NEXT_DATA__']/text()").get()
-            json_resp = json.loads(script_tag)
-
-            data = json_resp.get("props", {}).get("pageProps", {})
-            status = data.get("statusCode", 200)
-            if status != 404:
-                address = "-".join(response.meta["item"].get(
-                    "data_id").split("-")[:-1])
-                formatted_string = f'propertyByPropertySlug({json.dumps({"propertySlug": address}, separators=(",", ":"))})'
-
-                ref = data.get("__APOLLO_STATE__").get(
-                    "ROOT_QUERY").get(formatted_string).get("__ref")
-
-                valuation = data.get("__APOLLO_STATE__").get(
-                    ref).get("valuation")
-
-                lower_price = valuation.get("lowerPrice")
-                mid_price = valuation.get("midPrice")
-                upper_price = valuation.get("upperPrice")
-
-            price_pattern = re.compile(
-                r'\$\s?\d{1,3}(?:,\d{3})*(?:\+\s?\d{1,3}(?:,\d{3})*)*')
-
-            matched_prices = price_pattern.findall(
-                response.meta['item'].get("advertised_price"))
-            cleaned_prices = [int(matched_price.replace('$', '').replace(
-                ',', '').replace(' ', '')) for matched_price in matched_prices]
+    def profile_request(self, request, item, profile_slug, dont_filter=False):
+        """Fetch the profile of an advertised listing after its advert."""
+        return scrapy.Request(
+            url=f'{Constants.DOMAIN_PROPERTY_PROFILE}/{profile_slug}',
+            callback=self.parse_property_profile,
+            headers=self.headers,
+            priority=request.priority,
+            dont_filter=dont_filter,
+            meta={'item': item, 'postcode': request.meta.get('postcode')}
+        )
 
-            if len(cleaned_prices) == 1 and not response.meta['item'].get("auction"):
-                loader.add_value('find_price', cleaned_prices)
-                loader.add_value('find_price_description', "Calculation")
+    def parse_prefetched_profile(self, response):
+        try:
+            valuation = self.extract_valuation(
+                response, response.meta['data_id'])
+            valuation['profile_slug'] = response.meta['profile_slug']
+        except (json.JSONDecodeError, AttributeError) as e:
+            # Still join, so the advert falls back to its advertised profile
+            logging.error(f"Prefetched Profile Error: {e}")
+            valuation = None
+        yield from self.join_listing(
+            response.request, response.meta['data_id'], 'profile', valuation)
+
+    def prefetched_profile_failed(self, failure):
+        # The advert half still waits for its profile, fetch it after the
+        # advert instead
+        yield from self.join_listing(
+            failure.request, failure.request.meta['data_id'], 'profile', None)
+
+    def join_listing(self, request, data_id, part, value):
+        """
+        Store the advert or prefetched profile of a listing and emit the
+        listing once its other half has been stored too.
+        """
+        parts = self.listing_joins.add(data_id, part, value)
+        if parts is None:
+            return
+
+        advert, valuation = parts['advert'], parts['profile']
+        if valuation is None or valuation['profile_slug'] != advert['profile_slug']:
+            # The profile guessed from data_id is not the advertised one
+            self.crawler.stats.inc_value('profile_prefetch/miss')
+            yield self.profile_request(
+                request, advert['item'], advert['profile_slug'],
+                dont_filter=True)
+            return
+
+        self.crawler.stats.inc_value('profile_prefetch/hit')
+        inc_postcode_stat(self, request.meta.get('postcode'), 'items')
+        yield self.price_item(advert['item'], valuation)
+
+    def extract_valuation(self, response, data_id):
+        """Read the valuation range of a listing from its profile page."""
+        script_tag = response.xpath(
+            "//script[@id='__NEXT_DATA__']/text()").get()
+        json_resp = json.loads(script_tag)
+
+        data = json_resp.get("props", {}).get("pageProps", {})
+        status = data.get("statusCode", 200)
+        if status == 404:
+            return {'lower_price': None, 'mid_price': None, 'upper_price': None}
+
+        address = self.get_profile_slug(data_id)
+        formatted_string = f'propertyByPropertySlug({json.dumps({"propertySlug": address}, separators=(",", ":"))})'
+
+        ref = data.get("__APOLLO_STATE__").get(
+            "ROOT_QUERY").get(formatted_string).get("__ref")
+
+        valuation = data.get("__APOLLO_STATE__").get(
+            ref).get("valuation")
+
+        return {
+            'lower_price': valuation.get("lowerPrice"),
+            'mid_price': valuation.get("midPrice"),
+            'upper_price': valuation.get("upperPrice"),
+        }
+
+    def price_item(self, item, valuation):
+        """Set the price the feasibility uses from the advert or the valuation."""
+        loader = ItemLoader(item=item)
+        mid_price = valuation['mid_price']
+
+        price_pattern = re.compile(
+            r'\$\s?\d{1,3}(?:,\d{3})*(?:\+\s?\d{1,3}(?:,\d{3})*)*')
+
+        matched_prices = price_pattern.findall(item.get("advertised_price"))
+        cleaned_prices = [int(matched_price.replace('$', '').replace(
+            ',', '').replace(' ', '')) for matched_price in matched_prices]
+
+        if len(cleaned_prices) == 1 and not item.get("auction"):
+            loader.add_value('find_price', cleaned_prices)
+            loader.add_value('find_price_description', "Calculation")
+        else:
+            if mid_price:
+                loader.add_value('find_price', mid_price)
+                loader.add_value('find_price_description',
+                                 "Mid Market Value")
             else:
-                if mid_price:
-                    loader.add_value('find_price', mid_price)
-                    loader.add_value('find_price_description',
-                                     "Mid Market Value")
-                else:
-                    loader.add_value('find_price', 0)
-                    loader.add_value('find_price_description', "Not found")
+                loader.add_value('find_price', 0)
+                loader.add_value('find_price_description', "Not found")
 
-            loader.add_value('lower_price', lower_price)
-            loader.add_value('mid_price', mid_price)
-            loader.add_value('upper_price', upper_price)
+        loader.add_value('lower_price', valuation['lower_price'])
+        loader.add_value('mid_price', mid_price)
+        loader.add_value('upper_price', valuation['upper_price'])
+        return loader.load_item()
 
-            yield loader.load_item()
+    def parse_property_profile(self, response):
+        try:
+            item = response.meta['item']
+            valuation = self.extract_valuation(response, item.get("data_id"))
+            inc_postcode_stat(self, response.meta.get('postcode'), 'items')
+            yield self.price_item(item, valuation)
 
         except json.JSONDecodeError as e:
             logging.error(f"JSON Decode Error: {e}")
@@ -4,11 +4,17 @@ import re
 import scrapy
 from scrapy.loader import ItemLoader
 from ..helpers.constants import Constants
-from ..items import DomainItem
+from ..helpers.search import (
+    SearchSpiderMixin,
+    build_search_urls,
+    detail_priority,
+    inc_postcode_stat,
+)
 
 
-class DomainSoldSpider(scrapy.Spider):
+class DomainSoldSpider(SearchSpiderMixin, scrapy.Spider):
     name = "domain_sold"
+    for_sale = "SOLD"
     allowed_domains = ["www.domain.com.au"]
     headers = {
         "Accept": "application/json",
@@ -18,69 +24,51 @@ class DomainSoldSpider(scrapy.Spider):
         "User-Agent": Constants.USER_AGENT
     }
 
-    def __init__(self, domain_sold=None, *args, **kwargs):
+    def __init__(self, domain_sold=None, postcodes=None, *args, **kwargs):
         super(DomainSoldSpider, self).__init__(*args, **kwargs)
         self.domain_sold = domain_sold or Constants.DOMAIN_SOLD
+        self.default_search_url = self.domain_sold
+        # One or more search URLs ('|' separated) and/or postcodes
+        # (',' separated) are seeded together in a single crawl
+        self.search_urls = build_search_urls(
+            Constants.DOMAIN_SOLD, domain_sold, postcodes)
 
-    def start_requests(self):
+    def detail_requests(self, item, page, postcode):
         yield scrapy.Request(
-            url=self.domain_sold,
-            callback=self.parse,
-            headers=self.headers
+            url=item["advert_web_link"],
+            callback=self.parse_property_adv,
+            headers=self.headers,
+            priority=detail_priority(page),
+            meta={'item': item, 'postcode': postcode}
         )
 
-    def parse(self, response):
-        try:
-            # Ensure the response body is correctly decoded and parsed
-            json_resp = json.loads(response.body)
-
-            # Access the nested keys correctly
-            props = json_resp.get("props", {})
-
-            # Filter dictionary using the list of strings
-            listings_map = props.get("listingsMap", {})
-            property_advs = {k: v for k,
-                             v in listings_map.items() if len(k) == 10}
-
-            for adv_id, adv in property_advs.items():
-                loader = ItemLoader(item=DomainItem(), response=response)
-                loader.add_value('short_address', adv.get(
-                    'listingModel', {}).get('address', {}).get('street'))
-                loader.add_value('latitude', adv.get(
-                    'listingModel', {}).get('address', {}).get('lat'))
-                loader.add_value('longtitude', adv.get(
-                    'listingModel', {}).get('address', {}).get('lng'))
-
-                loader.add_value('auction', adv.get(
-                    'listingModel', {}).get('auction'))
-
-                url_suf_path = adv.get('listingModel', {}).get('url')
-
-                loader.add_value(
-                    'data_id', url_suf_path[1:] if url_suf_path.startswith('/') else url_suf_path)
-                loader.add_value('property_id', adv_id)
-                loader.add_value(
-                    'advert_web_link', f"{Constants.DOMAIN_BASE_URL}{url_suf_path}")
-
-                item = loader.load_item()
-
-                yield scrapy.Request(
-                    url=item["advert_web_link"],
-                    callback=self.parse_property_adv,
-                    headers=self.headers,
-                    meta={'item': item}
-                )
-
-            current_page = props["currentPage"]
-            total_pages = props["totalPages"]
-            if current_page < total_pages:
-                yield scrapy.Request(
-                    url=f'{self.domain_sold}&page={current_page + 1}',
-                    callback=self.parse,
-                    headers=self.headers
-                )
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON Decode Error: {e}")
+    _watermark_warned = False
+
+    def history_pages(self, search_url, postcode, current_page, total_pages,
+                      changed):
+        if not self.settings.getbool('SOLD_WATERMARK'):
+            return None
+        if not self.settings.getbool('INCREMENTAL_CRAWL'):
+            # Without listing fingerprints every sale looks new, the
+            # watermark would walk the whole history one page at a time
+            if not self._watermark_warned:
+                logging.warning(
+                    "SOLD_WATERMARK needs INCREMENTAL_CRAWL, paginating "
+                    "sold searches as usual")
+                self._watermark_warned = True
+            return None
+        if not self.search_history.complete(search_url):
+            self.search_history.page_parsed(
+                search_url, current_page, total_pages)
+            return None
+
+        # Sales come newest first, once a page holds no new sale the rest
+        # of the history is already stored
+        if not changed:
+            inc_postcode_stat(self, postcode, 'watermark_stops')
+            self.search_walk_stopped(search_url)
+        return [current_page + 1] if (
+            changed and current_page < total_pages) else []
 
     def parse_property_adv(self, response):
         try:
@@ -97,7 +85,9 @@ class DomainSoldSpider(scrapy.Spider):
                     url=f'{Constants.DOMAIN_BASE_URL}/{redirect}',
                     callback=self.parse_property_adv,
                     headers=self.headers,
-                    meta={'item': response.meta['item']}
+                    priority=response.request.priority,
+                    meta={'item': response.meta['item'],
+                          'postcode': response.meta.get('postcode')}
                 )
             else:
                 page_info = digital_data.get(
@@ -180,6 +170,7 @@ class DomainSoldSpider(scrapy.Spider):
 
                     loader.add_value("sold_price", sold_price)
 
+                inc_postcode_stat(self, response.meta.get('postcode'), 'items')
                 yield loader.load_item()
         except json.JSONDecodeError as e:
             logging.error(f"Extract Detail Error: {e}")
@@ -0,0 +1,86 @@
+import logging
+import time
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+
+class BackgroundWriter:
+    """
+    Runs blocking writes one at a time on a dedicated thread, off the
+    reactor that downloads and parses.
+
+    Callers keep at most max_pending writes queued by checking full() and
+    waiting on wait_for_room() before submitting. Queue depth and writer lag
+    (seconds from submit to completion) are reported as stats under `name`.
+    """
+
+    def __init__(self, max_pending, stats=None, name='writer'):
+        self.max_pending = max_pending
+        self.stats = stats
+        self.name = name
+        self.pending = []
+        self.pool = ThreadPool(minthreads=1, maxthreads=1, name=name)
+
+    def start(self):
+        self.pool.start()
+
+    def full(self):
+        return len(self.pending) >= self.max_pending
+
+    def wait_for_room(self):
+        """
+        :return: Deferred, fired once the oldest queued write is done
+        """
+        if not self.pending:
+            return defer.succeed(None)
+        self.inc_stat('backpressure')
+        room = defer.Deferred()
+        self.pending[0].addBoth(lambda result: room.callback(None) or result)
+        return room
+
+    def submit(self, func, *args):
+        """
+        Queue func(*args) on the writer thread.
+
+        :return: Deferred, fired with None once the write is done
+        """
+        from twisted.internet import reactor
+
+        submitted_at = time.monotonic()
+        write = threads.deferToThreadPool(reactor, self.pool, func, *args)
+        self.pending.append(write)
+        write.addBoth(self.write_done, write, submitted_at)
+        self.set_stat('queue_depth', len(self.pending))
+        self.max_stat('queue_depth_max', len(self.pending))
+        return write
+
+    def write_done(self, result, write, submitted_at):
+        self.pending.remove(write)
+        lag = time.monotonic() - submitted_at
+        self.set_stat('queue_depth', len(self.pending))
+        self.set_stat('lag', round(lag, 3))
+        self.max_stat('lag_max', round(lag, 3))
+        self.inc_stat('writes')
+        if isinstance(result, Failure):
+            self.inc_stat('errors')
+            logging.error(f"Background write failed: {result.getErrorMessage()}")
+        return None
+
+    def drain(self):
+        """Wait for every queued write, then stop the writer thread."""
+        d = defer.DeferredList(list(self.pending))
+        d.addBoth(lambda _: self.pool.stop())
+        return d
+
+    def set_stat(self, key, value):
+        if self.stats:
+            self.stats.set_value(f'{self.name}/{key}', value)
+
+    def max_stat(self, key, value):
+        if self.stats:
+            self.stats.max_value(f'{self.name}/{key}', value)
+
+    def inc_stat(self, key):
+        if self.stats:
+            self.stats.inc_value(f'{self.name}/{key}')
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+from scrapy.settings import Settings
+
+# The project imports scrapy_redis and scheduler from its root, as scrapy.cfg
+# does in the image
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class Spider:
+    """The attributes the frontier and fingerprint helpers read off a spider"""
+
+    def __init__(self, name='domain_buy', frontier_run_id='run', **settings):
+        self.name = name
+        self.frontier_run_id = frontier_run_id
+        self.settings = Settings(settings)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeStrictRedis()
+
+
+@pytest.fixture
+def redis_server(monkeypatch, server):
+    """Every Redis client of the project, backed by one fake server"""
+    from scrapy_redis import fingerprints, frontier
+
+    monkeypatch.setattr(frontier, 'get_redis_server', lambda settings: server)
+    monkeypatch.setattr(fingerprints, 'get_redis_server', lambda settings: server)
+    return server
+
+
+@pytest.fixture
+def make_spider():
+    return Spider
+
+
+@pytest.fixture
+def spider(make_spider):
+    return make_spider(SEARCH_PAGE_MAX_AGE=3600)
@@ -0,0 +1,76 @@
+import mongomock
+
+from scrapy_redis.fingerprints import (
+    ContentHashCache,
+    SearchHistory,
+    SearchPageFingerprints,
+)
+
+SEARCH_URL = 'https://www.domain.com.au/sale/?ptype=house&postcode=2000'
+
+
+def test_fingerprint_is_committed_once_every_page_is_parsed(redis_server, spider):
+    fingerprints = SearchPageFingerprints.from_spider(spider)
+
+    fingerprints.page_parsed(SEARCH_URL, 1, 3, 'first-page')
+    fingerprints.page_parsed(SEARCH_URL, 3, 3)
+    assert not fingerprints.unchanged(SEARCH_URL, 'first-page')
+
+    fingerprints.page_parsed(SEARCH_URL, 2, 3)
+    assert fingerprints.unchanged(SEARCH_URL, 'first-page')
+    assert not fingerprints.unchanged(SEARCH_URL, 'moved')
+    # Nothing of the walk is left in the frontier
+    assert redis_server.keys('frontier:*') == []
+    assert 0 < redis_server.ttl(fingerprints.key(SEARCH_URL)) <= 3600
+
+
+def test_walk_cut_short_is_not_committed(redis_server, spider):
+    fingerprints = SearchPageFingerprints.from_spider(spider)
+    fingerprints.page_parsed(SEARCH_URL, 1, 3, 'first-page')
+    fingerprints.page_parsed(SEARCH_URL, 2, 3)
+
+    # The next walk of the search starts over from its first page
+    fingerprints.page_parsed(SEARCH_URL, 1, 3, 'first-page')
+    fingerprints.page_parsed(SEARCH_URL, 3, 3)
+    assert not fingerprints.unchanged(SEARCH_URL, 'first-page')
+
+
+def test_commit_of_a_walk_stopped_early(redis_server, spider):
+    fingerprints = SearchPageFingerprints.from_spider(spider)
+    fingerprints.page_parsed(SEARCH_URL, 1, 5, 'first-page')
+
+    fingerprints.commit(SEARCH_URL)
+    assert fingerprints.unchanged(SEARCH_URL, 'first-page')
+
+    # A commit without a walk in progress keeps the stored fingerprint
+    fingerprints.commit(SEARCH_URL)
+    assert fingerprints.unchanged(SEARCH_URL, 'first-page')
+
+
+def test_search_history_is_complete_after_its_last_page(redis_server, spider):
+    history = SearchHistory.from_spider(spider)
+    history.page_parsed(SEARCH_URL, 1, 2)
+    assert not history.complete(SEARCH_URL)
+
+    history.page_parsed(SEARCH_URL, 2, 2)
+    assert history.complete(SEARCH_URL)
+
+
+def test_content_hashes_are_loaded_for_the_batch_only():
+    collection = mongomock.MongoClient().db.properties
+    collection.insert_many([
+        {'data_id': 'a', 'for_sale': 'SOLD', 'content_hash': 'hash-a'},
+        {'data_id': 'b', 'for_sale': 'SOLD', 'content_hash': 'hash-b'},
+        {'data_id': 'a', 'for_sale': 'BUY', 'content_hash': 'hash-a-buy'},
+    ])
+    hashes = ContentHashCache()
+
+    loaded = hashes.load(collection, [
+        {'data_id': 'a', 'for_sale': 'SOLD'},
+        {'data_id': 'c', 'for_sale': 'SOLD'},
+    ])
+
+    assert loaded == 1
+    assert hashes.hashes == {('a', 'SOLD'): 'hash-a'}
+    # Known hashes are not read again
+    assert hashes.load(collection, [{'data_id': 'a', 'for_sale': 'SOLD'}]) == 0
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request
+from scrapy.settings import Settings
+from scrapy.utils.request import RequestFingerprinter
+
+from scrapy_redis.frontier import (
+    RedisDupeFilter,
+    RedisJoinBuffer,
+    RedisScheduler,
+    clear_frontier,
+    frontier_key,
+    get_frontier_run_id,
+)
+
+
+class Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1, spider=None):
+        self.values[key] = self.values.get(key, 0) + count
+
+
+@pytest.fixture
+def open_scheduler(server):
+    def open_(spider):
+        stats = Stats()
+        spider.crawler = SimpleNamespace(stats=stats)
+        fingerprinter = RequestFingerprinter(SimpleNamespace(settings=Settings(
+            {'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7'})))
+        scheduler = RedisScheduler(
+            server, RedisDupeFilter(server, fingerprinter), stats)
+        scheduler.open(spider)
+        return scheduler
+
+    return open_
+
+
+def test_requests_pop_by_priority(open_scheduler, spider):
+    scheduler = open_scheduler(spider)
+    for page in (1, 3, 2):
+        scheduler.enqueue_request(
+            Request(f'https://example.com/?page={page}', priority=-page))
+
+    popped = [scheduler.next_request().url for _ in range(3)]
+
+    assert popped == [f'https://example.com/?page={page}' for page in (1, 2, 3)]
+    assert scheduler.next_request() is None
+
+
+def test_crawlers_of_a_run_share_the_dupefilter(open_scheduler, make_spider):
+    first = open_scheduler(make_spider(frontier_run_id='run'))
+    second = open_scheduler(make_spider(frontier_run_id='run'))
+    other_run = open_scheduler(make_spider(frontier_run_id='other'))
+
+    assert first.enqueue_request(Request('https://example.com/a'))
+    assert not second.enqueue_request(Request('https://example.com/a'))
+    assert second.enqueue_request(
+        Request('https://example.com/a', dont_filter=True))
+    assert other_run.enqueue_request(Request('https://example.com/a'))
+    assert second.df.key == frontier_key('run', 'domain_buy', 'dupefilter')
+
+
+def test_crawl_outside_a_run_drops_its_frontier(
+        server, open_scheduler, make_spider):
+    spider = make_spider(frontier_run_id=None)
+    scheduler = open_scheduler(spider)
+    scheduler.enqueue_request(Request('https://example.com/a'))
+    run_id = get_frontier_run_id(spider)
+
+    open_scheduler(make_spider(frontier_run_id=run_id)).close('finished')
+    assert server.keys(f'frontier:{run_id}:*') != []
+
+    scheduler.close('finished')
+    assert server.keys(f'frontier:{run_id}:*') == []
+
+
+def test_clear_frontier_keeps_other_runs(server):
+    server.set(frontier_key('run', 'domain_buy', 'requests'), 1)
+    server.set(frontier_key('run', 'domain_sold', 'requests'), 1)
+    server.set(frontier_key('other', 'domain_buy', 'requests'), 1)
+
+    assert clear_frontier(server, 'run', 'domain_buy') == 1
+    assert clear_frontier(server, 'run') == 1
+    assert server.keys('frontier:*') == [
+        frontier_key('other', 'domain_buy', 'requests').encode()]
+
+
+def test_join_buffer_pairs_parts_in_any_order(redis_server, spider):
+    buffer = RedisJoinBuffer.from_spider(spider, 'profiles', ['advert', 'profile'])
+
+    assert buffer.add('a', 'profile', {'size': 600}) is None
+    assert buffer.add('b', 'advert', {'bed': 2}) is None
+    assert buffer.add('a', 'advert', {'bed': 3}) == {
+        'advert': {'bed': 3}, 'profile': {'size': 600}}
+    # Only the parts of the unfinished record are left
+    assert sorted(redis_server.hkeys(buffer.key)) == [b'b:advert', b'b:count']
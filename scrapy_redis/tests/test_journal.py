@@ -0,0 +1,65 @@
+import os
+
+from scrapy_redis.journal import BatchJournal, OWNER_LOCK, open_crawl_journal
+
+
+def test_segments_are_pending_until_acknowledged(tmp_path):
+    journal = BatchJournal(str(tmp_path))
+    first = journal.append([{'data_id': 'a'}])
+    second = journal.append([{'data_id': 'b'}])
+
+    assert journal.pending() == [first, second]
+    assert journal.load(first) == [{'data_id': 'a'}]
+
+    journal.ack(first)
+    journal.reject(second)
+    assert journal.pending() == []
+
+
+def test_unreadable_segment_is_set_aside(tmp_path):
+    journal = BatchJournal(str(tmp_path))
+    segment = journal.append([{'data_id': 'a'}])
+    with open(segment, 'wb') as damaged:
+        damaged.write(b'not a batch')
+
+    assert journal.load(segment) is None
+    assert journal.pending() == []
+
+
+def test_journal_of_a_live_crawl_is_not_claimed(tmp_path):
+    live, _ = open_crawl_journal(str(tmp_path))
+    live.append([{'data_id': 'a'}])
+
+    journal, orphans = open_crawl_journal(str(tmp_path))
+
+    assert orphans == []
+    live.close()
+    journal.close()
+
+
+def test_orphaned_journal_is_claimed_once(tmp_path):
+    dead, _ = open_crawl_journal(str(tmp_path))
+    segment = dead.append([{'data_id': 'a'}])
+    # The crawl dies without closing its journal
+    dead.owner_lock.close()
+
+    journal, orphans = open_crawl_journal(str(tmp_path))
+    _, others = open_crawl_journal(str(tmp_path))
+
+    assert [orphan.directory for orphan in orphans] == [dead.directory]
+    assert others == []
+    assert orphans[0].pending() == [segment]
+
+
+def test_close_removes_the_journal_once_written(tmp_path):
+    journal, _ = open_crawl_journal(str(tmp_path))
+    segment = journal.append([{'data_id': 'a'}])
+    journal.close()
+    # Pending segments keep the journal for the next crawl
+    assert sorted(os.listdir(journal.directory)) == sorted(
+        [os.path.basename(segment), OWNER_LOCK])
+
+    _, orphans = open_crawl_journal(str(tmp_path))
+    orphans[0].ack(segment)
+    orphans[0].close()
+    assert not os.path.exists(journal.directory)
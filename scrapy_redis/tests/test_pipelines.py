@@ -0,0 +1,111 @@
+import os
+
+import mongomock
+import pytest
+from pymongo import errors
+
+from scrapy_redis.fingerprints import ContentHashCache
+from scrapy_redis.journal import open_crawl_journal
+from scrapy_redis.pipelines import MongoDBPineline
+
+ITEM = {'data_id': 'a', 'for_sale': 'SOLD', 'bed': 3, 'suburb': 'Kellyville'}
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.properties
+
+
+@pytest.fixture
+def open_pipeline(collection):
+    """A pipeline of a new crawl writing straight to the collection"""
+    def open_(journal=None):
+        pipeline = MongoDBPineline(
+            'mongodb://localhost', 'db', 'properties', 10, change_aware=True)
+        pipeline.collection = collection
+        pipeline.content_hashes = ContentHashCache()
+        pipeline.journal = journal
+        return pipeline
+
+    return open_
+
+
+@pytest.fixture
+def operations(monkeypatch, collection):
+    """The operations of every bulk write, by type"""
+    written = []
+    bulk_write = collection.bulk_write
+
+    def record(requests, *args, **kwargs):
+        written.extend((type(request).__name__, request._doc) for request in requests)
+        return bulk_write(requests, *args, **kwargs)
+
+    monkeypatch.setattr(collection, 'bulk_write', record)
+    return written
+
+
+def test_unchanged_item_only_gets_last_seen(open_pipeline, collection, operations):
+    open_pipeline().write_batch([dict(ITEM)])
+    stored = collection.find_one({'data_id': 'a'})
+    operations.clear()
+
+    # A later crawl knows the item from the hash stored with it
+    open_pipeline().write_batch([dict(ITEM)])
+
+    assert [name for name, _ in operations] == ['UpdateMany']
+    assert collection.find_one({'data_id': 'a'})['last_seen'] >= stored['last_seen']
+
+
+def test_changed_item_only_sets_the_changed_fields(
+        open_pipeline, collection, operations):
+    open_pipeline().write_batch([dict(ITEM)])
+    operations.clear()
+
+    open_pipeline().write_batch([{**ITEM, 'bed': 4}])
+
+    [(name, update)] = operations
+    assert name == 'UpdateOne'
+    assert set(update['$set']) == {'bed', 'content_hash', 'last_seen'}
+    assert collection.find_one({'data_id': 'a'})['bed'] == 4
+
+
+def test_flush_journals_the_batch_before_the_writer(open_pipeline, tmp_path):
+    journal, _ = open_crawl_journal(str(tmp_path))
+    pipeline = open_pipeline(journal)
+    submitted = []
+    pipeline.writer.submit = lambda func, *args: submitted.append(args)
+    pipeline.batch = [dict(ITEM)]
+
+    pipeline.flush()
+
+    [(batch, segment)] = submitted
+    assert journal.pending() == [segment]
+    assert journal.load(segment) == batch
+
+
+def test_orphaned_journal_is_replayed_and_acknowledged(
+        open_pipeline, collection, tmp_path):
+    dead, _ = open_crawl_journal(str(tmp_path))
+    dead.append([dict(ITEM)])
+    dead.owner_lock.close()
+
+    journal, [orphan] = open_crawl_journal(str(tmp_path))
+    open_pipeline(journal).replay_journal(orphan)
+
+    assert collection.count_documents({'data_id': 'a'}) == 1
+    assert not os.path.exists(dead.directory)
+
+
+def test_failed_write_stays_journaled(
+        monkeypatch, open_pipeline, collection, tmp_path):
+    journal, _ = open_crawl_journal(str(tmp_path))
+    segment = journal.append([dict(ITEM)])
+
+    def fail(*args, **kwargs):
+        raise errors.AutoReconnect('mongo down')
+
+    monkeypatch.setattr(collection, 'bulk_write', fail)
+    open_pipeline(journal).write_batch([dict(ITEM)], segment)
+    journal.close()
+
+    assert journal.pending() == [segment]
@@ -0,0 +1,47 @@
+from urllib.parse import parse_qs, urlparse
+
+from scrapy_redis.helpers.search import (
+    PRICE_BANDS,
+    build_search_urls,
+    split_land_size,
+    split_search_url,
+)
+
+BASE_URL = 'https://www.domain.com.au/sale/?ptype=house,town-house&excludeunderoffer=1'
+
+
+def query(url, name):
+    return parse_qs(urlparse(url).query).get(name, [None])[0]
+
+
+def test_build_search_urls_seeds_urls_and_postcodes():
+    urls = build_search_urls(
+        BASE_URL, f'{BASE_URL}&postcode=2000 | ', '2150, 2154,')
+
+    assert urls == [
+        ('2000', f'{BASE_URL}&postcode=2000'),
+        ('2150', f'{BASE_URL}&postcode=2150'),
+        ('2154', f'{BASE_URL}&postcode=2154'),
+    ]
+    assert build_search_urls(BASE_URL) == [(None, BASE_URL)]
+
+
+def test_split_by_property_type_then_price_then_land_size():
+    by_type = split_search_url(f'{BASE_URL}&postcode=2000')
+    assert [query(url, 'ptype') for url in by_type] == ['house', 'town-house']
+    assert all(query(url, 'postcode') == '2000' for url in by_type)
+
+    by_price = split_search_url(by_type[0])
+    assert [query(url, 'price') for url in by_price] == PRICE_BANDS
+
+    by_land_size = split_search_url(by_price[0])
+    assert [query(url, 'landsize') for url in by_land_size] == \
+        split_land_size(None)
+
+
+def test_split_stops_at_the_narrowest_band():
+    url = f'{BASE_URL}&price=0-500000&landsize=5000-10000'.replace(
+        'house,town-house', 'house')
+
+    assert split_land_size('300-1000') == ['300-600', '600-1000']
+    assert split_search_url(url) == []
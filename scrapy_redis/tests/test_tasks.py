@@ -0,0 +1,26 @@
+from scheduler.configuration import Config
+from scheduler.tasks import build_work_units
+
+
+def test_work_units_pack_largest_postcodes_first():
+    units = build_work_units(
+        ['2000', '2150', '2154', '2155'],
+        {'2000': 50, '2150': 20, '2154': 35, '2155': 10},
+        60,
+    )
+
+    assert units == [['2000', '2155'], ['2154', '2150']]
+
+
+def test_postcodes_without_page_count_take_the_default(monkeypatch):
+    monkeypatch.setattr(Config, 'DEFAULT_POSTCODE_PAGES', 2)
+
+    units = build_work_units(['2000', '2150', '2150', '2154'], {'2000': 0}, 4)
+
+    # Duplicates are crawled once, a recorded count of 0 still takes a page
+    assert units == [['2150', '2154'], ['2000']]
+
+
+def test_postcode_larger_than_a_unit_gets_one_of_its_own():
+    assert build_work_units(['2000', '2150'], {'2000': 80, '2150': 5}, 60) == [
+        ['2000'], ['2150']]